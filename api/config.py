@@ -7,12 +7,35 @@ import json
 from pathlib import Path
 
 
+def load_config(config_path='config.json'):
+    """Load configuration from file, falling back to defaults"""
+    config_path = Path(config_path)
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    # Default configuration (path now points directly to 431960 directory)
+    return {
+        'steam_library_path': 'F:\\SteamLibrary\\steamapps\\workshop\\content\\431960',
+        'server': {
+            'host': '127.0.0.1',
+            'port': 5000,
+            'debug': True
+        }
+    }
+
+
 class ConfigAPI:
     """Configuration management API"""
     
-    def __init__(self, config):
+    def __init__(self, config, on_change=None):
         self.config = config
         self.config_file = Path('config.json')
+        
+        # Called with the set of keys whose values changed, so long-lived
+        # components can drop what depends on them; its result is kept in last_applied
+        self.on_change = on_change
+        self.last_applied = None
     
     def get_config(self):
         """Get current configuration"""
@@ -21,6 +44,8 @@ class ConfigAPI:
             'steam_userdata_path': self.config.get('steam_userdata_path', ''),
             'workshop_file': self.config.get('workshop_file', ''),
             'content_path': self.config.get('content_path', ''),
+            'content_roots': self.config.get('content_roots', []),
+            'auto_discover_libraries': self.config.get('auto_discover_libraries', True),
             'server': self.config.get('server', {}),
             'preview': self.config.get('preview', {})
         }
@@ -45,6 +70,8 @@ class ConfigAPI:
                 'steam_userdata_path',
                 'workshop_file', 
                 'content_path',
+                'content_roots',
+                'auto_discover_libraries',
                 'server',
                 'preview'
             ]
@@ -60,12 +87,23 @@ class ConfigAPI:
                     file_config = {}
             
             # Update only the provided keys
+            changed = set()
             for key, value in new_config.items():
                 if key in custom_config_keys:
                     file_config[key] = value
+                    if self.config.get(key) != value:
+                        changed.add(key)
                     # Also update in-memory config for Flask
                     self.config[key] = value
             
+            # Apply the change to the running app (no restart)
+            self.last_applied = None
+            if changed and self.on_change is not None:
+                try:
+                    self.last_applied = self.on_change(changed)
+                except Exception as e:
+                    print(f"Error applying config change: {e}")
+            
             # Ensure config file directory exists
             self.config_file.parent.mkdir(parents=True, exist_ok=True)
             
@@ -97,6 +135,35 @@ class ConfigAPI:
             traceback.print_exc()
             return False
     
+    def get_steam_paths(self):
+        """Get current Steam paths being used by the system"""
+        from utils.steam_parser import SteamParser
+        
+        configured_userdata = self.config.get('steam_userdata_path', '')
+        
+        # Initialize parser with current config
+        parser = SteamParser(self.config)
+        
+        # Get the actual paths being used
+        userdata_path = parser.get_steam_user_data_path()
+        content_path = parser.get_content_path()
+        content_paths = parser.get_content_paths()
+        
+        # Check if we're using fallback
+        using_fallback = False
+        if configured_userdata and configured_userdata.strip():
+            # If a path is configured, check if it's different from what's actually used
+            actual_path_str = str(userdata_path) if userdata_path else ''
+            using_fallback = configured_userdata.strip() != actual_path_str
+        
+        return {
+            'configured_userdata_path': configured_userdata if configured_userdata else None,
+            'actual_userdata_path': str(userdata_path) if userdata_path else None,
+            'content_path': str(content_path),
+            'content_paths': [str(path) for path in content_paths],
+            'using_fallback': using_fallback
+        }
+    
     def get_steam_library_path(self):
         """Get Steam library path"""
         return self.config.get('steam_library_path', '')
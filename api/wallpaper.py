@@ -3,12 +3,24 @@ Wallpaper API
 Handles wallpaper data management and operations
 """
 
-import json
 import shutil
 import subprocess
 import os
+from pathlib import Path
 from utils.steam_parser import SteamParser
 from utils.image_processor import ImageProcessor
+from utils.library_index import LibraryIndex, SIZE_BUCKETS
+from utils.background_scanner import BackgroundScanner
+from utils.integrity import IntegrityChecker
+from utils.offload import Offloader
+from utils.color_index import hue_key, to_hex
+from utils.change_feed import parse_event_id, HEARTBEAT_SECONDS
+from utils.cache_registry import CacheRegistry
+
+
+# Settings whose change invalidates the subscription data / the content roots
+SUBSCRIPTION_KEYS = ('steam_userdata_path',)
+LIBRARY_KEYS = ('steam_library_path', 'workshop_file', 'content_path', 'content_roots', 'auto_discover_libraries')
 
 
 class WallpaperAPI:
@@ -45,28 +57,28 @@ class WallpaperAPI:
         self.config = config
         self.steam_parser = SteamParser(config)
         self.image_processor = ImageProcessor(config)
+        self.index = LibraryIndex(config, self.steam_parser, self.image_processor)
+        # Records saved by the last run; the first scan only re-reads changed folders
+        self.index.load()
+        self.integrity = IntegrityChecker(config)
+        self.offloader = Offloader(config)
+        
+        # Every in-memory cache reports to one registry sharing cache.memory_budget_mb
+        self.caches = CacheRegistry(config)
+        self.steam_parser.register_caches(self.caches)
+        self.image_processor.register_caches(self.caches)
+        self.index.register_caches(self.caches)
+        self.scanner = BackgroundScanner(self.index, config, self.caches)
+
+    def start_background_scanner(self):
+        """Keep the index fresh with throttled low-priority rescans (scan.background in config)"""
+        self.scanner.start()
         
     def get_subscribed_wallpapers(self):
         """Get all subscribed wallpapers using real-time multi-user data"""
         try:
-            # Get real-time subscribed items from all users
-            realtime_subscribed = self.steam_parser.get_realtime_subscribed_items()
-            if not realtime_subscribed:
-                return []
-            
-            wallpapers = []
-            content_path = self.steam_parser.get_content_path()
-            
-            for item_id in realtime_subscribed:
-                folder_path = content_path / item_id
-                if folder_path.exists():
-                    wallpaper_info = self._get_wallpaper_info(item_id, folder_path)
-                    wallpaper_info['subscribed'] = True
-                    wallpapers.append(wallpaper_info)
-            
-            # Sort by size (largest first)
-            wallpapers.sort(key=lambda x: x['size'], reverse=True)
-            return wallpapers
+            subscribed, _ = self._select_records()
+            return [self._get_wallpaper_info(record, subscribed=True) for record in subscribed]
             
         except Exception as e:
             print(f"Error getting subscribed wallpapers: {e}")
@@ -75,25 +87,8 @@ class WallpaperAPI:
     def get_unsubscribed_wallpapers(self):
         """Get wallpapers that are no longer subscribed using real-time multi-user data"""
         try:
-            # Get real-time subscribed items from all users
-            realtime_subscribed = self.steam_parser.get_realtime_subscribed_items()
-            realtime_subscribed_set = set(realtime_subscribed) if realtime_subscribed else set()
-            
-            wallpapers = []
-            content_path = self.steam_parser.get_content_path()
-            
-            if content_path.exists():
-                for folder in content_path.iterdir():
-                    if folder.is_dir() and self.steam_parser.is_valid_workshop_id(folder.name):
-                        # Check if this item is NOT in the real-time subscribed list
-                        if folder.name not in realtime_subscribed_set:
-                            wallpaper_info = self._get_wallpaper_info(folder.name, folder)
-                            wallpaper_info['subscribed'] = False
-                            wallpapers.append(wallpaper_info)
-            
-            # Sort by size (largest first)
-            wallpapers.sort(key=lambda x: x['size'], reverse=True)
-            return wallpapers
+            _, unsubscribed = self._select_records()
+            return [self._get_wallpaper_info(record, subscribed=False) for record in unsubscribed]
             
         except Exception as e:
             print(f"Error getting unsubscribed wallpapers: {e}")
@@ -102,51 +97,202 @@ class WallpaperAPI:
     def get_wallpapers_by_user(self, user_id, subscribed_only=True):
         """Get wallpapers filtered by specific user"""
         try:
-            # Get all subscription data
-            all_data = self.steam_parser.get_all_subscription_data()
-            if not all_data or user_id not in all_data:
-                return []
-            
-            user_subscriptions = all_data[user_id]
-            content_path = self.steam_parser.get_content_path()
-            wallpapers = []
-            
+            subscribed, unsubscribed = self._select_records(user_id)
             if subscribed_only:
-                # Get wallpapers subscribed by this user
-                for workshop_id, details in user_subscriptions.items():
-                    if details['is_active']:
-                        folder_path = content_path / workshop_id
-                        if folder_path.exists():
-                            wallpaper_info = self._get_wallpaper_info(workshop_id, folder_path)
-                            wallpaper_info['subscribed'] = True
-                            wallpapers.append(wallpaper_info)
-            else:
-                # Get wallpapers NOT subscribed by this user (but exist on disk)
-                if content_path.exists():
-                    for folder in content_path.iterdir():
-                        if (folder.is_dir() and 
-                            self.steam_parser.is_valid_workshop_id(folder.name) and
-                            folder.name not in user_subscriptions):
-                            
-                            wallpaper_info = self._get_wallpaper_info(folder.name, folder)
-                            wallpaper_info['subscribed'] = False
-                            wallpapers.append(wallpaper_info)
-            
-            # Sort by size (largest first)
-            wallpapers.sort(key=lambda x: x['size'], reverse=True)
-            return wallpapers
+                return [self._get_wallpaper_info(record, subscribed=True) for record in subscribed]
+            return [self._get_wallpaper_info(record, subscribed=False) for record in unsubscribed]
             
         except Exception as e:
             print(f"Error getting wallpapers by user {user_id}: {e}")
             return []
     
+    def get_wallpaper_page(self, user_filter=None, search_query=None,
+                           subscribed_page=1, unsubscribed_page=1, page_size=20,
+                           filter_expression=None, facets=None, color_query=None):
+        """
+        Get one page of subscribed and unsubscribed wallpapers (search first, then paginate).
+        Filtering and slicing work on index records; only the returned page is serialized.
+        filter_expression is a subscription filter (see utils.subscription_bitsets) and
+        facets maps facet names to accepted values (see utils.facet_index); the
+        response includes facet counts. color_query (see utils.color_index.parse_color_args)
+        sorts by hue or keeps wallpapers near a colour, closest first. Invalid filters
+        raise ValueError.
+        """
+        self.caches.maybe_enforce()
+        try:
+            subscribed, unsubscribed = self._select_records(user_filter)
+        except Exception as e:
+            print(f"Error selecting wallpapers: {e}")
+            subscribed, unsubscribed = [], []
+        
+        return self._build_page(subscribed, unsubscribed, search_query, subscribed_page,
+                                unsubscribed_page, page_size, filter_expression, facets, color_query)
+    
+    def get_dashboard(self, user_filter=None, search_query=None,
+                      subscribed_page=1, unsubscribed_page=1, page_size=20,
+                      filter_expression=None, facets=None, color_query=None):
+        """
+        Get users, both wallpaper pages and statistics in one response.
+        Everything is computed from one snapshot: the index is refreshed once and
+        held locked, so the three parts agree on the same scan and subscription data.
+        """
+        self.caches.maybe_enforce()
+        self.index.refresh()
+        with self.index.snapshot() as all_data:
+            subscribed, unsubscribed = self._select_records(user_filter, all_data)
+            return {
+                'users': self._build_users(all_data),
+                'wallpapers': self._build_page(subscribed, unsubscribed, search_query, subscribed_page,
+                                               unsubscribed_page, page_size, filter_expression, facets,
+                                               color_query),
+                'stats': self._build_statistics(self.index.get_statistics(user_filter), filter_expression)
+            }
+    
+    def _build_page(self, subscribed, unsubscribed, search_query, subscribed_page,
+                    unsubscribed_page, page_size, filter_expression=None, facets=None, color_query=None):
+        """Apply filters, facets, search and colour ordering to selected records and paginate both lists"""
+        matching, facet_counts = self.index.select(filter_expression, facets)
+        if matching is not None:
+            subscribed = [record for record in subscribed if record.id in matching]
+            unsubscribed = [record for record in unsubscribed if record.id in matching]
+        
+        if search_query and search_query.strip():
+            search_term = search_query.strip().lower()
+            subscribed = [record for record in subscribed if search_term in record.title.lower()]
+            unsubscribed = [record for record in unsubscribed if search_term in record.title.lower()]
+        
+        page = {}
+        if color_query and (color_query['color'] is not None or color_query['sort'] == 'hue'):
+            subscribed, unsubscribed = self._order_by_color([subscribed, unsubscribed], color_query)
+            page['colors_pending'] = self.index.colors_pending()
+        
+        page.update({
+            'subscribed': self._paginate(subscribed, subscribed_page, page_size, True),
+            'unsubscribed': self._paginate(unsubscribed, unsubscribed_page, page_size, False),
+            'facets': facet_counts
+        })
+        return page
+    
+    def _order_by_color(self, record_lists, color_query):
+        """
+        Keep records near the query colour (closest first) or sort them by hue.
+        Only colours cached by the background analysis are used; nothing is decoded.
+        """
+        if color_query['color'] is not None:
+            matches = self.index.color_matches(color_query['color'], color_query['tolerance'])
+            return [sorted((record for record in records if record.id in matches),
+                           key=lambda record: matches[record.id])
+                    for records in record_lists]
+        return [sorted(records, key=lambda record: hue_key(self.index.colors(record))) for records in record_lists]
+    
+    def _select_records(self, user_id=None, all_data=None):
+        """
+        Split indexed records into (subscribed, unsubscribed), largest first.
+        For a specific user, "unsubscribed" means not in that user's subscription list.
+        With all_data (a snapshot of the subscription data) the index is used as-is.
+        """
+        if all_data is not None:
+            records = self.index.records_by_size()
+            if user_id and user_id != 'all':
+                user_subscriptions = all_data.get(user_id)
+                if user_subscriptions is None:
+                    return [], []
+                subscribed = [record for record in records
+                              if record.id in user_subscriptions and user_subscriptions[record.id]['is_active']]
+                unsubscribed = [record for record in records if record.id not in user_subscriptions]
+                return subscribed, unsubscribed
+            
+            active = set()
+            for user_subscriptions in all_data.values():
+                active.update(item_id for item_id, details in user_subscriptions.items() if details['is_active'])
+            subscribed = [record for record in records if record.id in active]
+            unsubscribed = [record for record in records if record.id not in active]
+            return subscribed, unsubscribed
+        
+        if user_id and user_id != 'all':
+            all_data = self.steam_parser.get_all_subscription_data()
+            if not all_data or user_id not in all_data:
+                return [], []
+            
+            user_subscriptions = all_data[user_id]
+            self.index.refresh()
+            records = self.index.records_by_size()
+            subscribed = [record for record in records
+                          if record.id in user_subscriptions and user_subscriptions[record.id]['is_active']]
+            unsubscribed = [record for record in records if record.id not in user_subscriptions]
+            return subscribed, unsubscribed
+        
+        # Get real-time subscribed items from all users
+        realtime_subscribed = self.steam_parser.get_realtime_subscribed_items() or set()
+        self.index.refresh()
+        records = self.index.records_by_size()
+        subscribed = [record for record in records if record.id in realtime_subscribed]
+        unsubscribed = [record for record in records if record.id not in realtime_subscribed]
+        return subscribed, unsubscribed
+    
+    def select_unsubscribed(self, user_id=None, min_size=None, max_size=None, filter_expression=None):
+        """
+        Unsubscribed records (largest first) within a size range in bytes, optionally
+        narrowed by a subscription filter expression (ValueError if invalid).
+        """
+        _, unsubscribed = self._select_records(user_id)
+        matching = None
+        if filter_expression and filter_expression.strip():
+            matching = self.index.filter_ids(filter_expression)
+        return [record for record in unsubscribed
+                if (min_size is None or record.size >= min_size)
+                and (max_size is None or record.size <= max_size)
+                and (matching is None or record.id in matching)]
+    
+    def get_users(self):
+        """Get all Steam users with their subscription info"""
+        return self._build_users(self.steam_parser.get_all_subscription_data())
+    
+    def _build_users(self, all_data):
+        """Summarize subscription data per user"""
+        users = []
+        
+        for user_id, user_subscriptions in all_data.items():
+            active_subscriptions = [item_id for item_id, details in user_subscriptions.items()
+                                    if details['is_active']]
+            users.append({
+                'id': user_id,
+                'display_name': f"用户 {user_id}",
+                'subscription_count': len(active_subscriptions)
+            })
+        
+        return users
+    
+    def get_freshness(self, include_index=True):
+        """
+        Staleness marker for list/stats/users responses: results may come from the
+        last good snapshot while a background refresh rebuilds it
+        """
+        sources = [self.steam_parser.subscription_freshness()]
+        if include_index:
+            sources.append(self.index.freshness())
+        return {
+            'stale': any(stale for _, stale, _ in sources),
+            'age': round(max(age for age, _, _ in sources), 1),
+            'revalidating': any(revalidating for _, _, revalidating in sources)
+        }
+    
+    def _paginate(self, records, page, page_size, subscribed):
+        """Slice one page out of a record list and serialize it"""
+        start = (page - 1) * page_size
+        return {
+            'total': len(records),
+            'page': page,
+            'page_size': page_size,
+            'wallpapers': [self._get_wallpaper_info(record, subscribed=subscribed)
+                           for record in records[start:start + page_size]]
+        }
+    
     def get_wallpaper_details(self, wallpaper_id):
         """Get detailed information about a specific wallpaper"""
         try:
-            content_path = self.steam_parser.get_content_path()
-            folder_path = content_path / wallpaper_id
-            
-            if not folder_path.exists():
+            record = self.index.get_record(wallpaper_id)
+            if record is None:
                 return None
             
             # Use enhanced subscription detection
@@ -159,7 +305,7 @@ class WallpaperAPI:
             else:
                 is_subscribed = subscription_status
             
-            wallpaper_info = self._get_wallpaper_info(wallpaper_id, folder_path)
+            wallpaper_info = self._get_wallpaper_info(record)
             wallpaper_info['subscribed'] = is_subscribed
             wallpaper_info['confidence'] = 'high' if subscription_status is not None else 'medium'
             
@@ -169,29 +315,38 @@ class WallpaperAPI:
             print(f"Error getting wallpaper details: {e}")
             return None
     
-    def get_preview_image(self, wallpaper_id):
-        """Get preview image path for a wallpaper"""
+    def get_preview_image(self, wallpaper_id, original=False):
+        """
+        Get preview image path for a wallpaper.
+        Animated previews are served as downscaled thumbnails unless the
+        original file is explicitly requested (detail modal).
+        """
         try:
-            content_path = self.steam_parser.get_content_path()
-            folder_path = content_path / wallpaper_id
-            
-            if not folder_path.exists():
-                return None
-            
-            return self.image_processor.get_preview_path(folder_path)
+            preview_path, preview_type = self.find_preview(wallpaper_id)
+            if original:
+                return preview_path
+            return self.image_processor.get_thumbnail_path(preview_path, preview_type)
             
         except Exception as e:
             print(f"Error getting preview image: {e}")
             return None
     
+    def find_preview(self, wallpaper_id):
+        """Locate the preview file of a wallpaper as (path, type), or (None, None); no image decoding"""
+        folder_path = self._get_folder_path(wallpaper_id)
+        if folder_path is None:
+            return None, None
+        return self.image_processor.find_preview_file(folder_path)
+    
     def delete_wallpaper(self, wallpaper_id):
         """Delete a wallpaper folder"""
         try:
-            content_path = self.steam_parser.get_content_path()
-            folder_path = content_path / wallpaper_id
+            folder_path = self._get_folder_path(wallpaper_id)
             
-            if folder_path.exists():
+            if folder_path is not None and folder_path.exists():
                 shutil.rmtree(folder_path)
+                self.index.remove(wallpaper_id)
+                self.integrity.forget(wallpaper_id)
                 return True
             
             return False
@@ -203,11 +358,10 @@ class WallpaperAPI:
     def open_wallpaper_folder(self, wallpaper_id):
         """Open wallpaper folder in file explorer"""
         try:
-            content_path = self.steam_parser.get_content_path()
-            folder_path = content_path / wallpaper_id
+            folder_path = self._get_folder_path(wallpaper_id)
             
-            if not folder_path.exists():
-                print(f"Wallpaper folder not found: {folder_path}")
+            if folder_path is None or not folder_path.exists():
+                print(f"Wallpaper folder not found: {wallpaper_id}")
                 return False
             
             # Use Windows explorer to open the folder
@@ -232,122 +386,294 @@ class WallpaperAPI:
             print(f"Error opening folder: {e}")
             return False
     
-    def get_statistics(self, user_id=None):
-        """Get storage and subscription statistics, optionally filtered by user"""
+    def get_statistics(self, user_id=None, filter_expression=None):
+        """
+        Get storage and subscription statistics, optionally filtered by user.
+        Served from aggregates precomputed by the library index. With a
+        subscription filter expression, a 'filter' section with the matching
+        count and size is added; invalid expressions raise ValueError.
+        """
         try:
-            print(f"Getting statistics for user_id: {user_id}")  # Debug info
+            self.index.refresh()
+            return self._build_statistics(self.index.get_statistics(user_id), filter_expression)
             
-            if user_id and user_id != 'all':
-                print(f"Processing user-specific statistics for user: {user_id}")  # Debug info
-                # Get user-specific statistics
-                all_data = self.steam_parser.get_all_subscription_data()
-                if not all_data or user_id not in all_data:
-                    print(f"No data found for user {user_id}")  # Debug info
-                    return {
-                        'total': {'count': 0, 'size': 0, 'size_formatted': '0 B'},
-                        'subscribed': {'count': 0, 'size': 0, 'size_formatted': '0 B'},
-                        'unsubscribed': {'count': 0, 'size': 0, 'size_formatted': '0 B'}
-                    }
-                
-                # Get subscribed wallpapers for this user
-                user_subscriptions = all_data[user_id]
-                print(f"User {user_id} has {len(user_subscriptions)} subscription entries")  # Debug info
-                content_path = self.steam_parser.get_content_path()
-                
-                subscribed = []
-                unsubscribed = []
-                
-                # Check all folders on disk
-                if content_path.exists():
-                    for folder in content_path.iterdir():
-                        if folder.is_dir() and self.steam_parser.is_valid_workshop_id(folder.name):
-                            wallpaper_info = self._get_wallpaper_info(folder.name, folder)
-                            
-                            # Check if this user is subscribed to this wallpaper
-                            if (folder.name in user_subscriptions and 
-                                user_subscriptions[folder.name]['is_active']):
-                                wallpaper_info['subscribed'] = True
-                                subscribed.append(wallpaper_info)
-                            else:
-                                wallpaper_info['subscribed'] = False
-                                unsubscribed.append(wallpaper_info)
-                
-                print(f"Found {len(subscribed)} subscribed and {len(unsubscribed)} unsubscribed for user {user_id}")  # Debug info
-                
-                subscribed_count = len(subscribed)
-                subscribed_size = sum(wp['size'] for wp in subscribed)
-                
-                unsubscribed_count = len(unsubscribed)
-                unsubscribed_size = sum(wp['size'] for wp in unsubscribed)
-                
-                total_count = subscribed_count + unsubscribed_count
-                total_size = subscribed_size + unsubscribed_size
-                
-            else:
-                print("Getting statistics for all users")  # Debug info
-                # Get all wallpapers (original behavior)
-                subscribed = self.get_subscribed_wallpapers()
-                unsubscribed = self.get_unsubscribed_wallpapers()
-                
-                subscribed_count = len(subscribed)
-                subscribed_size = sum(wp['size'] for wp in subscribed)
-                
-                unsubscribed_count = len(unsubscribed)
-                unsubscribed_size = sum(wp['size'] for wp in unsubscribed)
-                
-                total_count = subscribed_count + unsubscribed_count
-            total_size = subscribed_size + unsubscribed_size
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error getting statistics: {e}")
+            return self._empty_statistics()
+    
+    def _build_statistics(self, aggregates, filter_expression=None):
+        """Format index aggregates as the statistics payload"""
+        try:
+            if aggregates is None:
+                return self._empty_statistics()
             
-            return {
-                'total': {
-                    'count': total_count,
-                    'size': total_size,
-                    'size_formatted': self._format_size(total_size)
-                },
-                'subscribed': {
-                    'count': subscribed_count,
-                    'size': subscribed_size,
-                    'size_formatted': self._format_size(subscribed_size)
-                },
-                'unsubscribed': {
-                    'count': unsubscribed_count,
-                    'size': unsubscribed_size,
-                    'size_formatted': self._format_size(unsubscribed_size)
+            subscribed = aggregates['subscribed']
+            disabled = aggregates['disabled']
+            not_subscribed = aggregates['not_subscribed']
+            # "unsubscribed" keeps its meaning: everything on disk not actively subscribed
+            unsubscribed = (disabled[0] + not_subscribed[0], disabled[1] + not_subscribed[1])
+            
+            statistics = {
+                'total': self._format_stat(*aggregates['total']),
+                'subscribed': self._format_stat(*subscribed),
+                'unsubscribed': self._format_stat(*unsubscribed),
+                'disabled': self._format_stat(*disabled),
+                'not_subscribed': self._format_stat(*not_subscribed),
+                'breakdown': {
+                    'size_histogram': [
+                        dict(self._format_stat(count, size), label=label)
+                        for label, count, size in aggregates['size_histogram']
+                    ],
+                    'by_type': {
+                        wallpaper_type: self._format_stat(*values)
+                        for wallpaper_type, values in sorted(aggregates['by_type'].items())
+                    },
+                    'by_root': {
+                        root: self._format_stat(*values)
+                        for root, values in aggregates['by_root'].items()
+                    }
                 }
             }
             
+            if filter_expression and filter_expression.strip():
+                statistics['filter'] = dict(
+                    self._format_stat(*self.index.filter_totals(filter_expression)),
+                    expression=filter_expression
+                )
+            
+            return statistics
+            
+        except ValueError:
+            raise
         except Exception as e:
             print(f"Error getting statistics: {e}")
-            return {
-                'total': {'count': 0, 'size': 0, 'size_formatted': '0 B'},
-                'subscribed': {'count': 0, 'size': 0, 'size_formatted': '0 B'},
-                'unsubscribed': {'count': 0, 'size': 0, 'size_formatted': '0 B'}
-            }
+            return self._empty_statistics()
+    
+    def verify_sizes(self):
+        """Compare indexed sizes from appworkshop_431960.acf with a real directory walk"""
+        self.index.refresh()
+        report = self.index.verify_sizes()
+        for item in report['drift']:
+            item['manifest_size_formatted'] = self._format_size(item['manifest_size'])
+            item['disk_size_formatted'] = self._format_size(item['disk_size'])
+            item['difference'] = item['disk_size'] - item['manifest_size']
+        return report
+    
+    def verify_integrity(self, wallpaper_ids=None, rebuild=False):
+        """
+        Verify wallpapers against their integrity manifests, yielding progress events
+        (see utils.integrity). All indexed wallpapers unless wallpaper_ids is given;
+        rebuild replaces the manifests with the current files.
+        """
+        self.index.refresh()
+        records = self.index.records()
+        if wallpaper_ids:
+            wanted = set(wallpaper_ids)
+            records = [record for record in records if record.id in wanted]
+            if not records:
+                raise ValueError(f"Unknown wallpaper id: {', '.join(sorted(wanted))}")
+
+        installed = {}
+        items = []
+        for record in records:
+            if record.root not in installed:
+                installed[record.root] = self.steam_parser.load_installed_items(record.root)
+            entry = installed[record.root].get(record.id)
+            items.append((record.id, record.path, entry[1] if entry else None))
+        return self.integrity.verify_all(items, rebuild=rebuild)
+    
+    def offload_wallpapers(self, wallpaper_ids):
+        """
+        Archive unsubscribed wallpapers to offload.path and remove the folders,
+        yielding progress events (see utils.offload). Raises ValueError for
+        unknown or still subscribed wallpapers.
+        """
+        if not wallpaper_ids:
+            raise ValueError("No wallpapers selected")
+        self.offloader.archive_dir()
+        _, unsubscribed = self._select_records()
+        candidates = {record.id: record for record in unsubscribed}
+        rejected = [wallpaper_id for wallpaper_id in wallpaper_ids if wallpaper_id not in candidates]
+        if rejected:
+            raise ValueError(f"Not an unsubscribed wallpaper: {', '.join(rejected)}")
+
+        items = []
+        for wallpaper_id in dict.fromkeys(wallpaper_ids):
+            record = candidates[wallpaper_id]
+            items.append((record.id, record.path, {
+                'id': record.id, 'title': record.title, 'type': record.type,
+                'root': record.root, 'size': record.size
+            }))
+        return self._track_offload(self.offloader.offload_all(items))
+    
+    def _track_offload(self, events):
+        """Drop offloaded wallpapers from the index as their events arrive"""
+        for event in events:
+            if event.get('event') == 'item' and event['status'] == 'offloaded':
+                self.index.remove(event['id'])
+            yield event
+    
+    def list_offloaded(self):
+        """Offloaded wallpapers with their original and archive sizes"""
+        archives = self.offloader.list_archives()
+        for item in archives:
+            item['size_formatted'] = self._format_size(item.get('size', 0))
+            item['archive_size_formatted'] = self._format_size(item['archive_size'])
+        return archives
     
-    def _get_wallpaper_info(self, wallpaper_id, folder_path):
-        """Get wallpaper information with subscription details"""
-        # Get title from project.json
-        title = self._get_wallpaper_title(folder_path)
+    def restore_wallpaper(self, wallpaper_id):
+        """Extract an offloaded wallpaper back into its content root and index it"""
+        report = self.offloader.restore(wallpaper_id)
+        self.index.get_record(wallpaper_id)
+        return report
+    
+    def get_cache_report(self):
+        """Entries, approximate sizes and hit rates of every registered cache"""
+        report = self.caches.report()
+        for cache in report['caches']:
+            cache['size_formatted'] = self._format_size(cache['bytes'])
+        report['memory_formatted'] = self._format_size(report['memory_bytes'])
+        if report['budget_bytes']:
+            report['budget_formatted'] = self._format_size(report['budget_bytes'])
+        return report
+    
+    def flush_cache(self, name):
+        """Flush one cache by name (ValueError if unknown or not flushable)"""
+        freed = self.caches.flush(name)
+        return {'name': name, 'freed_bytes': freed, 'freed_formatted': self._format_size(freed)}
+    
+    def apply_config(self, changed):
+        """
+        Apply changed settings to the running app, invalidating only what depends
+        on them: a new userdata path reloads subscriptions, library paths rescan
+        the content roots (incrementally), preview settings drop the thumbnails.
+        Returns {'applied': [...], 'restart_required': [...]}.
+        """
+        applied = []
+        restart_required = []
+        
+        if any(key in changed for key in SUBSCRIPTION_KEYS):
+            self.steam_parser.invalidate(subscriptions=True)
+            self.index.resync_subscriptions()
+            applied.append('subscriptions')
         
-        # Get folder size
-        size = self._get_folder_size(folder_path)
+        if any(key in changed for key in LIBRARY_KEYS):
+            self.steam_parser.invalidate(libraries=True)
+            self.index.content_roots_changed()
+            applied.append('content_roots')
         
-        # Get preview info
-        preview_path, preview_type = self.image_processor.find_preview_file(folder_path)
+        if 'preview' in changed:
+            applied.extend(self.image_processor.reconfigure() or ['preview'])
+        
+        if 'server' in changed:
+            # Host and port are bound at startup
+            restart_required.append('server')
+        
+        print(f"Config applied: {', '.join(applied) or 'nothing to reload'}"
+              + (f" (restart required: {', '.join(restart_required)})" if restart_required else ""))
+        return {'applied': applied, 'restart_required': restart_required}
+    
+    def watch_changes(self, last_event_id=None):
+        """
+        Stream library changes as (id, event, data) messages, blocking between
+        them; yields None as a keepalive while idle. Resumes after last_event_id
+        (the EventSource Last-Event-ID) or starts from now. Raises ValueError
+        for an invalid id.
+        """
+        last_event_id = parse_event_id(last_event_id)
+        cursor = self.index.changes.last_id if last_event_id is None else last_event_id
+        return self._watch(cursor)
+    
+    def _watch(self, cursor):
+        yield None  # Flushes the response headers, so the client sees the stream open right away
+        while True:
+            events = self.index.changes.wait(cursor, HEARTBEAT_SECONDS)
+            if not events:
+                yield None
+                continue
+            cursor = events[-1][0]
+            yield from self.describe_changes(events)
+    
+    def describe_changes(self, events):
+        """
+        Turn change feed events into client messages: changed wallpapers are
+        serialized as they are now (the client places them by their subscription
+        details); removals, statistics deltas ([count, size] per category and
+        user) and resets are passed through.
+        """
+        messages = []
+        for event_id, event_type, data in events:
+            if event_type == 'removed':
+                messages.append((event_id, event_type, data))
+            elif event_type in ('added', 'updated', 'resized', 'subscription'):
+                record = self.index.lookup(data['id'])
+                if record is None:
+                    continue  # Removed since; its 'removed' event follows
+                messages.append((event_id, event_type, {'wallpaper': self._get_wallpaper_info(record)}))
+            elif event_type == 'users':
+                messages.append((event_id, event_type, {'users': self.get_users()}))
+            else:
+                messages.append((event_id, event_type, data))
+        return messages
+    
+    def _get_folder_path(self, wallpaper_id):
+        """Resolve the folder of a wallpaper in whichever content root holds it"""
+        record = self.index.get_record(wallpaper_id)
+        if record is not None:
+            return Path(record.path)
+        return self.steam_parser.find_item_folder(wallpaper_id)
+    
+    def _empty_statistics(self):
+        """Statistics returned when no data is available (same shape, all zero)"""
+        empty = self._format_stat(0, 0)
+        return {
+            'total': dict(empty),
+            'subscribed': dict(empty),
+            'unsubscribed': dict(empty),
+            'disabled': dict(empty),
+            'not_subscribed': dict(empty),
+            'breakdown': {
+                'size_histogram': [dict(empty, label=label) for label, _ in SIZE_BUCKETS],
+                'by_type': {},
+                'by_root': {}
+            }
+        }
+    
+    def _format_stat(self, count, size):
+        """Format a (count, size) aggregate"""
+        return {
+            'count': count,
+            'size': size,
+            'size_formatted': self._format_size(size)
+        }
+    
+    def _get_wallpaper_info(self, record, subscribed=None):
+        """Serialize an index record with subscription details"""
+        wallpaper_id = record.id
         
         # Get subscription details from all users
         subscription_details = self.steam_parser.get_subscription_details_by_user(wallpaper_id)
         
         wallpaper_info = {
             'id': wallpaper_id,
-            'title': title,
-            'size': size,
-            'size_formatted': self._format_size(size),
-            'path': str(folder_path),
-            'preview_available': preview_path is not None,
-            'preview_type': preview_type,
+            'title': record.title,
+            'size': record.size,
+            'size_formatted': self._format_size(record.size),
+            'path': record.path,
+            'preview_available': record.preview_name is not None,
+            'preview_type': record.preview_type,
+            'placeholder': self.index.placeholder(record),
+            'colors': self._format_colors(self.index.colors(record)),
+            'type': record.type,
+            'tags': list(record.tags),
+            'content_rating': record.rating,
+            'media': self.index.media_info(record),
             'subscription_details': subscription_details or []
         }
+        if subscribed is not None:
+            wallpaper_info['subscribed'] = subscribed
         
         # Add user-friendly subscription info
         if subscription_details:
@@ -360,24 +686,14 @@ class WallpaperAPI:
         
         return wallpaper_info
     
-    def _get_wallpaper_title(self, folder_path):
-        """Get wallpaper title from project.json"""
-        project_file = folder_path / "project.json"
-        if project_file.exists():
-            try:
-                with open(project_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                return data.get('title', f'ID: {folder_path.name}')
-            except:
-                pass
-        return f'ID: {folder_path.name}'
-    
-    def _get_folder_size(self, folder_path):
-        """Get total size of folder"""
-        try:
-            return sum(f.stat().st_size for f in folder_path.rglob('*') if f.is_file())
-        except:
-            return 0
+    def _format_colors(self, colors):
+        """Average and dominant preview colours as hex strings (None until analyzed)"""
+        if not colors:
+            return None
+        return {
+            'average': to_hex(colors['average']),
+            'dominant': [{'color': to_hex(color), 'weight': color[3]} for color in colors['dominant']]
+        }
     
     def _format_size(self, size_bytes):
         """Format file size in human readable format"""
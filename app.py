@@ -4,38 +4,42 @@ Wallpaper Engine Web Manager
 Flask web application for managing Wallpaper Engine subscriptions
 """
 
-import json
 import os
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request, send_file
+import json
+from flask import Flask, Response, render_template, jsonify, request, send_file, stream_with_context
 from api.wallpaper import WallpaperAPI
-from api.config import ConfigAPI
+from api.config import ConfigAPI, load_config
+from utils.facet_index import parse_facet_args
+from utils.color_index import parse_color_args
+from utils.change_feed import format_event
 
 
-def create_app():
-    """Application factory"""
+def create_app(config=None):
+    """Application factory (config defaults to config.json)"""
     app = Flask(__name__)
     
     # Load configuration
-    config_path = Path('config.json')
-    if config_path.exists():
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        app.config.update(config)
-    else:
-        # Default configuration (path now points directly to 431960 directory)
-        app.config.update({
-            'steam_library_path': 'F:\\SteamLibrary\\steamapps\\workshop\\content\\431960',
-            'server': {
-                'host': '127.0.0.1',
-                'port': 5000,
-                'debug': True
-            }
-        })
+    app.config.update(config if config is not None else load_config())
     
     # Initialize APIs
     wallpaper_api = WallpaperAPI(app.config)
-    config_api = ConfigAPI(app.config)
+    config_api = ConfigAPI(app.config, wallpaper_api.apply_config)
+
+    # Rescans run in the background and pause while requests are being served
+    wallpaper_api.start_background_scanner()
+    throttle = wallpaper_api.scanner.throttle
+
+    # The live event stream stays open indefinitely and must not hold background work
+    @app.before_request
+    def pause_background_work():
+        if request.endpoint != 'library_events':
+            throttle.begin_interactive()
+
+    @app.teardown_request
+    def resume_background_work(exc=None):
+        if request.endpoint != 'library_events':
+            throttle.end_interactive()
     
     @app.route('/')
     def index():
@@ -57,79 +61,52 @@ def create_app():
             subscribed_page = int(request.args.get('subscribed_page', request.args.get('page', 1)))
             unsubscribed_page = int(request.args.get('unsubscribed_page', request.args.get('page', 1)))
             page_size = int(request.args.get('page_size', 20))
+            filter_expression = request.args.get('filter', None)
 
-            if user_filter and user_filter != 'all':
-                # 用户过滤也做分页处理
-                subscribed = wallpaper_api.get_wallpapers_by_user(user_filter, subscribed_only=True)
-                unsubscribed = wallpaper_api.get_wallpapers_by_user(user_filter, subscribed_only=False)
-                # 搜索和分页顺序：先搜索再分页
-                if search_query and search_query.strip():
-                    search_term = search_query.strip().lower()
-                    def matches_search(wallpaper):
-                        title_match = search_term in wallpaper.get('title', '').lower()
-                        return title_match
-                    subscribed = [w for w in subscribed if matches_search(w)]
-                    unsubscribed = [w for w in unsubscribed if matches_search(w)]
-                # 分别分页切片
-                sub_start = (subscribed_page - 1) * page_size
-                sub_end = sub_start + page_size
-                unsub_start = (unsubscribed_page - 1) * page_size
-                unsub_end = unsub_start + page_size
-                subscribed_result = subscribed[sub_start:sub_end]
-                unsubscribed_result = unsubscribed[unsub_start:unsub_end]
-                return jsonify({
-                    'success': True,
-                    'data': {
-                        'subscribed': {
-                            'total': len(subscribed),
-                            'page': subscribed_page,
-                            'page_size': page_size,
-                            'wallpapers': subscribed_result
-                        },
-                        'unsubscribed': {
-                            'total': len(unsubscribed),
-                            'page': unsubscribed_page,
-                            'page_size': page_size,
-                            'wallpapers': unsubscribed_result
-                        }
-                    }
-                })
-            else:
-                # 分页获取所有壁纸，搜索和分页顺序：先搜索再分页
-                all_subscribed = wallpaper_api.get_subscribed_wallpapers()
-                all_unsubscribed = wallpaper_api.get_unsubscribed_wallpapers()
-                if search_query and search_query.strip():
-                    search_term = search_query.strip().lower()
-                    def matches_search(wallpaper):
-                        title_match = search_term in wallpaper.get('title', '').lower()
-                        return title_match
-                    all_subscribed = [w for w in all_subscribed if matches_search(w)]
-                    all_unsubscribed = [w for w in all_unsubscribed if matches_search(w)]
-                # 分别分页切片
-                sub_start = (subscribed_page - 1) * page_size
-                sub_end = sub_start + page_size
-                unsub_start = (unsubscribed_page - 1) * page_size
-                unsub_end = unsub_start + page_size
-                subscribed_result = all_subscribed[sub_start:sub_end]
-                unsubscribed_result = all_unsubscribed[unsub_start:unsub_end]
-                
-                return jsonify({
-                    'success': True,
-                    'data': {
-                        'subscribed': {
-                            'total': len(all_subscribed),
-                            'page': subscribed_page,
-                            'page_size': page_size,
-                            'wallpapers': subscribed_result
-                        },
-                        'unsubscribed': {
-                            'total': len(all_unsubscribed),
-                            'page': unsubscribed_page,
-                            'page_size': page_size,
-                            'wallpapers': unsubscribed_result
-                        }
-                    }
-                })
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.get_wallpaper_page(
+                    user_filter, search_query, subscribed_page, unsubscribed_page, page_size,
+                    filter_expression=filter_expression,
+                    facets=parse_facet_args(request.args.getlist),
+                    color_query=parse_color_args(request.args.get)
+                ),
+                'freshness': wallpaper_api.get_freshness()
+            })
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/dashboard')
+    def get_dashboard():
+        """Get users, wallpaper pages and statistics from one snapshot (initial render, user switch)"""
+        try:
+            subscribed_page = int(request.args.get('subscribed_page', request.args.get('page', 1)))
+            unsubscribed_page = int(request.args.get('unsubscribed_page', request.args.get('page', 1)))
+            
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.get_dashboard(
+                    request.args.get('user', None), request.args.get('search', None),
+                    subscribed_page, unsubscribed_page, int(request.args.get('page_size', 20)),
+                    filter_expression=request.args.get('filter', None),
+                    facets=parse_facet_args(request.args.getlist),
+                    color_query=parse_color_args(request.args.get)
+                ),
+                'freshness': wallpaper_api.get_freshness()
+            })
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -159,9 +136,10 @@ def create_app():
     
     @app.route('/api/wallpapers/<wallpaper_id>/preview')
     def get_wallpaper_preview(wallpaper_id):
-        """Get wallpaper preview image"""
+        """Get wallpaper preview image (thumbnail unless ?original=1)"""
         try:
-            preview_path = wallpaper_api.get_preview_image(wallpaper_id)
+            original = request.args.get('original', '0').lower() in ('1', 'true', 'yes')
+            preview_path = wallpaper_api.get_preview_image(wallpaper_id, original=original)
             if preview_path and os.path.exists(preview_path):
                 return send_file(preview_path)
             else:
@@ -239,7 +217,8 @@ def create_app():
             if success:
                 return jsonify({
                     'success': True,
-                    'message': '配置保存成功'
+                    'message': '配置保存成功',
+                    'applied': config_api.last_applied
                 })
             else:
                 return jsonify({
@@ -257,11 +236,161 @@ def create_app():
         """Get storage and subscription statistics"""
         try:
             user_id = request.args.get('user', None)
-            stats = wallpaper_api.get_statistics(user_id)
+            filter_expression = request.args.get('filter', None)
+            stats = wallpaper_api.get_statistics(user_id, filter_expression=filter_expression)
             return jsonify({
                 'success': True,
-                'data': stats
+                'data': stats,
+                'freshness': wallpaper_api.get_freshness()
             })
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/sizes/verify')
+    def verify_sizes():
+        """Report drift between appworkshop_431960.acf sizes and on-disk sizes"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.verify_sizes()
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/integrity/verify')
+    def verify_integrity():
+        """Stream integrity verification progress as newline-delimited JSON events"""
+        try:
+            rebuild = request.args.get('rebuild', '0').lower() in ('1', 'true', 'yes')
+            events = wallpaper_api.verify_integrity(request.args.getlist('id'), rebuild=rebuild)
+            lines = (json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/cache')
+    def get_cache_report():
+        """Inspect cache sizes and hit rates against the memory budget"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.get_cache_report()
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/cache/<name>/flush', methods=['POST'])
+    def flush_cache(name):
+        """Flush one cache"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.flush_cache(name)
+            })
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/events')
+    def library_events():
+        """Push library changes (items, subscriptions, statistics) as server-sent events"""
+        try:
+            messages = wallpaper_api.watch_changes(
+                request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+            return Response(stream_with_context(format_event(message) for message in messages),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/offload')
+    def list_offloaded():
+        """List wallpapers offloaded to the secondary volume"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.list_offloaded()
+            })
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/offload', methods=['POST'])
+    def offload_wallpapers():
+        """Archive unsubscribed wallpapers, streaming progress as newline-delimited JSON events"""
+        try:
+            data = request.get_json(silent=True) or {}
+            events = wallpaper_api.offload_wallpapers(data.get('ids') or [])
+            lines = (json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/offload/<wallpaper_id>/restore', methods=['POST'])
+    def restore_wallpaper(wallpaper_id):
+        """Restore an offloaded wallpaper"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': wallpaper_api.restore_wallpaper(wallpaper_id)
+            })
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -272,25 +401,10 @@ def create_app():
     def get_users():
         """Get all Steam users with their subscription info"""
         try:
-            from utils.steam_parser import SteamParser
-            parser = SteamParser(app.config)
-            
-            # Get all subscription data
-            all_data = parser.get_all_subscription_data()
-            users = []
-            
-            for user_id, user_subscriptions in all_data.items():
-                active_subscriptions = [item_id for item_id, details in user_subscriptions.items() 
-                                      if details['is_active']]
-                users.append({
-                    'id': user_id,
-                    'display_name': f"用户 {user_id}",
-                    'subscription_count': len(active_subscriptions)
-                })
-            
             return jsonify({
                 'success': True,
-                'data': users
+                'data': wallpaper_api.get_users(),
+                'freshness': wallpaper_api.get_freshness(include_index=False)
             })
         except Exception as e:
             return jsonify({
@@ -302,36 +416,9 @@ def create_app():
     def get_steam_paths():
         """Get current Steam paths being used by the system"""
         try:
-            from utils.steam_parser import SteamParser
-            from api.config import ConfigAPI
-            
-            # Get configuration
-            config_api = ConfigAPI(app.config)
-            config_data = config_api.get_config()
-            configured_userdata = config_data.get('steam_userdata_path', '') if config_data else ''
-            
-            # Initialize parser with current config
-            parser = SteamParser(app.config)
-            
-            # Get the actual paths being used
-            userdata_path = parser.get_steam_user_data_path()
-            content_path = parser.get_content_path()
-            
-            # Check if we're using fallback
-            using_fallback = False
-            if configured_userdata and configured_userdata.strip():
-                # If a path is configured, check if it's different from what's actually used
-                actual_path_str = str(userdata_path) if userdata_path else ''
-                using_fallback = configured_userdata.strip() != actual_path_str
-            
             return jsonify({
                 'success': True,
-                'data': {
-                    'configured_userdata_path': configured_userdata if configured_userdata else None,
-                    'actual_userdata_path': str(userdata_path) if userdata_path else None,
-                    'content_path': str(content_path),
-                    'using_fallback': using_fallback
-                }
+                'data': config_api.get_steam_paths()
             })
         except Exception as e:
             return jsonify({
@@ -0,0 +1,527 @@
+# -*- coding: utf-8 -*-
+"""
+Wallpaper Engine Web Manager (ASGI)
+Async variant of the Flask application serving the same API
+
+Handlers are coroutines. Filesystem scans, Pillow work and file reads are
+offloaded to bounded thread pools and files are streamed in chunks, so
+hundreds of concurrent preview requests wait on futures instead of each
+holding a server thread.
+
+Run with: python asgi.py  (requires uvicorn: pip install uvicorn)
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from urllib.parse import parse_qs, unquote
+
+from api.wallpaper import WallpaperAPI
+from api.config import ConfigAPI, load_config
+from utils.facet_index import parse_facet_args
+from utils.color_index import parse_color_args
+from utils.change_feed import format_event, parse_event_id, HEARTBEAT_SECONDS
+
+
+BASE_DIR = Path(__file__).resolve().parent
+CHUNK_SIZE = 64 * 1024
+
+
+class Request:
+    """Minimal view of an ASGI HTTP request"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = unquote(scope['path'])
+        self.query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        self.args = {key: values[0] for key, values in self.query.items()}
+
+    def getlist(self, key):
+        """All values of a repeated query parameter"""
+        return self.query.get(key, [])
+
+    def header(self, name):
+        """Value of a request header (case-insensitive), or None"""
+        name = name.lower().encode('latin-1')
+        for key, value in self.scope.get('headers', []):
+            if key.lower() == name:
+                return value.decode('latin-1')
+        return None
+
+    async def wait_disconnect(self):
+        """Return once the client has gone away"""
+        while (await self.receive())['type'] != 'http.disconnect':
+            pass
+
+    async def body(self):
+        """Read the full request body"""
+        chunks = []
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    async def get_json(self):
+        """Parse the request body as JSON (None if empty or invalid)"""
+        try:
+            return json.loads(await self.body() or b'null')
+        except ValueError:
+            return None
+
+
+class WallpaperManagerASGI:
+    """ASGI application exposing the same routes as app.create_app()"""
+
+    def __init__(self, config):
+        self.config = config
+        self.wallpaper_api = WallpaperAPI(config)
+        self.config_api = ConfigAPI(config, self.wallpaper_api.apply_config)
+        self.wallpaper_api.start_background_scanner()
+
+        # Bounded executors: scans, image processing and file I/O never share threads
+        asgi_config = config.get('asgi', {})
+        self.scan_executor = ThreadPoolExecutor(
+            max_workers=asgi_config.get('scan_workers', 2), thread_name_prefix='asgi-scan')
+        self.image_executor = ThreadPoolExecutor(
+            max_workers=asgi_config.get('image_workers', 2), thread_name_prefix='asgi-image')
+        self.file_executor = ThreadPoolExecutor(
+            max_workers=asgi_config.get('file_workers', 8), thread_name_prefix='asgi-file')
+
+        self._templates = None
+        self.routes = [
+            ('GET', r'/', self.index),
+            ('GET', r'/static/(?P<filename>.+)', self.static),
+            ('GET', r'/api/wallpapers', self.get_wallpapers),
+            ('GET', r'/api/dashboard', self.get_dashboard),
+            ('GET', r'/api/wallpapers/(?P<wallpaper_id>[^/]+)', self.get_wallpaper),
+            ('GET', r'/api/wallpapers/(?P<wallpaper_id>[^/]+)/preview', self.get_wallpaper_preview),
+            ('DELETE', r'/api/wallpapers/(?P<wallpaper_id>[^/]+)', self.delete_wallpaper),
+            ('POST', r'/api/wallpapers/(?P<wallpaper_id>[^/]+)/open-folder', self.open_wallpaper_folder),
+            ('GET', r'/api/config', self.get_config),
+            ('POST', r'/api/config', self.update_config),
+            ('GET', r'/api/stats', self.get_stats),
+            ('GET', r'/api/sizes/verify', self.verify_sizes),
+            ('GET', r'/api/integrity/verify', self.verify_integrity),
+            ('GET', r'/api/offload', self.list_offloaded),
+            ('POST', r'/api/offload', self.offload_wallpapers),
+            ('POST', r'/api/offload/(?P<wallpaper_id>[^/]+)/restore', self.restore_wallpaper),
+            ('GET', r'/api/cache', self.get_cache_report),
+            ('POST', r'/api/cache/(?P<name>[^/]+)/flush', self.flush_cache),
+            ('GET', r'/api/events', self.library_events),
+            ('GET', r'/api/users', self.get_users),
+            ('GET', r'/api/steam-paths', self.get_steam_paths),
+        ]
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in self.routes]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        request = Request(scope, receive)
+        if request.path == '/api/events':
+            # The live event stream stays open indefinitely and must not hold background work
+            await self._dispatch(request, send)
+            return
+        with self.wallpaper_api.scanner.throttle.interactive():
+            await self._dispatch(request, send)
+
+    async def _dispatch(self, request, send):
+        """Route a request to its handler (background rescans are paused meanwhile)"""
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match and method == request.method:
+                # Streaming handlers may fail after the response has started
+                response = {'started': False, 'finished': False}
+
+                async def tracked_send(message):
+                    if message['type'] == 'http.response.start':
+                        response['started'] = True
+                    elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                        response['finished'] = True
+                    await send(message)
+
+                try:
+                    await handler(request, tracked_send, **match.groupdict())
+                except Exception as e:
+                    await self._send_error(send, response, e)
+                return
+
+        await self.send_json(send, {
+            'success': False,
+            'error': 'Endpoint not found'
+        }, 404)
+
+    async def _send_error(self, send, response, error):
+        """Answer with a JSON error, or end an already started response (its status is sent)"""
+        if not response['started']:
+            await self.send_json(send, {
+                'success': False,
+                'error': str(error)
+            }, 400 if isinstance(error, ValueError) else 500)
+            return
+
+        print(f"Error while streaming response: {error}")
+        if not response['finished']:
+            try:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            except Exception:
+                pass  # Client already gone
+
+    async def _lifespan(self, receive, send):
+        """Handle server startup/shutdown"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.wallpaper_api.scanner.stop()
+                for executor in (self.scan_executor, self.image_executor, self.file_executor):
+                    executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def run_in(self, executor, func, *args, **kwargs):
+        """Run blocking work in one of the bounded executors"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+    # Response helpers
+
+    async def send_json(self, send, payload, status=200):
+        """Send a JSON response"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json; charset=utf-8'),
+                (b'content-length', str(len(body)).encode('latin-1'))
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def send_html(self, send, html, status=200):
+        """Send an HTML response"""
+        body = html.encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'text/html; charset=utf-8'),
+                (b'content-length', str(len(body)).encode('latin-1'))
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def send_file(self, send, path):
+        """Stream a file in chunks, reading each chunk in the file executor"""
+        content_type = mimetypes.guess_type(str(path))[0] or 'application/octet-stream'
+        f = await self.run_in(self.file_executor, open, path, 'rb')
+        try:
+            size = os.fstat(f.fileno()).st_size
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', content_type.encode('latin-1')),
+                    (b'content-length', str(size).encode('latin-1'))
+                ]
+            })
+            while True:
+                chunk = await self.run_in(self.file_executor, f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await self.run_in(self.file_executor, f.close)
+
+    async def send_stream(self, send, events, content_type):
+        """Send a generator of JSON events as lines, advancing it in the file executor"""
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', content_type.encode('latin-1'))]
+        })
+        try:
+            while True:
+                event = await self.run_in(self.file_executor, next, events, None)
+                if event is None:
+                    break
+                line = json.dumps(event, ensure_ascii=False) + '\n'
+                await send({'type': 'http.response.body', 'body': line.encode('utf-8'), 'more_body': True})
+        finally:
+            await self.run_in(self.file_executor, events.close)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    # Pages
+
+    async def index(self, request, send):
+        """Main page"""
+        if self._templates is None:
+            from jinja2 import Environment, FileSystemLoader
+            self._templates = Environment(loader=FileSystemLoader(str(BASE_DIR / 'templates')),
+                                          autoescape=True)
+            self._templates.globals['url_for'] = lambda endpoint, filename='': f'/static/{filename}'
+        html = await self.run_in(self.file_executor, self._templates.get_template('index.html').render)
+        await self.send_html(send, html)
+
+    async def static(self, request, send, filename):
+        """Static assets"""
+        static_dir = (BASE_DIR / 'static').resolve()
+        path = (static_dir / filename).resolve()
+        if static_dir not in path.parents or not path.is_file():
+            await self.send_json(send, {'success': False, 'error': 'Endpoint not found'}, 404)
+            return
+        await self.send_file(send, path)
+
+    # API routes (same payloads as app.py)
+
+    async def get_wallpapers(self, request, send):
+        """Get wallpapers with pagination"""
+        args = request.args
+        page = args.get('page', 1)
+        data = await self.run_in(
+            self.scan_executor, self.wallpaper_api.get_wallpaper_page,
+            args.get('user'), args.get('search'),
+            int(args.get('subscribed_page', page)), int(args.get('unsubscribed_page', page)),
+            int(args.get('page_size', 20)),
+            filter_expression=args.get('filter'),
+            facets=parse_facet_args(request.getlist),
+            color_query=parse_color_args(args.get)
+        )
+        await self.send_json(send, {'success': True, 'data': data,
+                                    'freshness': self.wallpaper_api.get_freshness()})
+
+    async def get_dashboard(self, request, send):
+        """Get users, wallpaper pages and statistics from one snapshot"""
+        args = request.args
+        page = args.get('page', 1)
+        data = await self.run_in(
+            self.scan_executor, self.wallpaper_api.get_dashboard,
+            args.get('user'), args.get('search'),
+            int(args.get('subscribed_page', page)), int(args.get('unsubscribed_page', page)),
+            int(args.get('page_size', 20)),
+            filter_expression=args.get('filter'),
+            facets=parse_facet_args(request.getlist),
+            color_query=parse_color_args(args.get)
+        )
+        await self.send_json(send, {'success': True, 'data': data,
+                                    'freshness': self.wallpaper_api.get_freshness()})
+
+    async def get_wallpaper(self, request, send, wallpaper_id):
+        """Get specific wallpaper details"""
+        wallpaper = await self.run_in(self.scan_executor, self.wallpaper_api.get_wallpaper_details, wallpaper_id)
+        if wallpaper:
+            await self.send_json(send, {'success': True, 'data': wallpaper})
+        else:
+            await self.send_json(send, {'success': False, 'error': 'Wallpaper not found'}, 404)
+
+    async def get_wallpaper_preview(self, request, send, wallpaper_id):
+        """Get wallpaper preview image (thumbnail unless ?original=1)"""
+        original = request.args.get('original', '0').lower() in ('1', 'true', 'yes')
+        try:
+            preview_path, preview_type = await self.run_in(self.file_executor, self.wallpaper_api.find_preview,
+                                                           wallpaper_id)
+        except Exception as e:
+            print(f"Error getting preview image: {e}")
+            preview_path, preview_type = None, None
+        
+        if preview_path and preview_type == 'gif' and not original:
+            # Only building a GIF thumbnail needs Pillow and the image executor; cache hits are file lookups
+            image_processor = self.wallpaper_api.image_processor
+            thumbnail = await self.run_in(self.file_executor, image_processor.find_animated_thumbnail, preview_path)
+            if thumbnail is None:
+                thumbnail = await self.run_in(self.image_executor, image_processor.get_animated_thumbnail,
+                                              preview_path)
+            preview_path = thumbnail or preview_path
+        if preview_path and os.path.exists(preview_path):
+            await self.send_file(send, preview_path)
+            return
+
+        placeholder_path = BASE_DIR / 'static' / 'images' / 'no-preview.png'
+        if placeholder_path.exists():
+            await self.send_file(send, placeholder_path)
+        else:
+            await self.send_json(send, {'success': False, 'error': 'Preview not available'}, 404)
+
+    async def delete_wallpaper(self, request, send, wallpaper_id):
+        """Delete a wallpaper"""
+        success = await self.run_in(self.scan_executor, self.wallpaper_api.delete_wallpaper, wallpaper_id)
+        await self.send_json(send, {
+            'success': success,
+            'message': 'Wallpaper deleted successfully' if success else 'Failed to delete wallpaper'
+        })
+
+    async def open_wallpaper_folder(self, request, send, wallpaper_id):
+        """Open wallpaper folder in file explorer"""
+        success = await self.run_in(self.file_executor, self.wallpaper_api.open_wallpaper_folder, wallpaper_id)
+        await self.send_json(send, {
+            'success': success,
+            'message': 'Folder opened successfully' if success else 'Failed to open folder'
+        })
+
+    async def get_config(self, request, send):
+        """Get current configuration"""
+        await self.send_json(send, {'success': True, 'data': self.config_api.get_config()})
+
+    async def update_config(self, request, send):
+        """Update configuration"""
+        new_config = await request.get_json()
+        if not new_config:
+            await self.send_json(send, {'success': False, 'error': '请求数据为空'}, 400)
+            return
+
+        success = await self.run_in(self.file_executor, self.config_api.update_config, new_config)
+        if success:
+            await self.send_json(send, {'success': True, 'message': '配置保存成功',
+                                        'applied': self.config_api.last_applied})
+        else:
+            await self.send_json(send, {'success': False, 'error': '配置保存失败'}, 500)
+
+    async def get_stats(self, request, send):
+        """Get storage and subscription statistics"""
+        stats = await self.run_in(self.scan_executor, self.wallpaper_api.get_statistics,
+                                  request.args.get('user'), filter_expression=request.args.get('filter'))
+        await self.send_json(send, {'success': True, 'data': stats,
+                                    'freshness': self.wallpaper_api.get_freshness()})
+
+    async def verify_sizes(self, request, send):
+        """Report drift between appworkshop_431960.acf sizes and on-disk sizes"""
+        report = await self.run_in(self.scan_executor, self.wallpaper_api.verify_sizes)
+        await self.send_json(send, {'success': True, 'data': report})
+
+    async def verify_integrity(self, request, send):
+        """Stream integrity verification progress as newline-delimited JSON events"""
+        rebuild = request.args.get('rebuild', '0').lower() in ('1', 'true', 'yes')
+        events = await self.run_in(self.scan_executor, self.wallpaper_api.verify_integrity,
+                                   request.getlist('id'), rebuild=rebuild)
+        await self.send_stream(send, events, 'application/x-ndjson')
+
+    async def list_offloaded(self, request, send):
+        """List wallpapers offloaded to the secondary volume"""
+        archives = await self.run_in(self.file_executor, self.wallpaper_api.list_offloaded)
+        await self.send_json(send, {'success': True, 'data': archives})
+
+    async def offload_wallpapers(self, request, send):
+        """Archive unsubscribed wallpapers, streaming progress as newline-delimited JSON events"""
+        data = await request.get_json() or {}
+        events = await self.run_in(self.scan_executor, self.wallpaper_api.offload_wallpapers,
+                                   data.get('ids') or [])
+        await self.send_stream(send, events, 'application/x-ndjson')
+
+    async def restore_wallpaper(self, request, send, wallpaper_id):
+        """Restore an offloaded wallpaper"""
+        report = await self.run_in(self.file_executor, self.wallpaper_api.restore_wallpaper, wallpaper_id)
+        await self.send_json(send, {'success': True, 'data': report})
+
+    async def get_cache_report(self, request, send):
+        """Inspect cache sizes and hit rates against the memory budget"""
+        report = await self.run_in(self.scan_executor, self.wallpaper_api.get_cache_report)
+        await self.send_json(send, {'success': True, 'data': report})
+
+    async def flush_cache(self, request, send, name):
+        """Flush one cache"""
+        result = await self.run_in(self.file_executor, self.wallpaper_api.flush_cache, name)
+        await self.send_json(send, {'success': True, 'data': result})
+
+    async def library_events(self, request, send):
+        """
+        Push library changes as server-sent events. The stream waits on the change
+        feed through an asyncio event, so idle clients hold no executor thread.
+        """
+        feed = self.wallpaper_api.index.changes
+        last_event_id = parse_event_id(request.header('last-event-id') or request.args.get('last_event_id'))
+        cursor = feed.last_id if last_event_id is None else last_event_id
+
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(changed.set)
+
+        feed.add_listener(listener)
+        disconnected = asyncio.ensure_future(request.wait_disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')
+                ]
+            })
+            while not disconnected.done():
+                changed.clear()
+                events = feed.since(cursor)
+                if events:
+                    cursor = events[-1][0]
+                    messages = await self.run_in(self.file_executor, self.wallpaper_api.describe_changes, events)
+                    body = ''.join(format_event(message) for message in messages)
+                else:
+                    waiter = asyncio.ensure_future(changed.wait())
+                    done, _ = await asyncio.wait([waiter, disconnected], timeout=HEARTBEAT_SECONDS,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    if done:
+                        continue
+                    body = format_event(None)
+                if body:
+                    await send({'type': 'http.response.body', 'body': body.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            feed.remove_listener(listener)
+            disconnected.cancel()
+
+    async def get_users(self, request, send):
+        """Get all Steam users with their subscription info"""
+        users = await self.run_in(self.scan_executor, self.wallpaper_api.get_users)
+        await self.send_json(send, {'success': True, 'data': users,
+                                    'freshness': self.wallpaper_api.get_freshness(include_index=False)})
+
+    async def get_steam_paths(self, request, send):
+        """Get current Steam paths being used by the system"""
+        paths = await self.run_in(self.scan_executor, self.config_api.get_steam_paths)
+        await self.send_json(send, {'success': True, 'data': paths})
+
+
+def create_asgi_app():
+    """ASGI application factory (uvicorn asgi:create_asgi_app --factory)"""
+    return WallpaperManagerASGI(load_config())
+
+
+def main():
+    """Main function"""
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is required for the ASGI server: pip install uvicorn")
+        return
+
+    app = create_asgi_app()
+    server_config = app.config.get('server', {})
+    host = server_config.get('host', '127.0.0.1')
+    port = server_config.get('port', 5000)
+
+    print("🚀 Starting Wallpaper Engine Web Manager (ASGI)...")
+    print(f"📍 Server: http://{host}:{port}")
+    uvicorn.run(app, host=host, port=port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Wallpaper Manager CLI
+Statistics, listing and bulk cleanup from the command line, for scheduled runs
+
+Uses the same WallpaperAPI as the web app without importing Flask; Pillow is
+only loaded if a command needs to decode an image (none of these do). The
+index saved by the last run (web app or CLI) is loaded first, so on a warm
+index a command only stats the wallpaper folders before answering.
+
+Results go to stdout; progress and diagnostics go to stderr.
+
+Examples:
+    python cli.py stats
+    python cli.py list --min-size 500MB --format csv > unsubscribed.csv
+    python cli.py delete --user 12345678 --min-size 1GB --yes
+    python cli.py offload --filter "disabled" --yes
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import re
+import sys
+import time
+
+from api.config import load_config
+from api.wallpaper import WallpaperAPI
+
+
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2,
+              'G': 1024 ** 3, 'GB': 1024 ** 3, 'T': 1024 ** 4, 'TB': 1024 ** 4}
+
+LIST_FIELDS = ['id', 'title', 'type', 'size', 'size_formatted', 'path']
+
+
+def parse_size(value):
+    """Parse '500MB', '1.5G' or a plain byte count (binary units, like the web UI)"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*', value)
+    if not match or match.group(2).upper() not in SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Wallpaper Engine workshop manager (headless)')
+    parser.add_argument('--config', default='config.json', help='Config file (default: config.json)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan = commands.add_parser('scan', help='Update the index and print a summary')
+    scan.add_argument('--verify-sizes', action='store_true',
+                      help='Walk every folder and correct sizes taken from the workshop manifest')
+
+    stats = commands.add_parser('stats', help='Storage and subscription statistics')
+    stats.add_argument('--user', help='Steam user id (default: all users)')
+    stats.add_argument('--filter', help='Also total the items matching a subscription filter expression')
+    stats.add_argument('--json', action='store_true', help='Print the full statistics as JSON')
+
+    # Selection shared by list, delete and offload: always unsubscribed items
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument('--user', help='Unsubscribed for this Steam user id (default: for every user)')
+    selection.add_argument('--min-size', type=parse_size, help='Only items at least this large (e.g. 500MB)')
+    selection.add_argument('--max-size', type=parse_size, help='Only items at most this large')
+    selection.add_argument('--filter', help='Subscription filter expression the items must also match')
+
+    listing = commands.add_parser('list', parents=[selection], help='List unsubscribed items')
+    listing.add_argument('--format', choices=['json', 'csv'], default='json')
+
+    for name, description in (('delete', 'Delete unsubscribed items'),
+                              ('offload', 'Archive unsubscribed items to offload.path')):
+        command = commands.add_parser(name, parents=[selection], help=description)
+        command.add_argument('--yes', action='store_true',
+                             help='Actually do it (without it only the selection is printed)')
+    return parser
+
+
+def select(api, args):
+    if args.user and args.user not in {user['id'] for user in api.get_users()}:
+        raise ValueError(f"Unknown Steam user: {args.user}")
+    return api.select_unsubscribed(args.user, args.min_size, args.max_size, args.filter)
+
+
+def describe(api, record):
+    return {
+        'id': record.id,
+        'title': record.title,
+        'type': record.type,
+        'size': record.size,
+        'size_formatted': api._format_size(record.size),
+        'path': record.path
+    }
+
+
+def run_scan(api, args, out):
+    start = time.time()
+    loaded = len(api.index.records())
+    api.index.refresh(force=True)
+    total, size = api.index.get_statistics()['total']
+    print(f"{total} wallpapers, {api._format_size(size)} "
+          f"({time.time() - start:.2f}s, {loaded} loaded from {api.index.index_file})", file=out)
+
+    if args.verify_sizes:
+        report = api.verify_sizes()
+        for item in report['drift']:
+            print(f"{item['id']}: manifest {item['manifest_size_formatted']}, "
+                  f"disk {item['disk_size_formatted']}", file=out)
+        print(f"{len(report['drift'])} size(s) corrected", file=out)
+    return 0
+
+
+def run_stats(api, args, out):
+    if args.user and args.user not in {user['id'] for user in api.get_users()}:
+        raise ValueError(f"Unknown Steam user: {args.user}")
+    stats = api.get_statistics(args.user, filter_expression=args.filter)
+    if args.json:
+        json.dump(stats, out, ensure_ascii=False, indent=2)
+        out.write('\n')
+        return 0
+
+    for name in ('total', 'subscribed', 'unsubscribed', 'disabled', 'not_subscribed', 'filter'):
+        if name in stats:
+            stat = stats[name]
+            print(f"{name:<15}{stat['count']:>8}  {stat['size_formatted']:>12}", file=out)
+    return 0
+
+
+def run_list(api, args, out):
+    rows = [describe(api, record) for record in select(api, args)]
+    if args.format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=LIST_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, out, ensure_ascii=False, indent=2)
+        out.write('\n')
+    return 0
+
+
+def run_cleanup(api, args, out):
+    records = select(api, args)
+    total = sum(record.size for record in records)
+    if not args.yes:
+        for record in records:
+            print(f"{record.id}  {api._format_size(record.size):>12}  {record.title}", file=out)
+        action = 'deleted' if args.command == 'delete' else 'offloaded'
+        print(f"{len(records)} item(s), {api._format_size(total)} would be {action} "
+              f"(dry run, pass --yes)", file=out)
+        return 0
+    if not records:
+        print("Nothing to do", file=out)
+        return 0
+
+    if args.command == 'delete':
+        failed = 0
+        for record in records:
+            if api.delete_wallpaper(record.id):
+                print(f"deleted  {record.id}  {api._format_size(record.size)}", file=out)
+            else:
+                failed += 1
+                print(f"failed   {record.id}", file=out)
+        print(f"{len(records) - failed} deleted, {failed} failed", file=out)
+        return 1 if failed else 0
+
+    summary = {}
+    for event in api.offload_wallpapers([record.id for record in records]):
+        if event['event'] == 'item':
+            print(f"[{event['done']}/{event['total']}] {event['status']:<10} {event['id']}", file=out)
+        elif event['event'] == 'done':
+            summary = event['summary']
+    print(f"{summary.get('offloaded', 0)} offloaded, {summary.get('errors', 0)} failed, "
+          f"{api._format_size(summary.get('bytes_in', 0))} -> {api._format_size(summary.get('bytes_out', 0))}",
+          file=out)
+    return 1 if summary.get('errors') else 0
+
+
+COMMANDS = {
+    'scan': run_scan,
+    'stats': run_stats,
+    'list': run_list,
+    'delete': run_cleanup,
+    'offload': run_cleanup
+}
+
+
+def main(argv=None):
+    """Main function"""
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+
+    # Library messages (path discovery, scan progress) must not mix with JSON/CSV output
+    with contextlib.redirect_stdout(sys.stderr):
+        api = WallpaperAPI(load_config(args.config))
+        try:
+            return COMMANDS[args.command](api, args, out)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 2
+        finally:
+            # Deletions and offloads changed the index; the next run starts from it
+            api.index.save()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,16 +2,92 @@
 """
 Wallpaper Manager Launcher
 Auto-starts Flask server and opens browser
+
+The listening socket is bound before Flask, Pillow or vdf are imported, so the
+browser can connect immediately; its request waits in the accept backlog until
+the app has finished initializing. Run with --profile-startup to print the
+import and initialization time of every module loaded during startup.
 """
 
+import builtins
+import socket
+import sys
 import threading
 import time
 import webbrowser
-import sys
-import os
 
-# Import the Flask app
-from app import create_app
+
+class StartupProfiler:
+    """Records import and initialization time per module during startup"""
+
+    def __init__(self):
+        self.enabled = False
+        self.imports = {}  # module name -> (cumulative seconds, self seconds)
+        self.stages = []   # (stage name, seconds)
+        self._original_import = builtins.__import__
+        self._stack = []
+        self._thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+
+    def enable(self):
+        """Start timing first-time imports made by the main thread"""
+        self.enabled = True
+        builtins.__import__ = self._timed_import
+
+    def disable(self):
+        """Restore the original import hook"""
+        builtins.__import__ = self._original_import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Only time absolute imports that actually load something new
+        if (level or name in sys.modules or
+                threading.get_ident() != self._thread_id):
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.imports[name] = (elapsed, elapsed - children)
+
+    def stage(self, name):
+        """Context manager timing an initialization stage"""
+        profiler = self
+
+        class _Stage:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                profiler.stages.append((name, time.perf_counter() - self.start))
+                return False
+
+        return _Stage()
+
+    def report(self, limit=25):
+        """Print stage and per-module timings"""
+        if not self.enabled:
+            return
+
+        total = time.perf_counter() - self._start
+        print("\n" + "-" * 60)
+        print("⏱  Startup profile")
+        print("-" * 60)
+        for name, seconds in self.stages:
+            print(f"  {name:<40} {seconds * 1000:9.1f} ms")
+
+        print(f"\n  {'module':<40} {'cumulative':>10} {'self':>9}")
+        ranked = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (cumulative, own) in ranked[:limit]:
+            print(f"  {name:<40} {cumulative * 1000:7.1f} ms {own * 1000:6.1f} ms")
+        print(f"\n  Total time to serving: {total * 1000:.1f} ms")
+        print("-" * 60 + "\n")
+
 
 def open_browser(url='http://127.0.0.1:5000', delay=1):
     """Open browser after a delay"""
@@ -23,47 +99,82 @@ def open_browser(url='http://127.0.0.1:5000', delay=1):
         print(f"⚠️  Could not open browser automatically: {e}")
         print(f"📍 Please open manually: {url}")
 
-def main():
-    """Main launcher function"""
-    print("=" * 60)
-    print("🎨 Wallpaper Engine Web Manager")
-    print("=" * 60)
-    
-    # Get configuration
+
+def load_server_address():
+    """Read host and port from config.json without importing the app"""
+    host = '127.0.0.1'
+    port = 5000
     try:
         import json
         from pathlib import Path
-        
+
         config_path = Path('config.json')
         if config_path.exists():
             with open(config_path, 'r', encoding='utf-8') as f:
                 config = json.load(f)
-            host = config.get('server', {}).get('host', '127.0.0.1')
-            port = config.get('server', {}).get('port', 5000)
-        else:
-            host = '127.0.0.1'
-            port = 5000
+            host = config.get('server', {}).get('host', host)
+            port = config.get('server', {}).get('port', port)
     except Exception as e:
         print(f"⚠️  Could not load config: {e}")
-        host = '127.0.0.1'
-        port = 5000
-    
+    return host, port
+
+
+def bind_listening_socket(host, port):
+    """Bind and listen before the app exists so clients can queue early"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if sys.platform != 'win32':
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
+
+
+def main():
+    """Main launcher function"""
+    profiler = StartupProfiler()
+    if '--profile-startup' in sys.argv[1:]:
+        profiler.enable()
+
+    print("=" * 60)
+    print("🎨 Wallpaper Engine Web Manager")
+    print("=" * 60)
+
+    # Get configuration
+    host, port = load_server_address()
     url = f"http://{host}:{port}"
-    
+
+    try:
+        with profiler.stage('bind listening socket'):
+            sock = bind_listening_socket(host, port)
+    except OSError as e:
+        print(f"\n❌ Could not listen on {url}: {e}")
+        input("Press Enter to exit...")
+        sys.exit(1)
+
     print(f"\n🚀 Starting server on {url}")
-    print(f"💡 Browser will open automatically in 2 seconds...")
+    print(f"💡 Browser will open automatically...")
     print(f"⚠️  Press Ctrl+C to stop the server\n")
-    
-    # Create Flask app
-    app = create_app()
-    
-    # Start browser opener in background thread
-    browser_thread = threading.Thread(target=open_browser, args=(url, 2), daemon=True)
+
+    # The socket already accepts connections, so the browser can be opened now
+    browser_thread = threading.Thread(target=open_browser, args=(url, 0), daemon=True)
     browser_thread.start()
-    
+
+    # Import and create Flask app (heavy imports happen here)
+    with profiler.stage('import app (Flask, werkzeug)'):
+        from app import create_app
+        from werkzeug.serving import make_server
+    with profiler.stage('create_app'):
+        app = create_app()
+    with profiler.stage('attach server to socket'):
+        server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+
+    profiler.disable()
+    profiler.report()
+
     # Start Flask server
     try:
-        app.run(host=host, port=port, debug=False, threaded=True, use_reloader=False)
+        server.serve_forever()
     except KeyboardInterrupt:
         print("\n\n👋 Server stopped by user")
         sys.exit(0)
@@ -71,6 +182,9 @@ def main():
         print(f"\n❌ Server error: {e}")
         input("Press Enter to exit...")
         sys.exit(1)
+    finally:
+        server.server_close()
+        sock.close()
 
 if __name__ == '__main__':
     main()
@@ -59,7 +59,6 @@ a = Analysis(
         # Exclude unnecessary modules
         'tkinter',
         'matplotlib',
-        'numpy',
         'pandas',
         'scipy',
         'IPython',
@@ -11,6 +11,8 @@ class WallpaperManager {
         this.currentUserFilter = 'all';
         this.currentSearchQuery = '';
         this.searchTimeout = null;
+        this.currentSort = 'size';
+        this.currentColor = null;
 
         // 分页相关状态
         this.subscribedPage = 1;
@@ -19,14 +21,24 @@ class WallpaperManager {
         this.subscribedTotal = 0;
         this.unsubscribedTotal = 0;
 
+        // 虚拟网格：只渲染可见行，预览图按视口懒加载（最多 6 个并发）
+        this.previewLoader = new PreviewLoader({ maxConcurrent: 6 });
+        this.grids = {};
+
+        // 实时更新：索引变化通过 SSE 推送，就地修补网格和统计
+        this.stats = null;
+        this.events = null;
+        this.liveUpdates = false;
+        this.listReloadTimeout = null;
+
         this.init();
     }
     
     init() {
         this.setupEventListeners();
         this.loadConfiguration();
-        this.loadUsers();
-        this.loadData();
+        this.connectEvents();
+        this.loadDashboard();
     }
     
     setupEventListeners() {
@@ -48,13 +60,40 @@ class WallpaperManager {
             console.error('Search input not found!');
         }
         
+        // 排序与按颜色搜索
+        const sortOrder = document.getElementById('sortOrder');
+        if (sortOrder) {
+            sortOrder.addEventListener('change', (e) => {
+                this.currentSort = e.target.value;
+                this.subscribedPage = this.unsubscribedPage = 1;
+                this.loadData();
+            });
+        }
+        const colorFilter = document.getElementById('colorFilter');
+        if (colorFilter) {
+            colorFilter.addEventListener('change', (e) => {
+                this.currentColor = e.target.value;
+                this.subscribedPage = this.unsubscribedPage = 1;
+                this.loadData();
+            });
+        }
+        const clearColor = document.getElementById('clearColorFilter');
+        if (clearColor) {
+            clearColor.addEventListener('click', () => {
+                if (!this.currentColor) return;
+                this.currentColor = null;
+                this.subscribedPage = this.unsubscribedPage = 1;
+                this.loadData();
+            });
+        }
+        
         // User filter
         const userFilter = document.getElementById('userFilter');
         if (userFilter) {
             userFilter.addEventListener('change', (e) => {
                 this.currentUserFilter = e.target.value;
-                this.loadData();
-                this.loadStatistics(); // Also update statistics when user changes
+                // Users, list and statistics come back together in one response
+                this.loadDashboard();
             });
         }
         
@@ -70,6 +109,9 @@ class WallpaperManager {
         const tabLinks = document.querySelectorAll('[data-bs-toggle="tab"]');
         tabLinks.forEach(tab => {
             tab.addEventListener('shown.bs.tab', () => {
+                // Grids in hidden tabs cannot be measured; render them once shown
+                const grid = this.getActiveGrid();
+                if (grid) grid.update(true);
                 this.updateSelectAllState();
             });
         });
@@ -91,31 +133,19 @@ class WallpaperManager {
     populateConfigForm(config) {
         const steamLibraryPath = document.getElementById('steamLibraryPath');
         const steamUserdataPath = document.getElementById('steamUserdataPath');
+        const contentRoots = document.getElementById('contentRoots');
+        const autoDiscoverLibraries = document.getElementById('autoDiscoverLibraries');
         const serverPort = document.getElementById('serverPort');
         const debugMode = document.getElementById('debugMode');
         
         if (steamLibraryPath) steamLibraryPath.value = config.steam_library_path || '';
         if (steamUserdataPath) steamUserdataPath.value = config.steam_userdata_path || '';
+        if (contentRoots) contentRoots.value = (config.content_roots || []).join('\n');
+        if (autoDiscoverLibraries) autoDiscoverLibraries.checked = config.auto_discover_libraries !== false;
         if (serverPort) serverPort.value = config.server?.port || 5000;
         if (debugMode) debugMode.checked = config.server?.debug || false;
     }
     
-    async loadUsers() {
-        try {
-            const response = await fetch('/api/users');
-            const result = await response.json();
-            
-            if (result.success) {
-                this.users = result.data;
-                this.populateUserFilter();
-            } else {
-                console.error('Error loading users:', result.error);
-            }
-        } catch (error) {
-            console.error('Error loading users:', error);
-        }
-    }
-    
     populateUserFilter() {
         const userFilter = document.getElementById('userFilter');
         if (!userFilter) return;
@@ -132,6 +162,60 @@ class WallpaperManager {
             option.textContent = `${user.display_name} (${user.subscription_count} 订阅)`;
             userFilter.appendChild(option);
         });
+        userFilter.value = this.currentUserFilter;
+    }
+    
+    buildListParams() {
+        const params = new URLSearchParams();
+        if (this.currentSearchQuery) {
+            params.append('search', this.currentSearchQuery);
+        }
+        if (this.currentUserFilter && this.currentUserFilter !== 'all') {
+            params.append('user', this.currentUserFilter);
+        }
+        if (this.currentSort !== 'size') {
+            params.append('sort', this.currentSort);
+        }
+        if (this.currentColor) {
+            params.append('color', this.currentColor);
+        }
+        // 分别传递已订阅和未订阅的页码
+        params.append('subscribed_page', this.subscribedPage);
+        params.append('unsubscribed_page', this.unsubscribedPage);
+        params.append('page_size', this.pageSize);
+        return params;
+    }
+    
+    async loadDashboard() {
+        // 初始加载和切换用户：用户、两个列表和统计来自同一个快照
+        this.showLoading(true);
+        try {
+            const response = await fetch('/api/dashboard?' + this.buildListParams().toString());
+            const result = await response.json();
+            
+            if (!result.success) {
+                this.showToast('Error loading data: ' + result.error, 'error');
+                return;
+            }
+            
+            this.users = result.data.users;
+            this.populateUserFilter();
+            this.applyWallpaperData(result.data.wallpapers);
+            this.renderWallpapers();
+            this.renderPagination();
+            this.updateStatistics(result.data.stats);
+            
+            setTimeout(() => {
+                if (typeof checkSteamPathStatus === 'function') {
+                    checkSteamPathStatus();
+                }
+            }, 100);
+        } catch (error) {
+            console.error('Error loading dashboard:', error);
+            this.showToast('Error loading data: ' + error.message, 'error');
+        } finally {
+            this.showLoading(false);
+        }
     }
     
     async loadData() {
@@ -159,41 +243,13 @@ class WallpaperManager {
 
     async loadWallpaperData() {
         try {
-            let url = '/api/wallpapers?';
-            const params = new URLSearchParams();
-            if (this.currentSearchQuery) {
-                params.append('search', this.currentSearchQuery);
-            }
-            if (this.currentUserFilter && this.currentUserFilter !== 'all') {
-                params.append('user', this.currentUserFilter);
-            }
-            // 分别传递已订阅和未订阅的页码
-            params.append('subscribed_page', this.subscribedPage);
-            params.append('unsubscribed_page', this.unsubscribedPage);
-            params.append('page_size', this.pageSize);
-            url += params.toString();
+            const url = '/api/wallpapers?' + this.buildListParams().toString();
             
             const wallpaperResponse = await fetch(url);
             const wallpaperResult = await wallpaperResponse.json();
             
             if (wallpaperResult.success) {
-                // 处理已订阅数据
-                if (Array.isArray(wallpaperResult.data.subscribed)) {
-                    this.wallpapers.subscribed = wallpaperResult.data.subscribed;
-                    this.subscribedTotal = this.wallpapers.subscribed.length;
-                } else {
-                    this.wallpapers.subscribed = wallpaperResult.data.subscribed.wallpapers || [];
-                    this.subscribedTotal = wallpaperResult.data.subscribed.total || 0;
-                }
-                
-                // 处理未订阅数据
-                if (Array.isArray(wallpaperResult.data.unsubscribed)) {
-                    this.wallpapers.unsubscribed = wallpaperResult.data.unsubscribed;
-                    this.unsubscribedTotal = this.wallpapers.unsubscribed.length;
-                } else {
-                    this.wallpapers.unsubscribed = wallpaperResult.data.unsubscribed.wallpapers || [];
-                    this.unsubscribedTotal = wallpaperResult.data.unsubscribed.total || 0;
-                }
+                this.applyWallpaperData(wallpaperResult.data);
             } else {
                 this.showToast('Error loading wallpapers: ' + wallpaperResult.error, 'error');
             }
@@ -202,6 +258,26 @@ class WallpaperManager {
             throw error;
         }
     }
+    applyWallpaperData(data) {
+        // 处理已订阅数据
+        if (Array.isArray(data.subscribed)) {
+            this.wallpapers.subscribed = data.subscribed;
+            this.subscribedTotal = this.wallpapers.subscribed.length;
+        } else {
+            this.wallpapers.subscribed = data.subscribed.wallpapers || [];
+            this.subscribedTotal = data.subscribed.total || 0;
+        }
+        
+        // 处理未订阅数据
+        if (Array.isArray(data.unsubscribed)) {
+            this.wallpapers.unsubscribed = data.unsubscribed;
+            this.unsubscribedTotal = this.wallpapers.unsubscribed.length;
+        } else {
+            this.wallpapers.unsubscribed = data.unsubscribed.wallpapers || [];
+            this.unsubscribedTotal = data.unsubscribed.total || 0;
+        }
+    }
+    
     renderPagination() {
         // 已订阅分页
         this.renderSinglePagination('subscribedPagination', this.subscribedPage, this.subscribedTotal, (page) => {
@@ -259,6 +335,7 @@ class WallpaperManager {
     }
     
     updateStatistics(stats) {
+        this.stats = stats;
         document.getElementById('totalCount').textContent = stats.total.count;
         document.getElementById('totalSize').textContent = stats.total.size_formatted;
         
@@ -321,16 +398,174 @@ class WallpaperManager {
         }
     }
     
+    connectEvents() {
+        if (!window.EventSource) return;
+        // 断线后 EventSource 自动重连并带上 Last-Event-ID，服务器补发错过的事件
+        this.events = new EventSource('/api/events');
+        this.events.onopen = () => { this.liveUpdates = true; };
+        this.events.onerror = () => { this.liveUpdates = false; };
+        
+        ['added', 'updated', 'resized', 'subscription'].forEach(type => {
+            this.events.addEventListener(type, (e) => this.upsertWallpaper(JSON.parse(e.data).wallpaper));
+        });
+        this.events.addEventListener('removed', (e) => this.removeWallpaper(JSON.parse(e.data).id));
+        this.events.addEventListener('stats', (e) => this.applyStatsDelta(JSON.parse(e.data).delta));
+        this.events.addEventListener('users', (e) => {
+            this.users = JSON.parse(e.data).users;
+            this.populateUserFilter();
+        });
+        // 错过的事件太多或服务器已重启：整体重新加载
+        this.events.addEventListener('reset', () => this.loadDashboard());
+    }
+    
+    listFor(wallpaper) {
+        // 当前用户筛选下壁纸所属的列表；null 表示两个列表都不显示（该用户已禁用）
+        const details = wallpaper.subscription_details || [];
+        if (!this.currentUserFilter || this.currentUserFilter === 'all') {
+            return details.some(detail => detail.is_active) ? 'subscribed' : 'unsubscribed';
+        }
+        const detail = details.find(detail => String(detail.user_id) === String(this.currentUserFilter));
+        if (!detail) return 'unsubscribed';
+        return detail.is_active ? 'subscribed' : null;
+    }
+    
+    upsertWallpaper(wallpaper) {
+        if (!wallpaper) return;
+        const target = this.listFor(wallpaper);
+        const search = this.currentSearchQuery.trim().toLowerCase();
+        const visible = target !== null && (!search || wallpaper.title.toLowerCase().includes(search));
+        
+        let shownIn = null;
+        for (const key of ['subscribed', 'unsubscribed']) {
+            const list = this.wallpapers[key];
+            const index = list.findIndex(item => item.id === wallpaper.id);
+            if (index === -1) continue;
+            list.splice(index, 1);
+            this.adjustTotal(key, -1);
+            shownIn = key;
+        }
+        if (!visible) {
+            this.patchLists(wallpaper.id);
+            return;
+        }
+        
+        // 按颜色排序或筛选时无法在本地确定位置，稍后只重新加载列表
+        if (this.currentSort !== 'size' || this.currentColor) {
+            this.scheduleListReload();
+            return;
+        }
+        
+        const list = this.wallpapers[target];
+        const page = target === 'subscribed' ? this.subscribedPage : this.unsubscribedPage;
+        const total = target === 'subscribed' ? this.subscribedTotal : this.unsubscribedTotal;
+        const item = Object.assign({}, wallpaper, { subscribed: target === 'subscribed' });
+        // 列表按大小降序：只有落在当前页范围内才插入，否则只更新总数（属于其他页）
+        const position = list.findIndex(other => other.size < item.size);
+        const wasHere = shownIn === target;
+        const fitsAbove = page === 1 || wasHere;
+        const fitsBelow = page * this.pageSize >= total || wasHere;
+        if ((position === -1 && fitsBelow) || position > 0 || (position === 0 && fitsAbove)) {
+            list.splice(position === -1 ? list.length : position, 0, item);
+            if (list.length > this.pageSize) {
+                list.pop();
+            }
+        }
+        this.adjustTotal(target, 1);
+        this.patchLists(wallpaper.id);
+    }
+    
+    removeWallpaper(wallpaperId) {
+        for (const key of ['subscribed', 'unsubscribed']) {
+            const list = this.wallpapers[key];
+            const index = list.findIndex(item => item.id === wallpaperId);
+            if (index === -1) continue;
+            list.splice(index, 1);
+            this.adjustTotal(key, -1);
+        }
+        this.selectedWallpapers.delete(wallpaperId);
+        this.patchLists(wallpaperId);
+    }
+    
+    adjustTotal(key, change) {
+        if (key === 'subscribed') {
+            this.subscribedTotal = Math.max(0, this.subscribedTotal + change);
+        } else {
+            this.unsubscribedTotal = Math.max(0, this.unsubscribedTotal + change);
+        }
+    }
+    
+    patchLists(changedId) {
+        [['subscribedWallpapers', 'subscribed', false], ['unsubscribedWallpapers', 'unsubscribed', true]]
+            .forEach(([containerId, key, showCheckbox]) => {
+                const grid = this.getGrid(containerId, showCheckbox);
+                const items = this.wallpapers[key];
+                if (grid && items.length > 0 && grid.items.length > 0) {
+                    grid.patchItems(items, [changedId]);
+                } else {
+                    this.renderWallpaperGrid(containerId, items, showCheckbox);
+                }
+            });
+        this.renderPagination();
+        this.updateSelectAllState();
+    }
+    
+    scheduleListReload() {
+        clearTimeout(this.listReloadTimeout);
+        this.listReloadTimeout = setTimeout(async () => {
+            try {
+                await this.loadWallpaperData();
+                this.renderWallpapers();
+                this.renderPagination();
+            } catch (error) {
+                console.error('Error reloading wallpapers:', error);
+            }
+        }, 500);
+    }
+    
+    applyStatsDelta(delta) {
+        const key = this.currentUserFilter && this.currentUserFilter !== 'all' ? this.currentUserFilter : 'all';
+        const change = delta[key];
+        if (!change || !this.stats) return;
+        for (const [name, [count, size]] of Object.entries(change)) {
+            const stat = this.stats[name];
+            if (!stat) continue;
+            stat.count += count;
+            stat.size += size;
+            stat.size_formatted = formatSize(stat.size);
+        }
+        this.updateStatistics(this.stats);
+    }
+    
     renderWallpapers() {
         this.renderWallpaperGrid('subscribedWallpapers', this.wallpapers.subscribed, false);
         this.renderWallpaperGrid('unsubscribedWallpapers', this.wallpapers.unsubscribed, true);
     }
     
+    getGrid(containerId, showCheckbox = false) {
+        if (!this.grids[containerId]) {
+            const container = document.getElementById(containerId);
+            if (!container) return null;
+            this.grids[containerId] = new VirtualGrid(container, {
+                renderItem: (wallpaper) => this.createWallpaperCard(wallpaper, showCheckbox),
+                previewLoader: this.previewLoader
+            });
+        }
+        return this.grids[containerId];
+    }
+    
+    getActiveGrid() {
+        const activeTab = document.querySelector('.tab-pane.active');
+        const container = activeTab ? activeTab.querySelector('.wallpaper-grid') : null;
+        return container ? this.grids[container.id] : null;
+    }
+    
     renderWallpaperGrid(containerId, wallpapers, showCheckbox = false) {
         const container = document.getElementById(containerId);
-        if (!container) return;
+        const grid = this.getGrid(containerId, showCheckbox);
+        if (!container || !grid) return;
         
         if (wallpapers.length === 0) {
+            grid.clear();
             container.innerHTML = `
                 <div class="empty-state col-12">
                     <i class="fas fa-images"></i>
@@ -347,13 +582,8 @@ class WallpaperManager {
         //     console.log(`[DEBUG] 壁纸${idx+1}:`, wp.id, wp.title, wp.size_formatted);
         // });
 
-
-        container.innerHTML = wallpapers.map(wallpaper => 
-            this.createWallpaperCard(wallpaper, showCheckbox)
-        ).join('');
-        
-        // Load preview images
-        this.loadPreviewImages(container);
+        // Only the rows near the viewport are in the DOM; previews load as cards scroll in
+        grid.setItems(wallpapers);
     }
     
     createWallpaperCard(wallpaper, showCheckbox = false) {
@@ -370,16 +600,20 @@ class WallpaperManager {
             }
         }
         
+        // 预览加载前先显示 BlurHash 占位图
+        const placeholderUrl = blurhashToDataURL(wallpaper.placeholder);
+        
         return `
             <div class="wallpaper-card" data-id="${wallpaper.id}" onclick="wallpaperManager.showWallpaperDetail('${wallpaper.id}')">
                 ${showCheckbox ? `
                     <div class="wallpaper-checkbox">
-                        <input type="checkbox" class="form-check-input" 
+                        <input type="checkbox" class="form-check-input" ${this.selectedWallpapers.has(wallpaper.id) ? 'checked' : ''}
                                onclick="event.stopPropagation(); wallpaperManager.toggleWallpaperSelection('${wallpaper.id}', this.checked)">
                     </div>
                 ` : ''}
                 
-                <div class="wallpaper-preview loading" data-id="${wallpaper.id}">
+                <div class="wallpaper-preview loading${placeholderUrl ? ' has-placeholder' : ''}" data-id="${wallpaper.id}"
+                     ${placeholderUrl ? `style="background-image: url('${placeholderUrl}')"` : ''}>
                     <i class="fas fa-image fa-2x"></i>
                 </div>
                 
@@ -389,6 +623,7 @@ class WallpaperManager {
                         <span class="wallpaper-id">ID: ${wallpaper.id}</span>
                         <span class="wallpaper-size">${wallpaper.size_formatted}</span>
                     </div>
+                    <div class="wallpaper-media">${wallpaper.media ? this.formatMedia(wallpaper.media) : '&nbsp;'}</div>
                     <div class="wallpaper-status">
                         <span class="badge ${statusClass}">${statusText}</span>
                         ${userInfo}
@@ -398,43 +633,6 @@ class WallpaperManager {
         `;
     }
     
-    async loadPreviewImages(container) {
-        const previewElements = container.querySelectorAll('.wallpaper-preview[data-id]');
-        
-        for (const element of previewElements) {
-            const wallpaperId = element.dataset.id;
-            try {
-                const img = document.createElement('img');
-                img.src = `/api/wallpapers/${wallpaperId}/preview`;
-                img.alt = 'Preview';
-                img.onerror = () => {
-                    element.innerHTML = '<i class="fas fa-image-slash fa-2x"></i><br><small>无预览</small>';
-                    element.classList.remove('loading');
-                };
-                img.onload = () => {
-                    element.innerHTML = '';
-                    element.appendChild(img);
-                    element.classList.remove('loading');
-                };
-            } catch (error) {
-                element.innerHTML = '<i class="fas fa-exclamation-triangle fa-2x"></i><br><small>加载失败</small>';
-                element.classList.remove('loading');
-            }
-        }
-        // 统计当前页面 img 元素数量和总像素
-        // setTimeout(() => {
-        //     const imgs = container.querySelectorAll('img');
-        //     let totalPixels = 0;
-        //     imgs.forEach(img => {
-        //         totalPixels += (img.naturalWidth || 0) * (img.naturalHeight || 0);
-        //     });
-        //     console.log(`[DEBUG] 当前页面图片数量: ${imgs.length}, 总像素: ${totalPixels}`);
-        //     imgs.forEach((img, idx) => {
-        //         console.log(`[DEBUG] 图片${idx+1}: src=${img.src}, size=${img.naturalWidth}x${img.naturalHeight}`);
-        //     });
-        // }, 1000);
-    }
-    
     toggleWallpaperSelection(wallpaperId, selected) {
         if (selected) {
             this.selectedWallpapers.add(wallpaperId);
@@ -446,29 +644,39 @@ class WallpaperManager {
     }
     
     toggleSelectAll(selectAll) {
+        // Selection covers every card of the page, including rows not currently rendered
         const activeTab = document.querySelector('.tab-pane.active');
-        const checkboxes = activeTab.querySelectorAll('.wallpaper-checkbox input[type="checkbox"]');
+        const grid = this.getActiveGrid();
+        if (!activeTab || !grid || !activeTab.querySelector('.wallpaper-checkbox')) return;
         
-        checkboxes.forEach(checkbox => {
+        grid.items.forEach(wallpaper => {
+            if (selectAll) {
+                this.selectedWallpapers.add(wallpaper.id);
+            } else {
+                this.selectedWallpapers.delete(wallpaper.id);
+            }
+        });
+        activeTab.querySelectorAll('.wallpaper-checkbox input[type="checkbox"]').forEach(checkbox => {
             checkbox.checked = selectAll;
-            const wallpaperId = checkbox.closest('.wallpaper-card').dataset.id;
-            this.toggleWallpaperSelection(wallpaperId, selectAll);
         });
+        this.updateSelectAllState();
     }
     
     updateSelectAllState() {
         const activeTab = document.querySelector('.tab-pane.active');
-        const checkboxes = activeTab.querySelectorAll('.wallpaper-checkbox input[type="checkbox"]');
+        const grid = this.getActiveGrid();
         const selectAllCheckbox = document.getElementById('selectAll');
         
-        if (!selectAllCheckbox || checkboxes.length === 0) return;
+        if (!selectAllCheckbox || !grid || grid.items.length === 0 ||
+            !activeTab.querySelector('.wallpaper-checkbox')) return;
         
-        const checkedCount = Array.from(checkboxes).filter(cb => cb.checked).length;
+        const total = grid.items.length;
+        const checkedCount = grid.items.filter(wallpaper => this.selectedWallpapers.has(wallpaper.id)).length;
         
         if (checkedCount === 0) {
             selectAllCheckbox.indeterminate = false;
             selectAllCheckbox.checked = false;
-        } else if (checkedCount === checkboxes.length) {
+        } else if (checkedCount === total) {
             selectAllCheckbox.indeterminate = false;
             selectAllCheckbox.checked = true;
         } else {
@@ -501,6 +709,10 @@ class WallpaperManager {
         document.getElementById('wallpaperDetailId').textContent = wallpaper.id;
         document.getElementById('wallpaperDetailTitle').textContent = wallpaper.title;
         document.getElementById('wallpaperDetailSize').textContent = wallpaper.size_formatted;
+        const mediaElement = document.getElementById('wallpaperDetailMedia');
+        if (mediaElement) {
+            mediaElement.textContent = wallpaper.media ? this.formatMedia(wallpaper.media, true) : '-';
+        }
         document.getElementById('wallpaperDetailStatus').innerHTML = 
             `<span class="badge ${wallpaper.subscribed ? 'status-subscribed' : 'status-unsubscribed'}">
                 ${wallpaper.subscribed ? '已订阅' : '未订阅'}
@@ -539,9 +751,9 @@ class WallpaperManager {
         pathElement.textContent = wallpaper.path;
         pathElement.title = wallpaper.path; // Show full path on hover
         
-        // Load large preview
+        // Load large preview (original file, not the grid thumbnail)
         const previewImg = document.getElementById('wallpaperPreviewLarge');
-        previewImg.src = `/api/wallpapers/${wallpaper.id}/preview`;
+        previewImg.src = `/api/wallpapers/${wallpaper.id}/preview?original=1`;
         
         // Show/hide delete button based on subscription status
         const deleteButton = document.getElementById('deleteButton');
@@ -584,6 +796,25 @@ class WallpaperManager {
         }
     }
     
+    // 主文件媒体信息：分辨率 · 时长 · 编码 (· 码率)
+    formatMedia(media, detailed = false) {
+        const parts = [];
+        if (media.width && media.height) {
+            parts.push(`${media.width}×${media.height}`);
+        }
+        if (media.duration) {
+            const seconds = Math.round(media.duration);
+            parts.push(`${Math.floor(seconds / 60)}:${String(seconds % 60).padStart(2, '0')}`);
+        }
+        if (media.codec) {
+            parts.push(detailed && media.audio_codec ? `${media.codec} / ${media.audio_codec}` : media.codec);
+        }
+        if (detailed && media.bitrate) {
+            parts.push(`${(media.bitrate / 1000000).toFixed(1)} Mbps`);
+        }
+        return parts.join(' · ');
+    }
+    
     showLoading(show) {
         const overlay = document.getElementById('loadingOverlay');
         if (overlay) {
@@ -613,14 +844,45 @@ class WallpaperManager {
 // Global functions
 function refreshData() {
     if (window.wallpaperManager) {
-        window.wallpaperManager.loadData();
+        window.wallpaperManager.loadDashboard();
     }
 }
 
+// 删除、归档之后：实时推送连接正常时由服务器事件就地修补，否则整体刷新
+function refreshAfterChange() {
+    const manager = window.wallpaperManager;
+    if (!manager || !manager.liveUpdates) {
+        refreshData();
+        return;
+    }
+    // 选择已清空，剩余卡片的勾选也一并取消
+    document.querySelectorAll('.wallpaper-checkbox input[type="checkbox"]').forEach(checkbox => {
+        checkbox.checked = false;
+    });
+    manager.updateSelectAllState();
+}
+
+// 与服务器端 _format_size 一致
+function formatSize(size) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    for (const unit of units) {
+        if (size < 1024) {
+            return `${size.toFixed(1)} ${unit}`;
+        }
+        size /= 1024;
+    }
+    return `${size.toFixed(1)} PB`;
+}
+
 async function saveConfig() {
     // 获取表单数据并进行验证
     const steamLibraryPath = document.getElementById('steamLibraryPath')?.value || '';
     const steamUserdataPath = document.getElementById('steamUserdataPath')?.value || '';
+    const contentRoots = (document.getElementById('contentRoots')?.value || '')
+        .split('\n')
+        .map(path => path.trim())
+        .filter(path => path);
+    const autoDiscoverInput = document.getElementById('autoDiscoverLibraries');
     const serverPortInput = document.getElementById('serverPort');
     const debugModeInput = document.getElementById('debugMode');
     
@@ -636,6 +898,8 @@ async function saveConfig() {
     const config = {
         steam_library_path: steamLibraryPath,
         steam_userdata_path: steamUserdataPath,
+        content_roots: contentRoots,
+        auto_discover_libraries: autoDiscoverInput ? autoDiscoverInput.checked : true,
         server: {
             host: '127.0.0.1',
             port: serverPort,
@@ -665,7 +929,9 @@ async function saveConfig() {
         console.log('Response data:', result); // Debug log
         
         if (result.success) {
-            window.wallpaperManager.showToast('配置保存成功', 'info');
+            // 其余设置已即时生效，只有服务器地址和端口需重启
+            const needsRestart = result.applied && result.applied.restart_required.length;
+            window.wallpaperManager.showToast(needsRestart ? '配置保存成功，服务器设置需重启后生效' : '配置保存成功', 'info');
             const modal = bootstrap.Modal.getInstance(document.getElementById('configModal'));
             if (modal) {
                 modal.hide();
@@ -729,7 +995,65 @@ async function deleteSelected() {
     window.wallpaperManager.showLoading(false);
     window.wallpaperManager.showToast(`成功删除 ${successCount} 个壁纸`, 'info');
     window.wallpaperManager.selectedWallpapers.clear();
-    refreshData();
+    refreshAfterChange();
+}
+
+// 归档到 offload.path（流式返回进度，每行一个 JSON 事件）
+async function offloadSelected() {
+    const manager = window.wallpaperManager;
+    if (!manager.selectedWallpapers.size) {
+        manager.showToast('请先选择要归档的壁纸', 'error');
+        return;
+    }
+    
+    const count = manager.selectedWallpapers.size;
+    if (!confirm(`确定要将选中的 ${count} 个壁纸归档到备用目录吗？原文件夹将被移除，可随时恢复。`)) {
+        return;
+    }
+    
+    manager.showLoading(true);
+    try {
+        const response = await fetch('/api/offload', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids: Array.from(manager.selectedWallpapers) })
+        });
+        if (!response.ok) {
+            const result = await response.json();
+            throw new Error(result.error);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let summary = null;
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines.filter(Boolean)) {
+                const event = JSON.parse(line);
+                if (event.event === 'item') {
+                    manager.showToast(`归档中 ${event.done}/${event.total}`, 'info');
+                } else if (event.event === 'done') {
+                    summary = event.summary;
+                }
+            }
+        }
+        
+        if (summary) {
+            manager.showToast(`已归档 ${summary.offloaded} 个壁纸（${summary.mb_per_second} MB/s），失败 ${summary.errors} 个`,
+                              summary.errors ? 'error' : 'info');
+        }
+    } catch (error) {
+        manager.showToast('归档失败: ' + error.message, 'error');
+    }
+    
+    manager.showLoading(false);
+    manager.selectedWallpapers.clear();
+    refreshAfterChange();
 }
 
 async function deleteAll() {
@@ -763,7 +1087,7 @@ async function deleteAll() {
     
     window.wallpaperManager.showLoading(false);
     window.wallpaperManager.showToast(`成功删除 ${successCount} 个壁纸`, 'info');
-    refreshData();
+    refreshAfterChange();
 }
 
 async function deleteWallpaper() {
@@ -784,7 +1108,7 @@ async function deleteWallpaper() {
             window.wallpaperManager.showToast('壁纸删除成功', 'info');
             const modal = bootstrap.Modal.getInstance(document.getElementById('wallpaperModal'));
             modal.hide();
-            refreshData();
+            refreshAfterChange();
         } else {
             window.wallpaperManager.showToast('壁纸删除失败: ' + result.error, 'error');
         }
@@ -0,0 +1,89 @@
+// BlurHash placeholder decoding (https://blurha.sh)
+// Wallpaper records carry a ~28 character hash of their preview; it is decoded
+// into a tiny image shown until the real preview has loaded.
+
+const BLURHASH_CHARACTERS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+
+function decodeBase83(text) {
+    let value = 0;
+    for (const character of text) {
+        value = value * 83 + BLURHASH_CHARACTERS.indexOf(character);
+    }
+    return value;
+}
+
+function srgbToLinear(value) {
+    const v = value / 255;
+    return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+}
+
+function linearToSrgb(value) {
+    const v = Math.max(0, Math.min(1, value));
+    return v <= 0.0031308 ? Math.round(v * 12.92 * 255) : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+}
+
+function decodeBlurhash(hash, width, height) {
+    const sizeFlag = decodeBase83(hash[0]);
+    const componentsX = (sizeFlag % 9) + 1;
+    const componentsY = Math.floor(sizeFlag / 9) + 1;
+    if (hash.length !== 4 + 2 * componentsX * componentsY) {
+        throw new Error('Invalid blurhash length');
+    }
+
+    const maximum = (decodeBase83(hash[1]) + 1) / 166;
+    const colors = [];
+    const dc = decodeBase83(hash.substring(2, 6));
+    colors.push([srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]);
+    for (let i = 1; i < componentsX * componentsY; i++) {
+        const value = decodeBase83(hash.substring(4 + i * 2, 6 + i * 2));
+        colors.push([Math.floor(value / 361), Math.floor(value / 19) % 19, value % 19].map(quantised => {
+            const v = (quantised - 9) / 9;
+            return Math.sign(v) * v * v * maximum;
+        }));
+    }
+
+    const pixels = new Uint8ClampedArray(width * height * 4);
+    for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) {
+            let r = 0, g = 0, b = 0;
+            for (let j = 0; j < componentsY; j++) {
+                const basisY = Math.cos(Math.PI * y * j / height);
+                for (let i = 0; i < componentsX; i++) {
+                    const basis = Math.cos(Math.PI * x * i / width) * basisY;
+                    const color = colors[i + j * componentsX];
+                    r += color[0] * basis;
+                    g += color[1] * basis;
+                    b += color[2] * basis;
+                }
+            }
+            const offset = 4 * (x + y * width);
+            pixels[offset] = linearToSrgb(r);
+            pixels[offset + 1] = linearToSrgb(g);
+            pixels[offset + 2] = linearToSrgb(b);
+            pixels[offset + 3] = 255;
+        }
+    }
+    return pixels;
+}
+
+// hash -> data URL (pages are re-rendered while scrolling, decode once)
+const blurhashUrls = new Map();
+
+function blurhashToDataURL(hash, width = 32, height = 20) {
+    if (!hash) return null;
+    if (blurhashUrls.has(hash)) return blurhashUrls.get(hash);
+
+    let url = null;
+    try {
+        const canvas = document.createElement('canvas');
+        canvas.width = width;
+        canvas.height = height;
+        const context = canvas.getContext('2d');
+        context.putImageData(new ImageData(decodeBlurhash(hash, width, height), width, height), 0, 0);
+        url = canvas.toDataURL();
+    } catch (error) {
+        console.warn('Invalid placeholder:', hash, error);
+    }
+    blurhashUrls.set(hash, url);
+    return url;
+}
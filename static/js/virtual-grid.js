@@ -0,0 +1,262 @@
+// Virtualized wallpaper grid and viewport-driven preview loading
+
+// Loads card previews only while they are near the viewport, with a cap on
+// concurrent requests. Loads that scroll out of view before finishing are
+// cancelled, and finished previews are released when their card is removed.
+class PreviewLoader {
+    constructor(options = {}) {
+        this.maxConcurrent = options.maxConcurrent || 6;
+        this.active = new Map();   // element -> AbortController
+        this.queue = [];           // elements waiting for a slot, in viewport order
+        this.objectUrls = new Map(); // element -> blob URL
+
+        this.observer = new IntersectionObserver(
+            (entries) => this.onIntersection(entries),
+            { rootMargin: options.rootMargin || '300px 0px' }
+        );
+    }
+
+    observe(element) {
+        this.observer.observe(element);
+    }
+
+    onIntersection(entries) {
+        for (const entry of entries) {
+            if (entry.isIntersecting) {
+                if (!this.active.has(entry.target) && !this.objectUrls.has(entry.target) &&
+                    !this.queue.includes(entry.target)) {
+                    this.queue.push(entry.target);
+                }
+            } else {
+                this.cancel(entry.target);
+            }
+        }
+        this.pump();
+    }
+
+    // 取消尚未完成的加载（已加载的图片保留）
+    cancel(element) {
+        const index = this.queue.indexOf(element);
+        if (index !== -1) {
+            this.queue.splice(index, 1);
+        }
+        const controller = this.active.get(element);
+        if (controller) {
+            controller.abort();
+            this.active.delete(element);
+        }
+    }
+
+    // 卡片被移出 DOM 时调用
+    release(element) {
+        this.observer.unobserve(element);
+        this.cancel(element);
+        const url = this.objectUrls.get(element);
+        if (url) {
+            URL.revokeObjectURL(url);
+        }
+        this.objectUrls.delete(element);
+        this.pump();
+    }
+
+    releaseAll(container) {
+        container.querySelectorAll('.wallpaper-preview[data-id]').forEach(element => this.release(element));
+    }
+
+    pump() {
+        while (this.active.size < this.maxConcurrent && this.queue.length > 0) {
+            this.load(this.queue.shift());
+        }
+    }
+
+    async load(element) {
+        const controller = new AbortController();
+        this.active.set(element, controller);
+        const wallpaperId = element.dataset.id;
+
+        try {
+            const response = await fetch(`/api/wallpapers/${wallpaperId}/preview`, { signal: controller.signal });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const blob = await response.blob();
+            if (controller.signal.aborted) return;
+
+            const url = URL.createObjectURL(blob);
+            this.objectUrls.set(element, url);
+            const img = document.createElement('img');
+            img.alt = 'Preview';
+            img.decoding = 'async';
+            img.src = url;
+            element.innerHTML = '';
+            element.appendChild(img);
+            element.classList.remove('loading');
+        } catch (error) {
+            if (error.name === 'AbortError') return;
+            element.innerHTML = '<i class="fas fa-image-slash fa-2x"></i><br><small>无预览</small>';
+            element.classList.remove('loading');
+            this.objectUrls.set(element, null);
+        } finally {
+            if (this.active.get(element) === controller) {
+                this.active.delete(element);
+            }
+            this.pump();
+        }
+    }
+}
+
+// Renders only the rows of a CSS grid that are near the viewport. Rows above
+// and below are replaced by padding so the scrollbar still reflects the full
+// list; cards are re-rendered from the items array as the page scrolls.
+class VirtualGrid {
+    constructor(container, options) {
+        this.container = container;
+        this.renderItem = options.renderItem;
+        this.previewLoader = options.previewLoader;
+        this.overscanRows = options.overscanRows || 3;
+        this.items = [];
+        this.range = null;
+        this.rowHeight = 0;
+        this.columns = 1;
+        this.frame = null;
+
+        this.onScroll = () => this.scheduleUpdate();
+        window.addEventListener('scroll', this.onScroll, { passive: true });
+        window.addEventListener('resize', () => {
+            this.rowHeight = 0;
+            this.scheduleUpdate(true);
+        });
+    }
+
+    setItems(items) {
+        this.items = items;
+        this.rowHeight = 0;
+        this.update(true);
+    }
+
+    // 就地修补：未变化的卡片（及已加载的预览）保留，只重建 changedIds 对应的卡片
+    patchItems(items, changedIds = []) {
+        this.items = items;
+        for (const id of changedIds) {
+            const card = this.container.querySelector(`.wallpaper-card[data-id="${id}"]`);
+            if (!card) continue;
+            if (this.previewLoader) {
+                this.previewLoader.releaseAll(card);
+            }
+            card.remove();
+        }
+        this.range = null;
+        this.update();
+    }
+
+    clear() {
+        if (this.previewLoader) {
+            this.previewLoader.releaseAll(this.container);
+        }
+        this.items = [];
+        this.range = null;
+        this.container.style.paddingTop = '';
+        this.container.style.paddingBottom = '';
+    }
+
+    scheduleUpdate(force = false) {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.update(force);
+        });
+    }
+
+    measure() {
+        const style = getComputedStyle(this.container);
+        this.columns = Math.max(1, style.gridTemplateColumns.split(' ').filter(Boolean).length);
+        this.gap = parseFloat(style.rowGap) || 0;
+        const card = this.container.querySelector('.wallpaper-card');
+        if (card && card.offsetHeight) {
+            this.rowHeight = card.offsetHeight + this.gap;
+        }
+    }
+
+    update(force = false) {
+        // Hidden tab: nothing to measure yet, render again when shown
+        if (!this.container.offsetParent) {
+            if (force) this.range = null;
+            return;
+        }
+
+        if (!this.rowHeight) {
+            this.measure();
+        }
+        const totalRows = Math.ceil(this.items.length / this.columns);
+
+        let startRow = 0;
+        let endRow = Math.min(totalRows, this.overscanRows * 2 + 1);
+        if (this.rowHeight) {
+            // Row 0 starts at the top of the container; the padding stands in for skipped rows
+            const top = -this.container.getBoundingClientRect().top;
+            startRow = Math.min(Math.max(0, Math.floor(top / this.rowHeight) - this.overscanRows),
+                                Math.max(0, totalRows - 1));
+            endRow = Math.min(totalRows, Math.ceil((top + window.innerHeight) / this.rowHeight) + this.overscanRows);
+        }
+
+        const start = startRow * this.columns;
+        const end = Math.min(this.items.length, Math.max(endRow, startRow + 1) * this.columns);
+        if (!force && this.range && this.range.start === start && this.range.end === end) {
+            return;
+        }
+
+        // Cards still in range are kept (with their loaded previews); the rest are released
+        const existing = new Map();
+        if (!force) {
+            for (const card of this.container.children) {
+                if (card.dataset.id) existing.set(card.dataset.id, card);
+            }
+        }
+        const fragment = document.createDocumentFragment();
+        const added = [];
+        for (const item of this.items.slice(start, end)) {
+            let card = existing.get(String(item.id));
+            if (card) {
+                existing.delete(String(item.id));
+            } else {
+                card = this.createCard(item);
+                added.push(card);
+            }
+            fragment.appendChild(card);
+        }
+        if (this.previewLoader) {
+            if (force) {
+                this.previewLoader.releaseAll(this.container);
+            } else {
+                existing.forEach(card => this.previewLoader.releaseAll(card));
+            }
+        }
+        this.range = { start, end };
+        this.container.replaceChildren(fragment);
+
+        const firstRender = !this.rowHeight;
+        if (firstRender) {
+            this.measure();
+        }
+        const rowHeight = this.rowHeight;
+        this.container.style.paddingTop = rowHeight ? `${startRow * rowHeight}px` : '';
+        this.container.style.paddingBottom = rowHeight ? `${Math.max(0, totalRows - Math.ceil(end / this.columns)) * rowHeight}px` : '';
+
+        if (this.previewLoader) {
+            added.forEach(card => {
+                card.querySelectorAll('.wallpaper-preview[data-id]').forEach(element => this.previewLoader.observe(element));
+            });
+        }
+
+        // The first render only measured a card; render the real range now
+        if (firstRender && rowHeight) {
+            this.update(true);
+        }
+    }
+
+    createCard(item) {
+        const template = document.createElement('template');
+        template.innerHTML = this.renderItem(item).trim();
+        return template.content.firstElementChild;
+    }
+}
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Load Test
+Simulates concurrent browser sessions against the web manager
+
+Each session replays the request mix of static/js/app.js: config on load and
+one /api/events stream held open for the whole session, /api/dashboard for the
+first page and on every user switch, a wallpaper page plus statistics when
+paging, and a preview fetch for every card on the page (several at a time,
+like a browser).
+
+Examples:
+    python tools/loadtest.py --synthetic 2000 --sessions 20 --duration 30
+    python tools/loadtest.py --url http://127.0.0.1:5000 --sessions 8 --pages 5
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+WALLPAPER_TYPES = ['scene', 'video', 'web', 'application']
+TAGS = ['Anime', 'Nature', 'Game', 'Abstract', 'Landscape', 'Sci-Fi']
+
+
+def create_synthetic_library(base_dir, count, users=3, seed=1):
+    """Create a library of `count` wallpapers and subscription lists for `users` users"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    content = Path(base_dir) / 'steamapps' / 'workshop' / 'content' / '431960'
+    userdata = Path(base_dir) / 'userdata'
+    content.mkdir(parents=True, exist_ok=True)
+
+    ids = [str(2000000000 + i) for i in range(count)]
+    for i, workshop_id in enumerate(ids):
+        folder = content / workshop_id
+        folder.mkdir(exist_ok=True)
+        wallpaper_type = WALLPAPER_TYPES[i % len(WALLPAPER_TYPES)]
+        main_file = 'video.mp4' if wallpaper_type == 'video' else 'scene.pkg'
+        with open(folder / 'project.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'title': f'Synthetic wallpaper {i}',
+                'type': wallpaper_type,
+                'tags': rng.sample(TAGS, 2),
+                'contentrating': 'Everyone',
+                'file': main_file
+            }, f)
+        with open(folder / main_file, 'wb') as f:
+            f.truncate(rng.randint(64 * 1024, 8 * 1024 * 1024))
+
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if i % 10 == 0:
+            frames = [Image.new('RGB', (320, 180), (shade, color[1], color[2])) for shade in range(0, 256, 32)]
+            frames[0].save(folder / 'preview.gif', save_all=True, append_images=frames[1:], duration=80, loop=0)
+        else:
+            Image.new('RGB', (640, 360), color).save(folder / 'preview.jpg', quality=80)
+
+    for user in range(users):
+        user_id = str(10000000 + user)
+        subscribed = rng.sample(ids, len(ids) // 2)
+        lines = ['"subscribedfiles"', '{']
+        for position, workshop_id in enumerate(subscribed):
+            lines += [
+                f'\t"{position}"', '\t{',
+                f'\t\t"publishedfileid"\t\t"{workshop_id}"',
+                '\t\t"time_subscribed"\t\t"1700000000"',
+                f'\t\t"disabled_locally"\t\t"{1 if position % 10 == 0 else 0}"',
+                '\t}'
+            ]
+        lines.append('}')
+        ugc = userdata / user_id / 'ugc'
+        ugc.mkdir(parents=True, exist_ok=True)
+        (ugc / '431960_subscriptions.vdf').write_text('\n'.join(lines), encoding='utf-8')
+
+    return content, userdata
+
+
+def start_local_server(content, userdata, work_dir):
+    """Serve the Flask app on an ephemeral port in a background thread"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    config = {
+        'steam_library_path': str(content),
+        'steam_userdata_path': str(userdata),
+        'auto_discover_libraries': False,
+        'preview': {'cache_dir': os.path.join(work_dir, 'thumbnails')},
+        # Keep the synthetic library out of the real app's saved index and manifests
+        'cache': {'persist_index': False},
+        'integrity': {'manifest_dir': os.path.join(work_dir, 'manifests')},
+        'server': {'host': '127.0.0.1', 'port': 0, 'debug': False}
+    }
+    server = make_server('127.0.0.1', 0, create_app(config), threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+class Recorder:
+    """Collects per-endpoint latencies and errors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}  # endpoint -> [seconds]
+        self.errors = {}     # endpoint -> count
+        self.events = 0      # server-sent events received
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def record_event(self):
+        with self._lock:
+            self.events += 1
+
+    def report(self, elapsed):
+        """Print p50/p95/p99 latency, throughput and error rate per endpoint"""
+        print(f"\n{'endpoint':<22} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'errors':>7}")
+        print('-' * 77)
+        total = 0
+        total_errors = 0
+        for endpoint in sorted(self.latencies):
+            samples = sorted(self.latencies[endpoint])
+            errors = self.errors.get(endpoint, 0)
+            total += len(samples)
+            total_errors += errors
+            print(f"{endpoint:<22} {len(samples):>8} {len(samples) / elapsed:>8.1f} "
+                  f"{percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 95) * 1000:>8.1f} "
+                  f"{percentile(samples, 99) * 1000:>8.1f} {errors / len(samples):>7.1%}")
+        print('-' * 77)
+        print(f"{'total':<22} {total:>8} {total / elapsed:>8.1f} {'':>26} "
+              f"{(total_errors / total if total else 0):>7.1%}")
+        print(f"{self.events} server-sent event(s) received")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, math.ceil(pct / 100.0 * len(samples)) - 1))
+    return samples[rank]
+
+
+class Session:
+    """One simulated browser tab"""
+
+    def __init__(self, base_url, recorder, page_size, preview_parallel, rng):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.page_size = page_size
+        self.rng = rng
+        self.previews = ThreadPoolExecutor(max_workers=preview_parallel)
+        self.users = []
+        self.events = None  # (HTTPConnection, socket) of the open /api/events stream
+        self.events_reader = None
+
+    def get(self, endpoint, path):
+        """GET a path, recording latency; returns parsed JSON for API responses"""
+        start = time.perf_counter()
+        ok = False
+        body = None
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=60) as response:
+                body = response.read()
+                ok = response.status < 400
+        except (urllib.error.URLError, OSError):
+            pass
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        if ok and endpoint != 'preview':
+            try:
+                return json.loads(body)
+            except ValueError:
+                return None
+        return None
+
+    def load(self):
+        """Initial page load: configuration and the live-update stream"""
+        self.get('config', '/api/config')
+        self.open_events()
+
+    def open_events(self):
+        """Open /api/events like the page's EventSource and read it in the background"""
+        url = urllib.parse.urlsplit(self.base_url)
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+        start = time.perf_counter()
+        ok = False
+        try:
+            connection.connect()
+            # http.client lets go of the socket once the response is read until close
+            sock = connection.sock
+            connection.request('GET', '/api/events', headers={'Accept': 'text/event-stream'})
+            response = connection.getresponse()
+            ok = response.status < 400
+        except (http.client.HTTPException, OSError):
+            pass
+        # Latency until the stream is open (response headers received)
+        self.recorder.record('events', time.perf_counter() - start, ok)
+        if not ok:
+            connection.close()
+            return
+
+        # Idle streams only carry a keepalive every few seconds; wait indefinitely
+        sock.settimeout(None)
+        self.events = (connection, sock)
+        self.events_reader = threading.Thread(target=self.read_events, args=(response,), daemon=True)
+        self.events_reader.start()
+
+    def read_events(self, response):
+        try:
+            for line in response:
+                if line.startswith(b'event:'):
+                    self.recorder.record_event()
+        except (http.client.HTTPException, OSError, ValueError):
+            pass  # closed by close_events() or by the server
+
+    def close_events(self):
+        """Drop the stream as a closing tab would"""
+        if self.events is None:
+            return
+        connection, sock = self.events
+        try:
+            # Wakes the reader blocked in recv()
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+        self.events_reader.join(timeout=5)
+        self.events = None
+
+    def view_page(self, user, page):
+        """Load one grid page and the previews of every card
+
+        The first page (initial load, user switch) comes from /api/dashboard
+        together with users and statistics; further pages fetch the wallpaper
+        page and statistics separately, as app.js does.
+        """
+        query = f'subscribed_page={page}&unsubscribed_page={page}&page_size={self.page_size}'
+        stats_path = '/api/stats'
+        if user:
+            query += f'&user={user}'
+            stats_path += f'?user={user}'
+
+        if page == 1:
+            result = self.get('dashboard', '/api/dashboard?' + query)
+            if result and result.get('success'):
+                self.users = [item['id'] for item in result['data']['users']]
+                result = {'success': True, 'data': result['data']['wallpapers']}
+        else:
+            result = self.get('wallpapers', '/api/wallpapers?' + query)
+            self.get('stats', stats_path)
+
+        ids = []
+        if result and result.get('success'):
+            for section in ('subscribed', 'unsubscribed'):
+                ids += [wallpaper['id'] for wallpaper in result['data'][section]['wallpapers']]
+        list(self.previews.map(lambda workshop_id: self.get('preview', f'/api/wallpapers/{workshop_id}/preview'),
+                               ids))
+        return bool(ids)
+
+    def run(self, pages, deadline):
+        """Page through the grid, occasionally switching users"""
+        try:
+            self.load()
+            user = None
+            page = 1
+            visited = 0
+            while (pages is None or visited < pages) and (deadline is None or time.time() < deadline):
+                has_more = self.view_page(user, page)
+                visited += 1
+                if not has_more or self.rng.random() < 0.2:
+                    user = self.rng.choice(self.users + [None]) if self.users else None
+                    page = 1
+                else:
+                    page += 1
+        finally:
+            self.close_events()
+            self.previews.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent browser sessions')
+    parser.add_argument('--url', help='Server to test (default: start a local server)')
+    parser.add_argument('--synthetic', type=int, default=1000,
+                        help='Wallpapers in the synthetic library when starting a local server')
+    parser.add_argument('--users', type=int, default=3, help='Synthetic Steam users')
+    parser.add_argument('--sessions', type=int, default=10, help='Concurrent browser sessions')
+    parser.add_argument('--duration', type=float, default=None, help='Seconds to run')
+    parser.add_argument('--pages', type=int, default=None, help='Pages per session (default 5 without --duration)')
+    parser.add_argument('--page-size', type=int, default=40, help='Cards per page (app.js uses 40)')
+    parser.add_argument('--preview-parallel', type=int, default=6,
+                        help='Concurrent preview fetches per session (browsers use ~6 per host)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.duration is None and args.pages is None:
+        args.pages = 5
+
+    server = None
+    work_dir = None
+    base_url = args.url.rstrip('/') if args.url else None
+    try:
+        if base_url is None:
+            work_dir = tempfile.mkdtemp(prefix='wallpaper_loadtest_')
+            print(f"Creating synthetic library of {args.synthetic} wallpapers in {work_dir} ...")
+            content, userdata = create_synthetic_library(work_dir, args.synthetic, args.users, args.seed)
+            server, base_url = start_local_server(content, userdata, work_dir)
+            print(f"Local server on {base_url}")
+
+        recorder = Recorder()
+        deadline = time.time() + args.duration if args.duration else None
+        print(f"Running {args.sessions} sessions against {base_url} ...")
+        start = time.time()
+        threads = []
+        for index in range(args.sessions):
+            session = Session(base_url, recorder, args.page_size, args.preview_parallel,
+                              random.Random(args.seed + index))
+            thread = threading.Thread(target=session.run, args=(args.pages, deadline), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        recorder.report(time.time() - start)
+
+    finally:
+        if server is not None:
+            server.shutdown()
+        if work_dir is not None:
+            # Synthetic library, thumbnails and manifests
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
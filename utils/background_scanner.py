@@ -0,0 +1,207 @@
+"""
+Background Scanner
+Keeps the library index fresh with periodic low-priority rescans, analyzes
+new previews (placeholders, colours) off the request path and keeps the
+caches within their memory budget
+
+Rescans are paced by an I/O budget (files/sec and MB/sec) that adapts to the
+observed latency of directory reads, run at low CPU/IO priority where the OS
+supports it, and pause while interactive requests are being served so that
+Wallpaper Engine and the web UI keep the disk.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# ioprio_set syscall numbers (Linux) by machine
+_IOPRIO_SET = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30, 'armv7l': 314}
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+
+# Windows SetThreadPriority mode lowering both CPU and I/O priority
+_THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+
+
+def lower_thread_priority():
+    """Best-effort low CPU and I/O priority for the calling thread"""
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_BEGIN)
+        elif sys.platform.startswith('linux'):
+            # On Linux both nice and ioprio apply per thread when given a thread id
+            tid = threading.get_native_id()
+            os.setpriority(os.PRIO_PROCESS, tid, 19)
+            syscall_number = _IOPRIO_SET.get(os.uname().machine)
+            if syscall_number:
+                import ctypes
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, tid,
+                             _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT)
+        elif hasattr(os, 'PRIO_DARWIN_THREAD'):
+            # macOS: background band throttles both CPU and disk I/O
+            os.setpriority(os.PRIO_DARWIN_THREAD, 0, os.PRIO_DARWIN_BG)
+    except Exception as e:
+        print(f"Could not lower scanner thread priority: {e}")
+
+
+class IOThrottle:
+    """
+    Shared I/O budget for background work.
+    The allowed rate is scaled down when directory reads get slow and back up
+    when they are fast again; interactive requests pause all background work.
+    """
+
+    def __init__(self, files_per_second=2000, mb_per_second=20, target_latency_ms=20,
+                 resume_delay_ms=500):
+        self.files_per_second = files_per_second or None
+        self.bytes_per_second = mb_per_second * 1024 * 1024 if mb_per_second else None
+        self.target_latency = target_latency_ms / 1000.0
+        self.resume_delay = resume_delay_ms / 1000.0
+        self.scale = 1.0
+        self.latency = 0.0
+
+        self._condition = threading.Condition()
+        self._next_slot = time.monotonic()
+        self._interactive = 0
+        self._last_interactive = 0.0
+
+    def begin_interactive(self):
+        """Mark an interactive request in progress; background work waits until it ends"""
+        with self._condition:
+            self._interactive += 1
+
+    def end_interactive(self):
+        """Mark an interactive request as finished"""
+        with self._condition:
+            self._interactive -= 1
+            self._last_interactive = time.monotonic()
+            self._condition.notify_all()
+
+    @contextmanager
+    def interactive(self):
+        """Context manager around begin_interactive/end_interactive"""
+        self.begin_interactive()
+        try:
+            yield
+        finally:
+            self.end_interactive()
+
+    def consume(self, files=0, nbytes=0):
+        """Wait for interactive requests to finish, then for budget to do this much I/O"""
+        with self._condition:
+            while True:
+                idle_for = time.monotonic() - self._last_interactive
+                if self._interactive == 0 and idle_for >= self.resume_delay:
+                    break
+                self._condition.wait(max(self.resume_delay - idle_for, 0.05))
+
+            cost = 0.0
+            if self.files_per_second and files:
+                cost += files / (self.files_per_second * self.scale)
+            if self.bytes_per_second and nbytes:
+                cost += nbytes / (self.bytes_per_second * self.scale)
+
+            # Allow a small burst, then pace to the budget
+            now = time.monotonic()
+            self._next_slot = max(self._next_slot, now - 0.1) + cost
+            delay = self._next_slot - now
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def observe(self, seconds):
+        """Feed the latency of one directory read into the adaptive pace"""
+        with self._condition:
+            self.latency = seconds if not self.latency else 0.8 * self.latency + 0.2 * seconds
+            if self.latency > self.target_latency:
+                self.scale = max(0.05, self.scale * 0.7)
+            elif self.latency < self.target_latency / 2:
+                self.scale = min(1.0, self.scale * 1.05)
+
+
+class BackgroundScanner:
+    """Periodically rescans the library index on a low-priority thread"""
+
+    def __init__(self, index, config, caches=None):
+        scan_config = config.get('scan', {}).get('background', {})
+        self.index = index
+        self.caches = caches
+        self.enabled = scan_config.get('enabled', True)
+        self.interval = scan_config.get('interval', 60)
+        self.low_priority = scan_config.get('low_priority', True)
+        self.throttle = IOThrottle(
+            files_per_second=scan_config.get('files_per_second', 2000),
+            mb_per_second=scan_config.get('mb_per_second', 20),
+            target_latency_ms=scan_config.get('target_latency_ms', 20),
+            resume_delay_ms=scan_config.get('resume_delay_ms', 500)
+        )
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._rescan_requested = False
+        self._thread = None
+
+    def start(self):
+        """Start the scanner thread (no-op if disabled or already running)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self.index.scanner = self
+        self._thread = threading.Thread(target=self._run, name='background-scan', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scanner thread"""
+        self._stopped.set()
+        self._wake.set()
+        self.index.scanner = None
+
+    def trigger(self):
+        """Run a rescan now instead of waiting for the interval"""
+        self._rescan_requested = True
+        self._wake.set()
+
+    def analyze(self):
+        """Analyze new or changed previews now (no rescan)"""
+        self._wake.set()
+
+    def _run(self):
+        if self.low_priority:
+            lower_thread_priority()
+
+        next_scan = time.monotonic() + self.interval
+        while not self._stopped.is_set():
+            self._wake.wait(max(0.0, next_scan - time.monotonic()))
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+
+            if self._rescan_requested or time.monotonic() >= next_scan:
+                self._rescan_requested = False
+                next_scan = time.monotonic() + self.interval
+                try:
+                    start = time.time()
+                    if self.index.refresh(force=True, throttle=self.throttle, low_priority=self.low_priority):
+                        print(f"Background scan finished in {time.time() - start:.1f}s "
+                              f"(pace {self.throttle.scale:.0%} of budget)")
+                except Exception as e:
+                    print(f"Background scan failed: {e}")
+
+            try:
+                start = time.time()
+                analyzed = self.index.analyze_previews(self.throttle, self._stopped)
+                if analyzed:
+                    print(f"Analyzed {analyzed} previews in {time.time() - start:.1f}s")
+            except Exception as e:
+                print(f"Preview analysis failed: {e}")
+
+            if self.caches is not None:
+                try:
+                    self.caches.enforce()
+                except Exception as e:
+                    print(f"Cache budget check failed: {e}")
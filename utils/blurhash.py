@@ -0,0 +1,149 @@
+"""
+BlurHash
+Encodes an image as a ~28 character BlurHash placeholder (https://blurha.sh)
+
+The image is box-downsampled to a few dozen pixels and projected onto a
+small cosine basis; with NumPy both steps are vectorized array operations,
+without it a Pillow resize and plain Python loops compute the same factors.
+"""
+
+import math
+
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+# Longest side of the downsampled image the basis is computed from
+SAMPLE_SIZE = 32
+
+# numpy module once imported (None if not installed); importing it is deferred
+# so the web app and the CLI start without it
+_numpy = False
+
+
+def load_numpy():
+    """numpy, imported on first use, or None when it is not installed (pure-Python fallback)"""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def _base83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(value):
+    value /= 255.0
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def encode_image(image, components_x=4, components_y=3):
+    """BlurHash of a Pillow image"""
+    image = image.convert('RGB')
+    if load_numpy() is not None:
+        factors = _factors_numpy(image, components_x, components_y)
+    else:
+        factors = _factors_python(image, components_x, components_y)
+    return _encode_factors(factors, components_x, components_y)
+
+
+def _sample_shape(width, height):
+    scale = SAMPLE_SIZE / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def box_downsample(image, sample_size=SAMPLE_SIZE):
+    """
+    Average whole blocks of pixels so the longest side is about sample_size.
+    Returns a float32 (rows, cols, 3) array; the edge remainder is cropped.
+    """
+    np = load_numpy()
+    pixels = np.asarray(image, dtype=np.float32)
+    height, width = pixels.shape[:2]
+    scale = sample_size / max(width, height)
+    block_x = max(1, width // max(1, round(width * scale)))
+    block_y = max(1, height // max(1, round(height * scale)))
+    rows, cols = height // block_y, width // block_x
+    pixels = pixels[:rows * block_y, :cols * block_x]
+    return pixels.reshape(rows, block_y, cols, block_x, 3).mean(axis=(1, 3))
+
+
+def _factors_numpy(image, components_x, components_y):
+    """Box downsample by reshaping, then one tensor contraction for all components"""
+    np = load_numpy()
+    pixels = box_downsample(image)
+    rows, cols = pixels.shape[:2]
+
+    pixels /= 255.0
+    linear = np.where(pixels <= 0.04045, pixels / 12.92, ((pixels + 0.055) / 1.055) ** 2.4)
+
+    basis_x = np.cos(np.pi * np.outer(np.arange(components_x), np.arange(cols)) / cols)
+    basis_y = np.cos(np.pi * np.outer(np.arange(components_y), np.arange(rows)) / rows)
+    factors = np.einsum('jy,ix,yxc->jic', basis_y, basis_x, linear) / (rows * cols)
+    factors[1:] *= 2
+    factors[0, 1:] *= 2
+    return [tuple(float(channel) for channel in factors[j, i])
+            for j in range(components_y) for i in range(components_x)]
+
+
+def _factors_python(image, components_x, components_y):
+    from PIL import Image
+
+    cols, rows = _sample_shape(*image.size)
+    small = image.resize((cols, rows), Image.Resampling.BOX)
+    data = small.tobytes()
+    linear = [tuple(_srgb_to_linear(float(channel)) for channel in data[offset:offset + 3])
+              for offset in range(0, len(data), 3)]
+
+    factors = []
+    for j in range(components_y):
+        for i in range(components_x):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(rows):
+                basis_y = math.cos(math.pi * j * y / rows)
+                for x in range(cols):
+                    basis = basis_y * math.cos(math.pi * i * x / cols)
+                    pixel = linear[y * cols + x]
+                    r += basis * pixel[0]
+                    g += basis * pixel[1]
+                    b += basis * pixel[2]
+            scale = normalisation / (rows * cols)
+            factors.append((r * scale, g * scale, b * scale))
+    return factors
+
+
+def _encode_factors(factors, components_x, components_y):
+    dc, ac = factors[0], factors[1:]
+    result = _base83((components_x - 1) + (components_y - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(channel) for factor in ac for channel in factor)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        maximum = 1
+        result += _base83(0, 1)
+
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        quantised = [int(max(0, min(18, math.floor(_sign_pow(channel / maximum, 0.5) * 9 + 9.5))))
+                     for channel in factor]
+        result += _base83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return result
@@ -0,0 +1,190 @@
+"""
+Cache Registry
+Inventory of the in-memory caches with hit rates, approximate sizes and a
+shared memory budget
+
+Each component registers its caches with a measure function (entries and
+approximate bytes) and, if the cache can be rebuilt, a flush function. When
+the registered caches together exceed cache.memory_budget_mb, evictable
+caches are flushed cheapest-to-rebuild first until the total fits again.
+Sizes are estimated from a sample of each container, so measuring stays
+cheap on large libraries.
+"""
+
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+
+
+# Items sampled per container and how deep nested containers are followed
+SAMPLE_ITEMS = 32
+MAX_DEPTH = 4
+
+# Minimum seconds between budget checks made from the request path
+ENFORCE_INTERVAL = 10
+
+
+def _sample(iterable):
+    """First SAMPLE_ITEMS items (retried if another thread resized the container meanwhile)"""
+    for _ in range(3):
+        try:
+            return list(itertools.islice(iterable(), SAMPLE_ITEMS))
+        except RuntimeError:
+            continue
+    return []
+
+
+def approximate_size(obj, depth=0):
+    """Approximate deep size in bytes, extrapolated from a sample of each container"""
+    size = sys.getsizeof(obj)
+    if depth >= MAX_DEPTH or isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+
+    if isinstance(obj, dict):
+        count = len(obj)
+        sample = _sample(obj.items)
+        per_item = [approximate_size(key, depth + 1) + approximate_size(value, depth + 1) for key, value in sample]
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        count = len(obj)
+        sample = _sample(lambda: iter(obj))
+        per_item = [approximate_size(item, depth + 1) for item in sample]
+    elif hasattr(obj, '__slots__'):
+        values = [getattr(obj, name, None) for name in obj.__slots__]
+        return size + sum(approximate_size(value, depth + 1) for value in values)
+    elif hasattr(obj, '__dict__'):
+        return size + approximate_size(vars(obj), depth + 1)
+    else:
+        return size
+
+    if not per_item:
+        return size
+    return size + int(sum(per_item) / len(per_item) * count)
+
+
+class CacheCounter:
+    """Hit and miss counts of one cache (unlocked; approximate under concurrency)"""
+
+    __slots__ = ('hits', 'misses')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+
+class CacheRegistry:
+    """Registered caches, their statistics and the memory budget across them"""
+
+    def __init__(self, config):
+        cache_config = config.get('cache', {})
+        budget_mb = cache_config.get('memory_budget_mb', 256)
+        self.budget = int(float(budget_mb) * 1024 * 1024) if budget_mb else None
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._last_enforced = 0.0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def register(self, name, measure, flush=None, counter=None, priority=0, memory=True, evictable=True):
+        """
+        Register a cache.
+        measure() returns (entries, approximate bytes); flush() empties the cache
+        (None when it cannot be rebuilt). Under budget pressure flushable caches
+        are evicted lowest priority first, unless evictable is False (caches that
+        would immediately be rebuilt in the background). Caches with memory=False
+        (files on disk) are reported but do not count towards the budget.
+        Returns the cache's CacheCounter.
+        """
+        counter = counter or CacheCounter()
+        with self._lock:
+            self._caches[name] = {
+                'measure': measure,
+                'flush': flush,
+                'counter': counter,
+                'priority': priority,
+                'memory': memory,
+                'evictable': evictable and memory and flush is not None
+            }
+        return counter
+
+    def report(self):
+        """Entries, bytes and hit rate of every cache, plus the memory total and budget"""
+        with self._lock:
+            caches = list(self._caches.items())
+
+        entries = []
+        memory_total = 0
+        for name, cache in caches:
+            count, nbytes = cache['measure']()
+            counter = cache['counter']
+            lookups = counter.hits + counter.misses
+            entries.append({
+                'name': name,
+                'entries': count,
+                'bytes': nbytes,
+                'memory': cache['memory'],
+                'flushable': cache['flush'] is not None,
+                'evictable': cache['evictable'],
+                'hits': counter.hits,
+                'misses': counter.misses,
+                'hit_rate': round(counter.hits / lookups, 3) if lookups else None
+            })
+            if cache['memory']:
+                memory_total += nbytes
+
+        return {
+            'caches': entries,
+            'memory_bytes': memory_total,
+            'budget_bytes': self.budget,
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes
+        }
+
+    def flush(self, name):
+        """Empty one cache; returns the approximate bytes released (ValueError if unknown or not flushable)"""
+        with self._lock:
+            cache = self._caches.get(name)
+        if cache is None:
+            raise ValueError(f"Unknown cache: {name}")
+        if cache['flush'] is None:
+            raise ValueError(f"Cache cannot be flushed: {name}")
+        _, nbytes = cache['measure']()
+        cache['flush']()
+        return nbytes
+
+    def enforce(self):
+        """Flush evictable caches, lowest priority first, until memory use fits the budget"""
+        if self.budget is None:
+            return 0
+        with self._lock:
+            caches = {name: cache for name, cache in self._caches.items() if cache['memory']}
+            self._last_enforced = time.monotonic()
+
+        sizes = {name: cache['measure']()[1] for name, cache in caches.items()}
+        total = sum(sizes.values())
+        freed = 0
+        evictable = sorted((cache['priority'], name) for name, cache in caches.items() if cache['evictable'])
+        for _, name in evictable:
+            if total - freed <= self.budget:
+                break
+            if not sizes[name]:
+                continue
+            caches[name]['flush']()
+            freed += sizes[name]
+            self.evictions += 1
+            self.evicted_bytes += sizes[name]
+            print(f"Cache budget exceeded: flushed {name} (~{sizes[name] / 1048576:.1f} MB)")
+        return freed
+
+    def maybe_enforce(self):
+        """enforce() at most every ENFORCE_INTERVAL seconds (cheap to call per request)"""
+        if self.budget is None or time.monotonic() - self._last_enforced < ENFORCE_INTERVAL:
+            return 0
+        return self.enforce()
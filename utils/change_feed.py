@@ -0,0 +1,103 @@
+"""
+Change Feed
+Sequenced change notifications from the library index, pushed to open
+browser tabs as server-sent events
+
+Every event gets an increasing id and is kept in a bounded history, so a
+client that reconnects (EventSource sends Last-Event-ID) receives what it
+missed. A client further behind than the history, or one that saw ids from a
+previous server run, gets a single 'reset' and reloads instead.
+"""
+
+import json
+import threading
+from collections import deque
+
+from utils.cache_registry import approximate_size
+
+
+HISTORY_SIZE = 1000
+
+# A batch with more item changes than this is published as one 'reset'
+MAX_BATCH = 200
+
+# Seconds between keepalive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+
+def parse_event_id(value):
+    """Last-Event-ID header or query value as an int, or None (ValueError if invalid)"""
+    if value is None or not str(value).strip():
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid event id: {value}")
+
+
+def format_event(message):
+    """Encode an (id, event, data) message as a server-sent event; None is a keepalive"""
+    if message is None:
+        return ': keepalive\n\n'
+    event_id, event_type, data = message
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ChangeFeed:
+    """Bounded, sequenced event history with blocking and callback-based waiting"""
+
+    def __init__(self, history=HISTORY_SIZE):
+        self._history = deque(maxlen=history)
+        self._last_id = 0
+        self._condition = threading.Condition()
+        self._listeners = []
+
+    @property
+    def last_id(self):
+        with self._condition:
+            return self._last_id
+
+    def publish(self, event_type, data):
+        """Append an event and wake waiting readers; returns its id"""
+        with self._condition:
+            self._last_id += 1
+            event_id = self._last_id
+            self._history.append((event_id, event_type, data))
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+        return event_id
+
+    def since(self, last_id):
+        """Events after last_id as (id, event, data), or a single 'reset' when they are no longer known"""
+        with self._condition:
+            if last_id == self._last_id:
+                return []
+            if last_id > self._last_id or not self._history or last_id < self._history[0][0] - 1:
+                return [(self._last_id, 'reset', {})]
+            return [event for event in self._history if event[0] > last_id]
+
+    def wait(self, last_id, timeout=HEARTBEAT_SECONDS):
+        """Block until there are events after last_id or the timeout passes, then return them"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id != last_id, timeout)
+        return self.since(last_id)
+
+    def measure(self):
+        """(events kept, approximate bytes) for the cache registry"""
+        with self._condition:
+            history = list(self._history)
+        return len(history), approximate_size(history)
+
+    def add_listener(self, callback):
+        """Call callback() (from the publishing thread) after every event"""
+        with self._condition:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._condition:
+            try:
+                self._listeners.remove(callback)
+            except ValueError:
+                pass
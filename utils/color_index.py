@@ -0,0 +1,207 @@
+"""
+Color Index
+Dominant colours of wallpaper previews, hue ordering and nearest-colour search
+
+Colours are extracted once per preview (k-means over a box-downsampled image
+with NumPy, Pillow's median cut without it) and cached on the index records.
+Queries only read those cached colours: dominant colours are placed in a
+k-d tree over CIELAB coordinates, so a nearest-colour search is a radius query
+instead of a pass over every wallpaper.
+"""
+
+import colorsys
+import math
+import sys
+
+from utils.blurhash import box_downsample, load_numpy
+from utils.cache_registry import approximate_size
+
+
+# Longest side of the image colours are extracted from
+COLOR_SAMPLE_SIZE = 64
+
+# Clusters per preview, and the share of pixels a colour needs to be searchable
+DOMINANT_COLORS = 5
+MIN_SEARCH_WEIGHT = 0.1
+
+# Default search radius (CIE76 delta E)
+DEFAULT_TOLERANCE = 25
+
+SORT_ORDERS = ('size', 'hue')
+
+
+def parse_color(value):
+    """Parse '#rrggbb' or 'rrggbb' into an (r, g, b) tuple (ValueError if invalid)"""
+    text = value.strip().lstrip('#')
+    if len(text) != 6:
+        raise ValueError(f"Invalid colour: {value}")
+    try:
+        return tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise ValueError(f"Invalid colour: {value}")
+
+
+def parse_color_args(get):
+    """Build {'sort', 'color', 'tolerance'} from query args (ValueError for invalid values)"""
+    sort = (get('sort') or 'size').lower()
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort order: {sort}")
+    color = get('color')
+    return {
+        'sort': sort,
+        'color': parse_color(color) if color else None,
+        'tolerance': float(get('color_tolerance') or DEFAULT_TOLERANCE)
+    }
+
+
+def to_hex(rgb):
+    return '#{:02x}{:02x}{:02x}'.format(*(int(round(channel)) for channel in rgb[:3]))
+
+
+def extract_colors(image, k=DOMINANT_COLORS):
+    """
+    Average and dominant colours of a Pillow image.
+    Returns {'average': [r, g, b], 'dominant': [[r, g, b, weight], ...]}, heaviest first.
+    """
+    image = image.convert('RGB')
+    if load_numpy() is not None:
+        return _extract_numpy(image, k)
+    return _extract_median_cut(image, k)
+
+
+def _extract_numpy(image, k):
+    np = load_numpy()
+    pixels = box_downsample(image, COLOR_SAMPLE_SIZE).reshape(-1, 3)
+    k = min(k, len(pixels))
+
+    # Deterministic start: pixels spread evenly along the luminance order
+    luminance = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    centers = pixels[np.argsort(luminance)[np.linspace(0, len(pixels) - 1, k).astype(int)]]
+    for _ in range(12):
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, channel], minlength=k)
+                         for channel in range(3)], axis=1)
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.abs(updated - centers).max() < 0.5:
+            centers = updated
+            break
+        centers = updated
+
+    order = np.argsort(-counts)
+    dominant = [[int(round(float(channel))) for channel in centers[index]] +
+                [round(float(counts[index]) / len(pixels), 3)]
+                for index in order if counts[index] > 0]
+    average = [int(round(float(channel))) for channel in pixels.mean(axis=0)]
+    return {'average': average, 'dominant': dominant}
+
+
+def _extract_median_cut(image, k):
+    from PIL import Image, ImageStat
+
+    image.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE), Image.Resampling.BOX)
+    quantized = image.quantize(colors=k, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()
+    total = image.size[0] * image.size[1]
+    dominant = [palette[index * 3:index * 3 + 3] + [round(count / total, 3)]
+                for count, index in sorted(quantized.getcolors(), reverse=True)]
+    average = [int(round(channel)) for channel in ImageStat.Stat(image).mean[:3]]
+    return {'average': average, 'dominant': dominant}
+
+
+def rgb_to_lab(rgb):
+    """sRGB (0-255) to CIELAB (D65)"""
+    def linear(channel):
+        channel /= 255.0
+        return channel / 12.92 if channel <= 0.04045 else ((channel + 0.055) / 1.055) ** 2.4
+
+    r, g, b = (linear(float(channel)) for channel in rgb[:3])
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+
+    def f(t):
+        return t ** (1 / 3) if t > 0.008856 else 7.787 * t + 16 / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+def hue_key(colors):
+    """
+    Sort key ordering wallpapers around the colour wheel by their heaviest
+    saturated colour; greys follow (light to dark), then unanalysed previews.
+    """
+    if not colors:
+        return (2, 0.0, 0.0)
+    for r, g, b, weight in colors['dominant']:
+        hue, saturation, value = colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
+        if saturation >= 0.2 and value >= 0.2 and weight >= MIN_SEARCH_WEIGHT:
+            return (0, hue, -saturation)
+    r, g, b = colors['average']
+    return (1, -(0.299 * r + 0.587 * g + 0.114 * b), 0.0)
+
+
+class KDTree:
+    """Static k-d tree over (point, payload) pairs with radius queries"""
+
+    def __init__(self, items, dimensions=3):
+        self.dimensions = dimensions
+        self.size = len(items)
+        self._root = self._build(list(items), 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % self.dimensions
+        items.sort(key=lambda item: item[0][axis])
+        middle = len(items) // 2
+        return (items[middle], axis,
+                self._build(items[:middle], depth + 1), self._build(items[middle + 1:], depth + 1))
+
+    def nbytes(self):
+        """Approximate memory of the tree (every node has the same shape)"""
+        if self._root is None:
+            return 0
+        return self.size * (sys.getsizeof(self._root) + approximate_size(self._root[0]))
+
+    def within(self, point, radius):
+        """All (distance, payload) with the point within radius, unordered"""
+        results = []
+        limit = radius * radius
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            (vector, payload), axis, left, right = node
+            distance = sum((a - b) ** 2 for a, b in zip(point, vector))
+            if distance <= limit:
+                results.append((math.sqrt(distance), payload))
+            offset = point[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            stack.append(near)
+            if offset * offset <= limit:
+                stack.append(far)
+        return results
+
+
+class ColorIndex:
+    """Nearest-colour search over the dominant colours of analyzed previews"""
+
+    def __init__(self, colors_by_id):
+        items = []
+        for workshop_id, colors in colors_by_id:
+            for r, g, b, weight in colors['dominant']:
+                if weight >= MIN_SEARCH_WEIGHT:
+                    items.append((rgb_to_lab((r, g, b)), workshop_id))
+        self.tree = KDTree(items)
+
+    def search(self, rgb, tolerance=DEFAULT_TOLERANCE):
+        """{workshop_id: distance} of wallpapers with a dominant colour within tolerance"""
+        matches = {}
+        for distance, workshop_id in self.tree.within(rgb_to_lab(rgb), tolerance):
+            if distance < matches.get(workshop_id, math.inf):
+                matches[workshop_id] = round(distance, 1)
+        return matches
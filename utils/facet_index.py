@@ -0,0 +1,115 @@
+"""
+Facet Index
+Bitset index over project.json fields (type, tags, content rating) with
+precomputed counts per facet value
+
+Each facet value maps to a bitset over the same item ordinals used by the
+subscription bitsets, so combined filters and disjunctive facet counts are a
+few bitwise operations instead of a scan.
+"""
+
+
+# Facet name -> query parameter name
+FACETS = ('type', 'tag', 'rating')
+
+
+def parse_facet_args(getlist):
+    """Build {facet: [values]} from query args; values may repeat or be comma-separated"""
+    selections = {}
+    for facet in FACETS:
+        values = [value.strip() for arg in getlist(facet) for value in arg.split(',') if value.strip()]
+        if values:
+            selections[facet] = values
+    return selections
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+class FacetIndex:
+    """Facet value bitsets and counts, maintained as records are added and removed"""
+
+    def __init__(self, bitsets):
+        self.bitsets = bitsets
+        # facet -> {value key: [label, bitset, count]}
+        self._values = {facet: {} for facet in FACETS}
+
+    def add(self, record):
+        """Add a record's facet values"""
+        bit = 1 << self.bitsets.ordinal(record.id)
+        for facet, value in self._record_values(record):
+            entry = self._values[facet].setdefault(value.lower(), [value, 0, 0])
+            entry[1] |= bit
+            entry[2] += 1
+
+    def remove(self, record):
+        """Remove a record's facet values"""
+        bit = 1 << self.bitsets.ordinal(record.id)
+        values = self._values
+        for facet, value in self._record_values(record):
+            entry = values[facet].get(value.lower())
+            if entry is None:
+                continue
+            entry[1] &= ~bit
+            entry[2] -= 1
+            if entry[2] <= 0:
+                del values[facet][value.lower()]
+
+    def counts(self):
+        """Precomputed counts for every facet value over the whole library"""
+        return {
+            facet: sorted(
+                ({'value': label, 'count': count} for label, _, count in entries.values()),
+                key=lambda item: (-item['count'], item['value'].lower())
+            )
+            for facet, entries in self._values.items()
+        }
+
+    def select(self, selections, base_mask):
+        """
+        Apply facet selections (OR within a facet, AND across facets) to a base bitset.
+        Returns (matching bitset, counts), where each facet's counts apply every
+        selection except that facet's own, so alternatives stay visible.
+        """
+        facet_masks = {}
+        for facet, values in selections.items():
+            if facet not in self._values:
+                raise ValueError(f"Unknown facet: {facet}")
+            mask = 0
+            for value in values:
+                entry = self._values[facet].get(value.lower())
+                if entry is not None:
+                    mask |= entry[1]
+            facet_masks[facet] = mask
+
+        result = base_mask
+        for mask in facet_masks.values():
+            result &= mask
+
+        counts = {}
+        for facet, entries in self._values.items():
+            others = base_mask
+            for other_facet, mask in facet_masks.items():
+                if other_facet != facet:
+                    others &= mask
+            facet_counts = [
+                {'value': label, 'count': _popcount(mask & others)}
+                for label, mask, _ in entries.values()
+            ]
+            counts[facet] = sorted(
+                (item for item in facet_counts if item['count']),
+                key=lambda item: (-item['count'], item['value'].lower())
+            )
+        return result, counts
+
+    def _record_values(self, record):
+        """(facet, value) pairs of a record, each value once (add and remove count per record)"""
+        yield 'type', record.type
+        # project.json may repeat a tag, also in another case; keys are lowercase
+        seen = set()
+        for tag in record.tags:
+            if tag.lower() not in seen:
+                seen.add(tag.lower())
+                yield 'tag', tag
+        yield 'rating', record.rating
@@ -3,9 +3,13 @@ Image Processor
 Handles image processing and preview generation
 """
 
+import hashlib
+import os
 import tempfile
 from pathlib import Path
-from PIL import Image
+
+from utils.cache_registry import CacheCounter, approximate_size
+from utils.single_flight import SingleFlight
 
 
 class ImageProcessor:
@@ -13,49 +17,332 @@ class ImageProcessor:
     
     def __init__(self, config):
         self.config = config
-        self.preview_config = config.get('preview', {})
+        self._load_settings()
+        
+        # {folder: (mtime_ns, match subfolder, its mtime_ns, result)} memo of preview lookups
+        self._preview_cache = {}
+        self._flight = SingleFlight()
+        
+        # Hit/miss counts reported through the cache registry
+        self._preview_counter = CacheCounter()
+        self._thumbnail_counter = CacheCounter()
+    
+    def _load_settings(self):
+        """Read the preview settings from config"""
+        self.preview_config = self.config.get('preview', {})
         self.max_width = self.preview_config.get('max_width', 300)
         self.max_height = self.preview_config.get('max_height', 200)
         self.quality = self.preview_config.get('quality', 85)
+        
+        # Fallback preview search depth
+        self.search_depth = self.preview_config.get('search_depth', 4)
+        
+        # Animated thumbnail settings (GIF previews are often several MB)
+        self.max_frames = self.preview_config.get('max_frames', 24)
+        self.cache_dir = Path(self.preview_config.get('cache_dir') or
+                              Path(tempfile.gettempdir()) / 'wallpaper_manager' / 'thumbnails')
+    
+    def reconfigure(self):
+        """
+        Re-read the preview settings after a config change. Cached thumbnails are
+        deleted only when their output settings changed, the lookup memo only when
+        the search depth did. Returns the names of the caches that were cleared.
+        """
+        previous = (self.max_width, self.max_height, self.max_frames, self.quality, self.cache_dir)
+        previous_depth = self.search_depth
+        self._load_settings()
+        
+        cleared = []
+        if previous != (self.max_width, self.max_height, self.max_frames, self.quality, self.cache_dir):
+            # From the previous directory when cache_dir moved
+            self.clear_thumbnails(previous[-1])
+            cleared.append('thumbnails')
+        if self.search_depth != previous_depth:
+            self._preview_cache.clear()
+            cleared.append('preview_lookup')
+        return cleared
+    
+    def register_caches(self, registry):
+        """Report the preview lookup memo and the thumbnail directory to a CacheRegistry"""
+        def measure_thumbnails():
+            count = 0
+            total = 0
+            try:
+                with os.scandir(self.cache_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file() and not entry.name.endswith('.tmp'):
+                            count += 1
+                            total += entry.stat().st_size
+            except OSError:
+                pass
+            return count, total
+        
+        registry.register('preview_lookup',
+                          lambda: (len(self._preview_cache), approximate_size(self._preview_cache)),
+                          self._preview_cache.clear, self._preview_counter, priority=1)
+        registry.register('thumbnails', measure_thumbnails, self.clear_thumbnails,
+                          self._thumbnail_counter, memory=False)
+    
+    def clear_thumbnails(self, cache_dir=None):
+        """Delete the cached animated thumbnails (rebuilt on the next request)"""
+        try:
+            with os.scandir(cache_dir or self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+    
+    # Priority order for preview files in the wallpaper root
+    PREVIEW_FILES = [
+        ('preview.jpg', 'image'),
+        ('preview.jpeg', 'image'),
+        ('preview.png', 'image'),
+        ('preview.gif', 'gif'),
+        ('preview.webp', 'image'),
+        ('preview.bmp', 'image')
+    ]
+    
+    # Priority order of extensions for the fallback search
+    IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tga']
+    
+    # Skip large files (probably main wallpaper files)
+    MAX_FALLBACK_SIZE = 50 * 1024 * 1024  # 50MB
     
     def find_preview_file(self, folder_path):
-        """Find preview file in wallpaper folder"""
-        # Priority order for preview files
-        preview_files = [
-            ('preview.jpg', 'image'),
-            ('preview.jpeg', 'image'),
-            ('preview.png', 'image'),
-            ('preview.gif', 'gif'),
-            ('preview.webp', 'image'),
-            ('preview.bmp', 'image')
-        ]
-        
-        for filename, file_type in preview_files:
-            preview_path = folder_path / filename
-            if preview_path.exists():
-                return str(preview_path), file_type
-        
-        # Look for any image files as fallback
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tga']
-        for ext in image_extensions:
-            for img_file in folder_path.rglob(f'*{ext}'):
-                # Skip large files (probably main wallpaper files)
+        """
+        Find preview file in wallpaper folder. Memoized while the folder's mtime
+        and, for a fallback image in a subfolder, that subfolder's mtime are unchanged.
+        """
+        key = str(folder_path)
+        try:
+            mtime_ns = os.stat(key).st_mtime_ns
+        except OSError:
+            return None, None
+        
+        cached = self._preview_cache.get(key)
+        if cached is not None and cached[0] == mtime_ns and (
+                cached[1] is None or self._directory_mtime(cached[1]) == cached[2]):
+            self._preview_counter.hit()
+            return cached[3]
+        
+        self._preview_counter.miss()
+        result, directory = self._scan_preview_file(key)
+        if directory == key:
+            directory = None
+        self._preview_cache[key] = (mtime_ns, directory, self._directory_mtime(directory) if directory else None,
+                                    result)
+        return result
+    
+    @staticmethod
+    def _directory_mtime(directory):
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _list_directory(directory):
+        """([(lower-case name, DirEntry)] of files, [subfolder paths]) of one directory"""
+        files = []
+        subfolders = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append(entry.path)
+                        elif entry.is_file():
+                            files.append((entry.name.lower(), entry))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files, subfolders
+    
+    def _scan_preview_file(self, folder):
+        """
+        Look for a preview.* file in the folder itself first (one scandir); only
+        without one, walk subfolders up to search_depth for the best fallback
+        image by extension priority, then depth.
+        Returns ((path, type), directory holding the match or None).
+        """
+        preview_names = {name: index for index, (name, _) in enumerate(self.PREVIEW_FILES)}
+        root_listing = self._list_directory(folder)
+        
+        previews = [(preview_names[name], entry.path) for name, entry in root_listing[0] if name in preview_names]
+        if previews:
+            priority, path = min(previews)
+            return (path, self.PREVIEW_FILES[priority][1]), folder
+        
+        ext_priority = {ext: index for index, ext in enumerate(self.IMAGE_EXTENSIONS)}
+        best_fallback = None   # (ext priority, depth, path, directory)
+        pending = [(folder, 0)]
+        while pending:
+            directory, depth = pending.pop()
+            files, subfolders = root_listing if depth == 0 else self._list_directory(directory)
+            for name, entry in files:
+                ext = os.path.splitext(name)[1]
+                if ext not in ext_priority:
+                    continue
+                candidate = (ext_priority[ext], depth, entry.path, directory)
+                if best_fallback is not None and candidate >= best_fallback:
+                    continue
                 try:
-                    if img_file.stat().st_size > 50 * 1024 * 1024:  # 50MB
+                    if entry.stat().st_size > self.MAX_FALLBACK_SIZE:
                         continue
-                except:
+                except OSError:
                     continue
-                
-                file_type = 'gif' if ext.lower() == '.gif' else 'image'
-                return str(img_file), file_type
+                best_fallback = candidate
+            if depth < self.search_depth:
+                pending.extend((subfolder, depth + 1) for subfolder in subfolders)
         
-        return None, None
+        if best_fallback is not None:
+            path = best_fallback[2]
+            file_type = 'gif' if path.lower().endswith('.gif') else 'image'
+            return (path, file_type), best_fallback[3]
+        
+        return (None, None), None
     
     def get_preview_path(self, folder_path):
         """Get preview image path"""
         preview_path, preview_type = self.find_preview_file(folder_path)
         return preview_path
     
+    def get_thumbnail_path(self, preview_path, preview_type):
+        """
+        Get a path suitable for grid cards.
+        GIF previews are replaced by a downscaled animated thumbnail; other
+        previews (and GIFs that fail to transcode) are served as-is.
+        """
+        if preview_type != 'gif' or not preview_path:
+            return preview_path
+        thumbnail = self.get_animated_thumbnail(preview_path)
+        return thumbnail or preview_path
+    
+    def _thumbnail_key(self, source):
+        """Cache key: source path + mtime + target size, so edits invalidate it"""
+        mtime_ns = source.stat().st_mtime_ns
+        source_key = hashlib.sha1(str(source).encode('utf-8')).hexdigest()[:16]
+        size_key = f"{self.max_width}x{self.max_height}_{self.max_frames}"
+        return source_key, mtime_ns, size_key
+    
+    def _cached_thumbnail(self, source_key, mtime_ns, size_key):
+        for ext in ('.webp', '.gif'):
+            cached = self.cache_dir / f"{source_key}_{mtime_ns}_{size_key}{ext}"
+            if cached.exists():
+                self._thumbnail_counter.hit()
+                return str(cached)
+        return None
+    
+    def find_animated_thumbnail(self, gif_path):
+        """Get the cached animated thumbnail for a GIF if it was already built (no Pillow)"""
+        try:
+            return self._cached_thumbnail(*self._thumbnail_key(Path(gif_path)))
+        except OSError:
+            return None
+    
+    def get_animated_thumbnail(self, gif_path):
+        """Get (building if needed) a cached downscaled animated thumbnail for a GIF"""
+        try:
+            source = Path(gif_path)
+            source_key, mtime_ns, size_key = self._thumbnail_key(source)
+            cached = self._cached_thumbnail(source_key, mtime_ns, size_key)
+            if cached:
+                return cached
+            
+            # Concurrent requests for the same preview share one transcode
+            self._thumbnail_counter.miss()
+            return self._flight.do((source_key, mtime_ns, size_key), self._build_animated_thumbnail,
+                                   source, source_key, mtime_ns, size_key)
+            
+        except Exception as e:
+            print(f"Error getting animated thumbnail: {e}")
+            return None
+    
+    def _build_animated_thumbnail(self, source, source_key, mtime_ns, size_key):
+        """Transcode a GIF into a downscaled, frame-decimated animated WebP (or GIF)"""
+        from PIL import Image, features
+        
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        with Image.open(source) as gif:
+            n_frames = getattr(gif, 'n_frames', 1)
+            # Keep every step-th frame so at most max_frames remain
+            step = max(1, -(-n_frames // max(1, self.max_frames)))
+            
+            frames = []
+            durations = []
+            for index in range(n_frames):
+                gif.seek(index)
+                duration = gif.info.get('duration', 100) or 100
+                if index % step == 0:
+                    frame = gif.convert('RGBA')
+                    frame.thumbnail((self.max_width, self.max_height), Image.Resampling.LANCZOS)
+                    frames.append(frame)
+                    durations.append(duration)
+                else:
+                    # Dropped frames extend the previous kept frame to keep timing
+                    durations[-1] += duration
+            loop = gif.info.get('loop', 0)
+        
+        if not frames:
+            return None
+        
+        # Older Pillow reports animated WebP support as a separate feature
+        if 'webp_anim' in features.features:
+            use_webp = features.check_feature('webp_anim')
+        else:
+            use_webp = features.check_module('webp')
+        ext = '.webp' if use_webp else '.gif'
+        target = self.cache_dir / f"{source_key}_{mtime_ns}_{size_key}{ext}"
+        temp_target = target.with_name(target.name + f'.{os.getpid()}.tmp')
+        
+        save_kwargs = {
+            'save_all': True,
+            'append_images': frames[1:],
+            'duration': durations,
+            'loop': loop,
+        }
+        if use_webp:
+            frames[0].save(temp_target, 'WEBP', quality=self.quality, method=4, **save_kwargs)
+        else:
+            frames[0].save(temp_target, 'GIF', optimize=True, disposal=2, **save_kwargs)
+        os.replace(temp_target, target)
+        
+        # Remove thumbnails of older versions of the same source
+        for stale in self.cache_dir.glob(f"{source_key}_*"):
+            if stale != target and not stale.name.endswith('.tmp'):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        
+        return str(target)
+    
+    def analyze_preview(self, preview_path):
+        """
+        Decode a preview once (first frame of animations) and derive its BlurHash
+        placeholder and colours. Returns (blurhash, colors), or (None, None).
+        """
+        try:
+            from PIL import Image
+            from utils.blurhash import encode_image
+            from utils.color_index import extract_colors
+            
+            with Image.open(preview_path) as img:
+                # JPEG decodes straight to a fraction of its size; others are reduced in C first
+                img.draft('RGB', (128, 128))
+                factor = max(img.size) // 256
+                frame = (img.reduce(factor) if factor > 1 else img).convert('RGB')
+            return encode_image(frame), extract_colors(frame)
+        except Exception as e:
+            print(f"Error analyzing preview {preview_path}: {e}")
+            return None, None
+    
     def process_image_for_web(self, image_path, output_path=None):
         """Process image for web display (resize, optimize)"""
         try:
@@ -68,6 +355,9 @@ class ImageProcessor:
                 output_path = temp_file.name
                 temp_file.close()
             
+            # Pillow is imported on first use to keep startup light
+            from PIL import Image
+            
             # Open and process image
             with Image.open(image_path) as img:
                 # Convert to RGB if necessary
@@ -89,6 +379,7 @@ class ImageProcessor:
     def extract_gif_frame(self, gif_path, frame_number=None):
         """Extract a frame from GIF for preview"""
         try:
+            from PIL import Image
             with Image.open(gif_path) as gif:
                 if not hasattr(gif, 'n_frames') or gif.n_frames <= 1:
                     # Single frame GIF, just convert
@@ -144,6 +435,7 @@ class ImageProcessor:
     def create_placeholder_image(self, width=None, height=None, text="No Preview"):
         """Create a placeholder image"""
         try:
+            from PIL import Image
             w = width or self.max_width
             h = height or self.max_height
             
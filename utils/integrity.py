@@ -0,0 +1,205 @@
+"""
+Integrity Manifests
+Per-wallpaper file lists with sizes and content hashes, used to detect
+partial downloads and corrupted files
+
+A manifest is built the first time a wallpaper is verified (or after Steam
+updated it). Re-verifying walks the folder and re-hashes only files whose
+size is unchanged but whose mtime differs; files with a different size are
+reported as changed without reading them, so an unchanged library costs one
+directory walk per wallpaper.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """BLAKE2b digest of a file (hashlib releases the GIL, so threads hash in parallel)"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def walk_files(folder_path):
+    """{relative path: (size, mtime_ns)} for every file below a folder"""
+    files = {}
+    pending = ['']
+    while pending:
+        relative = pending.pop()
+        with os.scandir(os.path.join(folder_path, relative)) as entries:
+            for entry in entries:
+                name = f"{relative}/{entry.name}" if relative else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(name)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class IntegrityChecker:
+    """Builds and re-verifies integrity manifests, hashing files on a thread pool"""
+
+    def __init__(self, config):
+        integrity_config = config.get('integrity', {})
+        self.manifest_dir = Path(integrity_config.get('manifest_dir') or
+                                 Path(tempfile.gettempdir()) / 'wallpaper_manager' / 'manifests')
+        self.workers = integrity_config.get('workers') or min(8, os.cpu_count() or 4)
+        self._lock = threading.Lock()
+
+    def verify_all(self, items, rebuild=False):
+        """
+        Verify many wallpapers, yielding progress events.
+        items is a list of (workshop_id, folder_path, timeupdated); timeupdated
+        comes from appworkshop_431960.acf (or None) and a manifest older than it
+        is rebuilt instead of reported. Events are dicts with an 'event' key:
+        'start', 'progress', 'item' (damaged, rebuilt or unreadable wallpapers)
+        and a final 'done' with the summary.
+        """
+        start = time.time()
+        total = len(items)
+        summary = {'checked': 0, 'ok': 0, 'created': 0, 'rebuilt': 0, 'damaged': 0, 'errors': 0,
+                   'files_hashed': 0, 'bytes_hashed': 0}
+        yield {'event': 'start', 'total': total}
+
+        hash_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='integrity-hash')
+        item_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='integrity-walk')
+        try:
+            futures = [item_pool.submit(self.verify, workshop_id, folder_path, timeupdated, rebuild, hash_pool)
+                       for workshop_id, folder_path, timeupdated in items]
+            last_progress = 0.0
+            for future in as_completed(futures):
+                result = future.result()
+                summary['checked'] += 1
+                summary[result['status']] += 1
+                summary['files_hashed'] += result.pop('files_hashed')
+                summary['bytes_hashed'] += result.pop('bytes_hashed')
+                if result['status'] not in ('ok', 'created'):
+                    yield dict(result, event='item', done=summary['checked'], total=total)
+
+                now = time.time()
+                if now - last_progress >= 0.25 or summary['checked'] == total:
+                    last_progress = now
+                    yield {'event': 'progress', 'done': summary['checked'], 'total': total}
+        finally:
+            # A client that disconnects abandons the generator; drop the queued work
+            item_pool.shutdown(wait=False, cancel_futures=True)
+            hash_pool.shutdown(wait=False, cancel_futures=True)
+
+        summary['elapsed'] = round(time.time() - start, 3)
+        yield {'event': 'done', 'summary': summary}
+
+    def verify(self, workshop_id, folder_path, timeupdated=None, rebuild=False, hash_pool=None):
+        """
+        Verify one wallpaper against its manifest.
+        status is 'ok', 'damaged' (missing, extra or changed files), 'created' or
+        'rebuilt' (new baseline), or 'errors' when the folder cannot be read.
+        """
+        result = {'id': workshop_id, 'status': 'ok', 'missing': [], 'extra': [], 'changed': [],
+                  'files_hashed': 0, 'bytes_hashed': 0}
+        try:
+            current = walk_files(folder_path)
+            manifest = None if rebuild else self._load(workshop_id)
+            if manifest is None or (timeupdated and manifest['built'] < timeupdated):
+                hashes = self._hash_files(folder_path, current, list(current), hash_pool, result)
+                self._save(workshop_id, {
+                    'built': time.time(),
+                    'files': {name: [size, mtime_ns, hashes[name]] for name, (size, mtime_ns) in current.items()}
+                })
+                result['status'] = 'created' if manifest is None and not rebuild else 'rebuilt'
+                result['files'] = len(current)
+                return result
+
+            files = manifest['files']
+            result['missing'] = sorted(name for name in files if name not in current)
+            result['extra'] = sorted(name for name in current if name not in files)
+
+            # Same size and mtime: trusted. Different size: changed without reading it.
+            suspect = []
+            for name, (size, mtime_ns) in current.items():
+                expected = files.get(name)
+                if expected is None or (size, mtime_ns) == (expected[0], expected[1]):
+                    continue
+                if size != expected[0]:
+                    result['changed'].append(name)
+                else:
+                    suspect.append(name)
+
+            touched = False
+            hashes = self._hash_files(folder_path, current, suspect, hash_pool, result)
+            for name in suspect:
+                if hashes[name] == files[name][2]:
+                    # Content unchanged (file only touched): remember the new mtime
+                    files[name][1] = current[name][1]
+                    touched = True
+                else:
+                    result['changed'].append(name)
+            result['changed'].sort()
+            if touched:
+                self._save(workshop_id, manifest)
+
+            if result['missing'] or result['extra'] or result['changed']:
+                result['status'] = 'damaged'
+            return result
+
+        except Exception as e:
+            print(f"Error verifying {workshop_id}: {e}")
+            result['status'] = 'errors'
+            result['error'] = str(e)
+            return result
+
+    def forget(self, workshop_id):
+        """Drop the manifest of a deleted wallpaper"""
+        try:
+            self._manifest_path(workshop_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _hash_files(self, folder_path, current, names, hash_pool, result):
+        """Hash the named files, on the shared pool when one is given"""
+        paths = [os.path.join(folder_path, name) for name in names]
+        if hash_pool is not None and len(paths) > 1:
+            digests = list(hash_pool.map(hash_file, paths))
+        else:
+            digests = [hash_file(path) for path in paths]
+        result['files_hashed'] += len(names)
+        result['bytes_hashed'] += sum(current[name][0] for name in names)
+        return dict(zip(names, digests))
+
+    def _manifest_path(self, workshop_id):
+        return self.manifest_dir / f"{workshop_id}.json"
+
+    def _load(self, workshop_id):
+        try:
+            with open(self._manifest_path(workshop_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable integrity manifest for {workshop_id}: {e}")
+            return None
+
+    def _save(self, workshop_id, manifest):
+        """Write a manifest atomically"""
+        with self._lock:
+            self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        path = self._manifest_path(workshop_id)
+        temp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
@@ -0,0 +1,1077 @@
+"""
+Library Index
+Keeps an in-memory index of wallpaper folders with precomputed statistics,
+and publishes what changed to a feed for live clients
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.background_scanner import lower_thread_priority
+from utils.cache_registry import CacheCounter, approximate_size
+from utils.change_feed import ChangeFeed, MAX_BATCH
+from utils.color_index import ColorIndex
+from utils.facet_index import FacetIndex
+from utils.media_probe import probe_media
+from utils.single_flight import SingleFlight
+from utils.subscription_bitsets import SubscriptionBitsets
+
+
+# Size histogram buckets: (label, exclusive upper bound in bytes)
+SIZE_BUCKETS = [
+    ('< 10 MB', 10 * 1024 ** 2),
+    ('10 MB - 100 MB', 100 * 1024 ** 2),
+    ('100 MB - 500 MB', 500 * 1024 ** 2),
+    ('500 MB - 1 GB', 1024 ** 3),
+    ('1 GB - 5 GB', 5 * 1024 ** 3),
+    ('> 5 GB', None)
+]
+
+# Aggregate key used for statistics across all users
+ALL_USERS = 'all'
+
+# Bumped when the layout of saved index rows changes (older files are ignored)
+INDEX_FORMAT = 1
+
+# Settings naming the content roots; the default index file is keyed by them
+ROOT_KEYS = ('steam_library_path', 'content_path', 'content_roots')
+
+# When one batch changes an item several ways, the highest ranked change is published
+CHANGE_RANK = {'subscription': 0, 'updated': 1, 'resized': 2, 'added': 3}
+
+
+def size_bucket(size):
+    """Get histogram bucket index for a size in bytes"""
+    for index, (_, upper) in enumerate(SIZE_BUCKETS):
+        if upper is None or size < upper:
+            return index
+    return len(SIZE_BUCKETS) - 1
+
+
+def get_folder_size(folder_path, throttle=None):
+    """Get total size of folder using a scandir walk (paced by an optional IOThrottle)"""
+    total = 0
+    pending = [str(folder_path)]
+    while pending:
+        directory = pending.pop()
+        try:
+            started = time.perf_counter()
+            with os.scandir(directory) as entries:
+                if throttle is not None:
+                    throttle.observe(time.perf_counter() - started)
+                for entry in entries:
+                    if throttle is not None:
+                        throttle.consume(files=1)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def manifest_size(installed, mtime_ns, tolerance):
+    """
+    Size recorded for an item in appworkshop_431960.acf, or None when the folder's
+    mtime is not consistent with the manifest: content older than the recorded
+    update (not yet downloaded) or changed after Steam last touched the item.
+    """
+    if installed is None:
+        return None
+    size, timeupdated, timetouched = installed
+    mtime = mtime_ns / 1e9
+    if mtime < timeupdated - tolerance:
+        return None
+    if timetouched is not None and mtime > timetouched + tolerance:
+        return None
+    return size
+
+
+def read_project(folder_path, throttle=None):
+    """Parse the fields used by the index out of a wallpaper's project.json"""
+    data = {}
+    try:
+        with open(Path(folder_path) / "project.json", 'rb') as f:
+            raw = f.read()
+        if throttle is not None:
+            throttle.consume(files=1, nbytes=len(raw))
+        data = json.loads(raw.decode('utf-8'))
+        if not isinstance(data, dict):
+            data = {}
+    except Exception:
+        pass
+
+    tags = data.get('tags')
+    if not isinstance(tags, list):
+        tags = []
+
+    return {
+        'title': str(data.get('title') or ''),
+        'type': str(data.get('type') or 'unknown').lower(),
+        'tags': [str(tag) for tag in tags if tag],
+        'rating': str(data.get('contentrating') or 'Unknown'),
+        'file': str(data['file']) if data.get('file') else None
+    }
+
+
+class WallpaperRecord:
+    """
+    Compact index record for one wallpaper folder.
+    Strings shared between records (ids, titles, roots, preview names, types,
+    tags, ratings) are interned, and the folder and preview paths are derived
+    on access. media caches the main asset's header probe as (mtime_ns, info)
+    and analysis the preview's (mtime_ns, BlurHash, colours).
+    """
+
+    __slots__ = ('id', 'title', 'type', 'size', 'root', 'mtime_ns', 'preview_name', 'preview_type',
+                 'tags', 'rating', 'file', 'media', 'analysis')
+
+    def __init__(self, workshop_id, title, wallpaper_type, size, root, mtime_ns,
+                 preview_name=None, preview_type=None, tags=(), rating='Unknown', file=None):
+        self.id = sys.intern(workshop_id)
+        self.title = sys.intern(title)
+        self.type = sys.intern(wallpaper_type)
+        self.size = size
+        self.root = sys.intern(root)
+        self.mtime_ns = mtime_ns
+        self.preview_name = sys.intern(preview_name) if preview_name else None
+        self.preview_type = sys.intern(preview_type) if preview_type else None
+        self.tags = tuple(sys.intern(tag) for tag in tags)
+        self.rating = sys.intern(rating)
+        self.file = file
+        self.media = None
+        self.analysis = None
+
+    def replace(self, **changes):
+        """Copy of the record with some fields changed"""
+        record = WallpaperRecord.__new__(WallpaperRecord)
+        for name in self.__slots__:
+            setattr(record, name, changes.get(name, getattr(self, name)))
+        return record
+
+    @property
+    def path(self):
+        """Full folder path"""
+        return os.path.join(self.root, self.id)
+
+    @property
+    def preview_path(self):
+        """Full preview file path, or None"""
+        if self.preview_name is None:
+            return None
+        return os.path.join(self.root, self.id, self.preview_name)
+
+
+class LibraryIndex:
+    """
+    Index of wallpaper folders across all content roots.
+    Each root is scanned as its own shard and the shards are merged. Records
+    are rebuilt only for folders whose mtime changed, and library-wide and
+    per-user aggregates are adjusted incrementally so statistics can be
+    served without walking the library.
+    """
+
+    def __init__(self, config, steam_parser, image_processor):
+        self.config = config
+        self.steam_parser = steam_parser
+        self.image_processor = image_processor
+        self._records = {}  # workshop_id -> WallpaperRecord
+        self._lock = threading.RLock()
+        self._flight = SingleFlight()  # Disk scans run outside _lock; concurrent refreshes share one
+        self._last_refresh = 0
+        self._cache_duration = 30  # Re-check folder mtimes every 30 seconds
+
+        # Past the cache duration the last scan is still served while a refresh
+        # runs in the background, up to max_staleness seconds old
+        cache_config = config.get('cache', {})
+        self.max_staleness = cache_config.get('max_staleness', 300)
+
+        # Records are saved after scans and loaded at startup, so the first scan of
+        # a new process (or a CLI run) only re-reads folders whose mtime changed
+        self.persist = cache_config.get('persist_index', True)
+        self._dirty = False
+
+        # Set while a BackgroundScanner keeps the index fresh
+        self.scanner = None
+
+        # Sizes come from appworkshop_431960.acf when the folder mtime agrees with it
+        scan_config = config.get('scan', {})
+        self.use_manifest_sizes = scan_config.get('use_manifest_sizes', True)
+        self.manifest_tolerance = scan_config.get('manifest_mtime_tolerance', 3600)
+
+        # Library-wide aggregates: [count, size]
+        self._total = [0, 0]
+        self._histogram = [[0, 0] for _ in SIZE_BUCKETS]
+        self._by_type = {}
+        self._by_root = {}
+
+        # Bumped on every change; used to cache the size-sorted record list
+        self._generation = 0
+        self._sorted_cache = (None, [])
+
+        # Per-user aggregates: {user_id: {'subscribed': [count, size], 'disabled': [count, size]}}
+        self._subscription_data = None
+        self._user_stats = {}
+        self._all_active = set()
+        self._all_disabled = set()
+
+        # Per-user subscription bitsets over item ordinals, for cross-user filters
+        self.bitsets = SubscriptionBitsets()
+
+        # Facet bitsets over project.json fields (same ordinals)
+        self.facets = FacetIndex(self.bitsets)
+
+        # k-d tree over analyzed preview colours, rebuilt on the next colour query after a change
+        self._color_index = None
+
+        # Item changes since the last publish ({workshop_id: change}) and the
+        # statistics they were published against (see _publish_changes)
+        self.changes = ChangeFeed()
+        self._pending_changes = {}
+        self._published_stats = None
+
+        # Hit/miss counts reported through the cache registry
+        self._record_counter = CacheCounter()
+        self._sorted_counter = CacheCounter()
+        self._color_counter = CacheCounter()
+        self._media_counter = CacheCounter()
+        self._analysis_counter = CacheCounter()
+
+    def register_caches(self, registry):
+        """
+        Report the index and its derived caches to a CacheRegistry. Records,
+        aggregates and bitsets are the index itself and are never evicted;
+        the sorted list, colour tree and media probes are rebuilt on demand.
+        """
+        def measure_records():
+            with self._lock:
+                return len(self._records), approximate_size(self._records)
+
+        def measure_search():
+            with self._lock:
+                return len(self._records), approximate_size(self.bitsets) + approximate_size(self.facets)
+
+        def measure_sorted():
+            with self._lock:
+                records = self._sorted_cache[1]
+                return len(records), sys.getsizeof(records)
+
+        def flush_sorted():
+            with self._lock:
+                self._sorted_cache = (None, [])
+
+        def measure_colors():
+            with self._lock:
+                color_index = self._color_index
+            if color_index is None:
+                return 0, 0
+            return color_index.tree.size, color_index.tree.nbytes()
+
+        def flush_colors():
+            with self._lock:
+                self._color_index = None
+
+        registry.register('records', measure_records, counter=self._record_counter)
+        registry.register('search_index', measure_search)
+        registry.register('change_feed', lambda: self.changes.measure())
+        registry.register('sorted_records', measure_sorted, flush_sorted, self._sorted_counter, priority=0)
+        registry.register('color_index', measure_colors, flush_colors, self._color_counter, priority=1)
+        registry.register('media_info', lambda: self._measure_slot('media'),
+                          lambda: self._flush_slot('media'), self._media_counter, priority=4)
+        # Flushed analyses are decoded again by the background scanner, so never evicted
+        registry.register('preview_analysis', lambda: self._measure_slot('analysis'),
+                          lambda: self._flush_slot('analysis'), self._analysis_counter, evictable=False)
+
+    def _measure_slot(self, name):
+        """(count, approximate bytes) of a per-record cache slot"""
+        values = [value for value in (getattr(record, name) for record in self.records()) if value is not None]
+        return len(values), approximate_size(values) - sys.getsizeof(values)
+
+    def _flush_slot(self, name):
+        """Clear a per-record cache slot on every record"""
+        with self._lock:
+            for record in self._records.values():
+                setattr(record, name, None)
+            if name == 'analysis':
+                self._color_index = None
+        if name == 'analysis' and self.scanner is not None:
+            self.scanner.analyze()
+
+    @property
+    def index_file(self):
+        """cache.index_file, or a file in the temp directory keyed by the configured content roots"""
+        configured = self.config.get('cache', {}).get('index_file')
+        if configured:
+            return Path(configured)
+        roots = json.dumps([self.config.get(key) for key in ROOT_KEYS], sort_keys=True)
+        digest = hashlib.sha1(roots.encode('utf-8')).hexdigest()[:16]
+        return Path(tempfile.gettempdir()) / 'wallpaper_manager' / f"index_{digest}.json"
+
+    def load(self):
+        """
+        Restore the records saved by an earlier run. They are not trusted as
+        fresh: the next scan still runs, but reuses every record whose folder
+        mtime is unchanged. Returns the number of records loaded.
+        """
+        if not self.persist:
+            return 0
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != INDEX_FORMAT:
+                return 0
+
+            records = []
+            for (workshop_id, title, wallpaper_type, size, root, mtime_ns, preview_name, preview_type,
+                 tags, rating, file, media, analysis) in data['records']:
+                record = WallpaperRecord(workshop_id, title, wallpaper_type, size, root, mtime_ns,
+                                         preview_name, preview_type, tags=tags, rating=rating, file=file)
+                record.media = tuple(media) if media else None
+                record.analysis = tuple(analysis) if analysis else None
+                records.append(record)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"Ignoring saved index {self.index_file}: {e}")
+            return 0
+
+        with self._lock:
+            if self._records:
+                return 0
+            for record in records:
+                self._store(record)
+            self._dirty = False
+        return len(records)
+
+    def save(self):
+        """Write the records to index_file if they changed since the last save"""
+        if not self.persist:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._dirty = False
+            rows = [[record.id, record.title, record.type, record.size, record.root, record.mtime_ns,
+                     record.preview_name, record.preview_type, record.tags, record.rating, record.file,
+                     record.media, record.analysis]
+                    for record in self._records.values()]
+
+        index_file = self.index_file
+        temp_path = index_file.with_name(f"{index_file.name}.{threading.get_ident()}.tmp")
+        try:
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': INDEX_FORMAT, 'saved': time.time(), 'records': rows},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_path, index_file)
+            return True
+        except Exception as e:
+            print(f"Error saving index: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+    def refresh(self, force=False, throttle=None, low_priority=False):
+        """
+        Re-scan all content roots if the index is older than the cache duration.
+        The disk scan runs outside the index lock, and callers arriving while a
+        scan is in flight wait for it instead of starting their own.
+
+        Request-path calls are stale-while-revalidate: an index older than the
+        cache duration but younger than max_staleness is served as-is while a
+        refresh runs in the background (the BackgroundScanner if there is one).
+        Background rescans pass an IOThrottle and start once the first
+        foreground scan has populated the index. They are a separate flight:
+        a throttled scan pauses while requests are in progress, so a request
+        joining it would wait on itself; request-path callers that need a scan
+        run their own unthrottled one. Returns True if a scan was merged.
+        """
+        with self._lock:
+            current_time = time.time()
+            age = current_time - self._last_refresh
+            if throttle is not None:
+                due = self._last_refresh > 0
+            elif force or not self._last_refresh:
+                due = True
+            elif age < self._fresh_for():
+                due = False
+            elif age < self.max_staleness or self._scan_paused():
+                # Serve the last scan; an interactive request never waits on a throttled scan
+                self._revalidate()
+                due = False
+            else:
+                due = True
+            if not due:
+                self._sync_subscriptions()
+                self._publish_changes()
+                return False
+
+        key = 'scan' if throttle is None else 'background-scan'
+        return self._flight.do(key, self._scan_and_merge, current_time, throttle, low_priority)
+
+    def freshness(self):
+        """Get (age in seconds, stale, revalidating) of the served index"""
+        with self._lock:
+            age = time.time() - self._last_refresh if self._last_refresh else 0.0
+            return age, age >= self._fresh_for(), self._scan_in_flight()
+
+    def _fresh_for(self):
+        """Seconds a scan counts as fresh (the scanner interval when scanning in the background)"""
+        if self.scanner is not None:
+            return max(self._cache_duration, self.scanner.interval)
+        return self._cache_duration
+
+    def _scan_paused(self):
+        """Check whether a throttled background scan is in flight (it pauses for requests)"""
+        return self._flight.in_flight('background-scan')
+
+    def _scan_in_flight(self):
+        return self._flight.in_flight('scan') or self._flight.in_flight('background-scan')
+
+    def _revalidate(self):
+        """Start a background refresh unless one is already running"""
+        if self._scan_in_flight():
+            return
+        if self.scanner is not None:
+            self.scanner.trigger()
+        else:
+            self._flight.start('scan', self._scan_and_merge, time.time())
+
+    def content_roots_changed(self):
+        """
+        Pick up added or removed content roots without a full rebuild. The rescan
+        reuses every record whose folder mtime is unchanged, so only the items
+        under new roots are read from disk.
+        """
+        if self.scanner is not None:
+            self.scanner.trigger()
+        else:
+            self._flight.start('roots', self._rescan_roots)
+
+    def _rescan_roots(self):
+        # A scan already in flight read the old roots; let it finish, then scan again
+        if self._flight.in_flight('scan'):
+            self._flight.do('scan', self._scan_and_merge, time.time())
+        return self._flight.do('scan', self._scan_and_merge, time.time())
+
+    def resync_subscriptions(self):
+        """Re-read subscription state now (after the subscription data was invalidated)"""
+        with self._lock:
+            self._sync_subscriptions()
+            self._publish_changes()
+
+    def _scan_and_merge(self, current_time, throttle=None, low_priority=False):
+        """Scan every content root and merge the shards into the index"""
+        with self._lock:
+            roots = self.steam_parser.get_content_paths()
+            known = dict(self._records)
+
+        shards = self._scan_roots(roots, known, throttle, low_priority)
+
+        with self._lock:
+            if current_time < self._last_refresh:
+                # A scan that started later (e.g. a request's while this one was throttled) already merged
+                return False
+
+            # Merge shards in root order; an item present in two roots is taken from the first
+            seen = set()
+            for root in roots:
+                entries, built = shards.get(str(root), ({}, {}))
+                for workshop_id in entries:
+                    if workshop_id in seen:
+                        continue
+                    record = self._records.get(workshop_id)
+                    if workshop_id in built:
+                        self._store(built[workshop_id])
+                    elif record is None:
+                        # Removed from the index while the scan was running
+                        continue
+                    elif record.root != str(root):
+                        # Item moved between roots without changing its mtime
+                        folder_path = Path(root) / workshop_id
+                        installed = self._installed_items(root).get(workshop_id)
+                        self._store(self._build_record(workshop_id, folder_path, entries[workshop_id],
+                                                       installed=installed))
+                    seen.add(workshop_id)
+
+            for workshop_id in [wid for wid in self._records if wid not in seen]:
+                self._discard(workshop_id)
+
+            self._last_refresh = current_time
+            self._sync_subscriptions()
+            self._publish_changes()
+
+        self.save()
+
+        # New or changed previews get their colours and placeholders off the request path
+        if self.scanner is not None and any(built for _, built in shards.values()):
+            self.scanner.analyze()
+        return True
+
+    def get_record(self, workshop_id):
+        """Get the record for an item, indexing it on demand if it is new on disk"""
+        with self._lock:
+            record = self._records.get(workshop_id)
+            if record is not None:
+                self._record_counter.hit()
+                return record
+
+            self._record_counter.miss()
+            folder_path = self.steam_parser.find_item_folder(workshop_id)
+            if folder_path is None:
+                return None
+            try:
+                mtime_ns = folder_path.stat().st_mtime_ns
+            except OSError:
+                return None
+
+            self._sync_subscriptions()
+            installed = self._installed_items(folder_path.parent).get(workshop_id)
+            record = self._build_record(workshop_id, folder_path, mtime_ns, installed=installed)
+            self._store(record)
+            self._publish_changes()
+            return record
+
+    def lookup(self, workshop_id):
+        """Get the indexed record for an item, or None (never touches the disk)"""
+        with self._lock:
+            return self._records.get(workshop_id)
+
+    def media_info(self, record):
+        """
+        Header-only description of a record's main asset (see utils.media_probe).
+        Probed on first use and cached on the record until the file's mtime changes.
+        """
+        if not record.file:
+            return None
+        try:
+            mtime_ns = os.stat(os.path.join(record.path, record.file)).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = record.media
+        if cached is not None and cached[0] == mtime_ns:
+            self._media_counter.hit()
+            return cached[1]
+        self._media_counter.miss()
+        info = probe_media(os.path.join(record.path, record.file))
+        record.media = (mtime_ns, info)
+        return info
+
+    def placeholder(self, record):
+        """
+        BlurHash placeholder of a record's preview, or None until the background
+        analysis pass has decoded it (never decodes on the request path)
+        """
+        analysis = record.analysis
+        if analysis is not None:
+            self._analysis_counter.hit()
+            return analysis[1]
+        if record.preview_name is not None:
+            self._analysis_counter.miss()
+            if self.scanner is not None:
+                self.scanner.analyze()
+            else:
+                self._flight.start('analyze', self.analyze_previews)
+        return None
+
+    @staticmethod
+    def colors(record):
+        """Cached colours of a record's preview, or None if not analyzed yet (never decodes)"""
+        return record.analysis[2] if record.analysis else None
+
+    def analyze_previews(self, throttle=None, stopped=None):
+        """
+        Decode previews that are new or changed since their last analysis
+        (BlurHash and colours), paced by the throttle. Returns how many were decoded.
+        """
+        analyzed = 0
+        for record in self.records():
+            if stopped is not None and stopped.is_set():
+                break
+            if throttle is not None:
+                throttle.consume(files=1)
+            previous = record.analysis
+            if self._analyze(record) is not previous:
+                analyzed += 1
+        if analyzed:
+            self.save()
+        return analyzed
+
+    def colors_pending(self):
+        """Number of records with a preview whose colours are not known yet"""
+        with self._lock:
+            return sum(1 for record in self._records.values()
+                       if record.preview_name is not None and record.analysis is None)
+
+    def color_matches(self, rgb, tolerance):
+        """{workshop_id: delta E} of wallpapers with a dominant colour near rgb (see utils.color_index)"""
+        with self._lock:
+            if self._color_index is not None:
+                self._color_counter.hit()
+            else:
+                self._color_counter.miss()
+                self._color_index = ColorIndex((record.id, record.analysis[2])
+                                               for record in self._records.values()
+                                               if record.analysis and record.analysis[2])
+            color_index = self._color_index
+        return color_index.search(rgb, tolerance)
+
+    def _analyze(self, record):
+        """Preview analysis (mtime_ns, blurhash, colors), recomputed when the preview's mtime changes"""
+        preview_path = record.preview_path
+        if preview_path is None:
+            return None
+        try:
+            mtime_ns = os.stat(preview_path).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = record.analysis
+        if cached is not None and cached[0] == mtime_ns:
+            return cached
+        blurhash, colors = self.image_processor.analyze_preview(preview_path)
+        record.analysis = (mtime_ns, blurhash, colors)
+        with self._lock:
+            self._color_index = None
+            self._dirty = True
+        return record.analysis
+
+    def _scan_roots(self, roots, known, throttle=None, low_priority=False):
+        """
+        Scan content roots concurrently, one worker group per device so a slow
+        disk does not hold up roots on faster ones. Background scans share one
+        throttle and can run their workers at low priority.
+        Returns {root: ({workshop_id: mtime_ns}, {workshop_id: new record})}
+        """
+        devices = {}
+        for root in roots:
+            try:
+                device = os.stat(root).st_dev
+            except OSError:
+                print(f"Content root not available: {root}")
+                continue
+            devices.setdefault(device, []).append(root)
+
+        if not devices:
+            return {}
+
+        workers_per_device = max(1, int(self.config.get('scan', {}).get('workers_per_device', 2)))
+        initializer = lower_thread_priority if low_priority else None
+        shards = {}
+        with ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix='scan-device',
+                                initializer=initializer) as device_pool:
+            futures = [
+                device_pool.submit(self._scan_device, device_roots, known, workers_per_device,
+                                   throttle, initializer)
+                for device_roots in devices.values()
+            ]
+            for future in futures:
+                shards.update(future.result())
+        return shards
+
+    def _scan_device(self, roots, known, workers, throttle=None, initializer=None):
+        """Scan the roots of one device with that device's worker group"""
+        shards = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-worker',
+                                initializer=initializer) as pool:
+            for root in roots:
+                shards[str(root)] = self._scan_root(root, known, pool, throttle)
+        return shards
+
+    def _scan_root(self, root, known, pool, throttle=None):
+        """List one root and build records for new or modified folders"""
+        entries = {}
+        changed = []
+        try:
+            with os.scandir(root) as iterator:
+                for entry in iterator:
+                    if throttle is not None:
+                        throttle.consume(files=1)
+                    try:
+                        if not entry.is_dir() or not self.steam_parser.is_valid_workshop_id(entry.name):
+                            continue
+                        started = time.perf_counter()
+                        mtime_ns = entry.stat().st_mtime_ns
+                        if throttle is not None:
+                            throttle.observe(time.perf_counter() - started)
+                    except OSError:
+                        continue
+
+                    entries[entry.name] = mtime_ns
+                    record = known.get(entry.name)
+                    if record is None or record.mtime_ns != mtime_ns:
+                        changed.append((entry.name, Path(entry.path), mtime_ns))
+        except OSError as e:
+            print(f"Error scanning content directory {root}: {e}")
+
+        # One manifest parse replaces the directory walks of items it describes
+        installed = self._installed_items(root) if changed else {}
+        built = {}
+        for record in pool.map(lambda item: self._build_record(*item, throttle=throttle,
+                                                               installed=installed.get(item[0])), changed):
+            built[record.id] = record
+        return entries, built
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Hold the index still (no merges or subscription resyncs) for a multi-part read.
+        Yields the subscription data the aggregates were computed from.
+        """
+        with self._lock:
+            yield self._subscription_data or {}
+
+    def records(self):
+        """Get all indexed records"""
+        with self._lock:
+            return list(self._records.values())
+
+    def records_by_size(self):
+        """Get all indexed records sorted by size (largest first), cached until the index changes"""
+        with self._lock:
+            generation, records = self._sorted_cache
+            if generation != self._generation:
+                self._sorted_counter.miss()
+                records = sorted(self._records.values(), key=lambda record: record.size, reverse=True)
+                self._sorted_cache = (self._generation, records)
+            else:
+                self._sorted_counter.hit()
+            return records
+
+    def roots(self):
+        """Get per-root (count, size) for every content root holding indexed items"""
+        with self._lock:
+            return {root: tuple(values) for root, values in self._by_root.items()}
+
+    def filter_ids(self, expression):
+        """Get the set of item ids on disk matching a subscription filter expression"""
+        with self._lock:
+            return set(self.bitsets.ids(self.bitsets.evaluate(expression)))
+
+    def select(self, expression=None, facet_selections=None):
+        """
+        Combine a subscription filter expression and facet selections.
+        Returns (set of matching ids, or None when nothing is selected, facet counts).
+        """
+        with self._lock:
+            if not (expression and expression.strip()) and not facet_selections:
+                return None, self.facets.counts()
+
+            base_mask = self.bitsets.present
+            if expression and expression.strip():
+                base_mask = self.bitsets.evaluate(expression)
+            mask, counts = self.facets.select(facet_selections or {}, base_mask)
+            return set(self.bitsets.ids(mask)), counts
+
+    def filter_totals(self, expression):
+        """Get (count, size) of the items matching a subscription filter expression"""
+        with self._lock:
+            count = 0
+            size = 0
+            for workshop_id in self.bitsets.ids(self.bitsets.evaluate(expression)):
+                record = self._records.get(workshop_id)
+                if record is not None:
+                    count += 1
+                    size += record.size
+            return count, size
+
+    def remove(self, workshop_id):
+        """Remove an item from the index (e.g. after deleting its folder)"""
+        with self._lock:
+            self._discard(workshop_id)
+            self._publish_changes()
+
+    def get_statistics(self, user_id=None):
+        """
+        Get precomputed statistics in constant time.
+        Returns raw [count, size] pairs, or None for an unknown user.
+        """
+        with self._lock:
+            key = user_id if user_id and user_id != ALL_USERS else ALL_USERS
+            user_stats = self._user_stats.get(key)
+            if user_stats is None:
+                return None
+
+            subscribed = tuple(user_stats['subscribed'])
+            disabled = tuple(user_stats['disabled'])
+            not_subscribed = (self._total[0] - subscribed[0] - disabled[0],
+                              self._total[1] - subscribed[1] - disabled[1])
+
+            return {
+                'total': tuple(self._total),
+                'subscribed': subscribed,
+                'disabled': disabled,
+                'not_subscribed': not_subscribed,
+                'size_histogram': [
+                    (label, count, size)
+                    for (label, _), (count, size) in zip(SIZE_BUCKETS, self._histogram)
+                ],
+                'by_type': {
+                    wallpaper_type: tuple(values)
+                    for wallpaper_type, values in self._by_type.items()
+                },
+                'by_root': {
+                    root: tuple(values)
+                    for root, values in self._by_root.items()
+                }
+            }
+
+    def _installed_items(self, root):
+        """Installed-item manifest entries of a content root ({} when disabled or missing)"""
+        if not self.use_manifest_sizes:
+            return {}
+        return self.steam_parser.load_installed_items(root)
+
+    def verify_sizes(self):
+        """
+        Walk every indexed folder and compare its size with appworkshop_431960.acf.
+        Records whose size differs from the walk are corrected. Returns a report
+        with the drift per item.
+        """
+        records = self.records()
+        workers = max(1, int(self.config.get('scan', {}).get('workers_per_device', 2)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify-sizes') as pool:
+            disk_sizes = list(pool.map(lambda record: get_folder_size(record.path), records))
+
+        report = {'checked': len(records), 'not_in_manifest': 0, 'mtime_mismatch': 0, 'drift': []}
+        for record, disk_size in zip(records, disk_sizes):
+            installed = self.steam_parser.load_installed_items(record.root).get(record.id)
+            if installed is None:
+                report['not_in_manifest'] += 1
+                continue
+            consistent = manifest_size(installed, record.mtime_ns, self.manifest_tolerance) is not None
+            if not consistent:
+                report['mtime_mismatch'] += 1
+            if installed[0] != disk_size:
+                report['drift'].append({
+                    'id': record.id,
+                    'title': record.title,
+                    'manifest_size': installed[0],
+                    'disk_size': disk_size,
+                    'mtime_consistent': consistent
+                })
+
+        with self._lock:
+            for record, disk_size in zip(records, disk_sizes):
+                if disk_size != record.size and self._records.get(record.id) is record:
+                    self._store(record.replace(size=disk_size))
+            self._publish_changes()
+        return report
+
+    def _build_record(self, workshop_id, folder_path, mtime_ns, throttle=None, installed=None):
+        """Build an index record from disk (size from the workshop manifest when consistent)"""
+        project = read_project(folder_path, throttle)
+        preview_path, preview_type = self.image_processor.find_preview_file(folder_path)
+        preview_name = os.path.relpath(preview_path, folder_path) if preview_path else None
+        size = manifest_size(installed, mtime_ns, self.manifest_tolerance)
+
+        return WallpaperRecord(
+            workshop_id,
+            project['title'] or f'ID: {workshop_id}',
+            project['type'],
+            size if size is not None else get_folder_size(folder_path, throttle),
+            str(folder_path.parent),
+            mtime_ns,
+            preview_name,
+            preview_type,
+            tags=project['tags'],
+            rating=project['rating'],
+            file=project['file']
+        )
+
+    def _store(self, record):
+        """Insert or replace a record, updating aggregates by the difference"""
+        previous = self._records.get(record.id)
+        if previous is not None:
+            self._apply(previous, -1)
+            if previous.analysis is not None and previous.analysis is not record.analysis:
+                self._color_index = None
+            self._note_change(record.id, 'resized' if previous.size != record.size else 'updated')
+        else:
+            self._note_change(record.id, 'added')
+        self._records[record.id] = record
+        self._apply(record, 1)
+
+    def _discard(self, workshop_id):
+        """Remove a record and its contribution to the aggregates"""
+        record = self._records.pop(workshop_id, None)
+        if record is not None:
+            self._apply(record, -1)
+            if record.analysis is not None:
+                self._color_index = None
+            self._note_change(workshop_id, 'removed')
+
+    def _note_change(self, workshop_id, change):
+        """Remember a change for the next publish, merged with earlier changes to the same item"""
+        previous = self._pending_changes.get(workshop_id)
+        if change == 'removed':
+            if previous == 'added':
+                del self._pending_changes[workshop_id]
+            else:
+                self._pending_changes[workshop_id] = 'removed'
+        elif previous == 'removed':
+            self._pending_changes[workshop_id] = 'updated'
+        elif previous is None or CHANGE_RANK[change] > CHANGE_RANK[previous]:
+            self._pending_changes[workshop_id] = change
+
+    def _publish_changes(self):
+        """
+        Publish pending item changes, then the per-user statistics delta, to the
+        change feed. The first publish only records the statistics baseline, and
+        bulk changes (e.g. a new content root) become one 'reset'.
+        """
+        stats = {user_id: self._stat_totals(user_id) for user_id in self._user_stats}
+        previous_stats, self._published_stats = self._published_stats, stats
+        changes, self._pending_changes = self._pending_changes, {}
+        if previous_stats is None:
+            return
+        if len(changes) > MAX_BATCH:
+            self.changes.publish('reset', {'changed': len(changes)})
+            return
+
+        for workshop_id, change in changes.items():
+            self.changes.publish(change, {'id': workshop_id})
+        if stats.keys() != previous_stats.keys():
+            self.changes.publish('users', {})
+
+        delta = {}
+        for user_id, totals in stats.items():
+            before = previous_stats.get(user_id)
+            if before is None or before == totals:
+                continue
+            delta[user_id] = {name: [count - before[name][0], size - before[name][1]]
+                              for name, (count, size) in totals.items() if (count, size) != before[name]}
+        if delta:
+            self.changes.publish('stats', {'delta': delta})
+
+    def _stat_totals(self, user_id):
+        """Raw (count, size) per statistics category for one user key"""
+        user_stats = self._user_stats[user_id]
+        subscribed = tuple(user_stats['subscribed'])
+        disabled = tuple(user_stats['disabled'])
+        total = tuple(self._total)
+        not_subscribed = (total[0] - subscribed[0] - disabled[0], total[1] - subscribed[1] - disabled[1])
+        return {
+            'total': total,
+            'subscribed': subscribed,
+            'disabled': disabled,
+            'not_subscribed': not_subscribed,
+            'unsubscribed': (total[0] - subscribed[0], total[1] - subscribed[1])
+        }
+
+    def _apply(self, record, sign):
+        """Add (sign=1) or remove (sign=-1) a record's contribution to every aggregate"""
+        self._generation += 1
+        self._dirty = True
+        size = record.size * sign
+        self.bitsets.set_present(record.id, sign > 0)
+        if sign > 0:
+            self.facets.add(record)
+        else:
+            self.facets.remove(record)
+
+        self._total[0] += sign
+        self._total[1] += size
+
+        bucket = self._histogram[size_bucket(record.size)]
+        bucket[0] += sign
+        bucket[1] += size
+
+        by_type = self._by_type.setdefault(record.type, [0, 0])
+        by_type[0] += sign
+        by_type[1] += size
+        if by_type[0] == 0:
+            del self._by_type[record.type]
+
+        by_root = self._by_root.setdefault(record.root, [0, 0])
+        by_root[0] += sign
+        by_root[1] += size
+        if by_root[0] == 0:
+            del self._by_root[record.root]
+
+        for user_id, user_stats in self._user_stats.items():
+            category = self._classify(record.id, user_id)
+            if category:
+                user_stats[category][0] += sign
+                user_stats[category][1] += size
+
+    def _classify(self, workshop_id, user_id):
+        """Get the statistics category of an item for a user"""
+        if user_id == ALL_USERS:
+            if workshop_id in self._all_active:
+                return 'subscribed'
+            if workshop_id in self._all_disabled:
+                return 'disabled'
+            return None
+
+        details = (self._subscription_data or {}).get(user_id, {}).get(workshop_id)
+        if details is None:
+            return None
+        return 'subscribed' if details['is_active'] else 'disabled'
+
+    def _sync_subscriptions(self):
+        """Rebuild per-user aggregates when the subscription data was reloaded"""
+        all_data = self.steam_parser.get_all_subscription_data() or {}
+        if all_data is self._subscription_data:
+            return
+
+        if self._subscription_data is not None:
+            self._note_subscription_changes(self._subscription_data, all_data)
+        self._subscription_data = all_data
+        self.bitsets.rebuild(all_data)
+        self._all_active = set()
+        self._all_disabled = set()
+        self._user_stats = {}
+
+        # Only subscribed items are visited; "not subscribed" is derived from the totals
+        for user_id, user_subscriptions in all_data.items():
+            user_stats = {'subscribed': [0, 0], 'disabled': [0, 0]}
+            for workshop_id, details in user_subscriptions.items():
+                if details['is_active']:
+                    self._all_active.add(workshop_id)
+                else:
+                    self._all_disabled.add(workshop_id)
+                record = self._records.get(workshop_id)
+                if record is not None:
+                    category = user_stats['subscribed' if details['is_active'] else 'disabled']
+                    category[0] += 1
+                    category[1] += record.size
+            self._user_stats[user_id] = user_stats
+
+        self._all_disabled -= self._all_active
+        all_stats = {'subscribed': [0, 0], 'disabled': [0, 0]}
+        for category, items in (('subscribed', self._all_active), ('disabled', self._all_disabled)):
+            for workshop_id in items:
+                record = self._records.get(workshop_id)
+                if record is not None:
+                    all_stats[category][0] += 1
+                    all_stats[category][1] += record.size
+        self._user_stats[ALL_USERS] = all_stats
+
+    def _note_subscription_changes(self, previous, current):
+        """Note indexed items whose subscription state changed for any user"""
+        for user_id in previous.keys() | current.keys():
+            before = previous.get(user_id, {})
+            after = current.get(user_id, {})
+            for workshop_id in before.keys() | after.keys():
+                if workshop_id not in self._records:
+                    continue
+                old = before.get(workshop_id)
+                new = after.get(workshop_id)
+                old_state = None if old is None else old['is_active']
+                new_state = None if new is None else new['is_active']
+                if old_state != new_state:
+                    self._note_change(workshop_id, 'subscription')
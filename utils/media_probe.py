@@ -0,0 +1,285 @@
+"""
+Media Probe
+Describes a wallpaper's main asset (resolution, duration, bitrate, codec) by
+parsing container headers only
+
+Files are memory-mapped and only the header structures are touched, so the
+operating system reads a few pages even for multi-GB videos: MP4/MOV boxes
+are walked by their sizes (skipping mdat), WebM/Matroska stops at the first
+cluster, and images read their fixed-position headers.
+"""
+
+import mmap
+import os
+import struct
+
+
+MP4_CODECS = {
+    b'avc1': 'H.264', b'avc3': 'H.264', b'hvc1': 'H.265', b'hev1': 'H.265',
+    b'vp09': 'VP9', b'av01': 'AV1', b'mp4v': 'MPEG-4', b'mp4a': 'AAC', b'Opus': 'Opus'
+}
+
+MATROSKA_CODECS = {
+    'V_VP8': 'VP8', 'V_VP9': 'VP9', 'V_AV1': 'AV1', 'V_MPEG4/ISO/AVC': 'H.264',
+    'V_MPEGH/ISO/HEVC': 'H.265', 'A_OPUS': 'Opus', 'A_VORBIS': 'Vorbis', 'A_AAC': 'AAC'
+}
+
+# Matroska element ids
+_EBML, _SEGMENT, _INFO, _TIMECODE_SCALE, _DURATION = 0x1A45DFA3, 0x18538067, 0x1549A966, 0x2AD7B1, 0x4489
+_TRACKS, _TRACK_ENTRY, _TRACK_TYPE, _CODEC_ID = 0x1654AE6B, 0xAE, 0x83, 0x86
+_VIDEO, _PIXEL_WIDTH, _PIXEL_HEIGHT, _CLUSTER = 0xE0, 0xB0, 0xBA, 0x1F43B675
+
+
+def probe_media(path):
+    """
+    Describe a media file from its headers.
+    Returns {'format', 'kind', 'width', 'height', 'duration', 'bitrate', 'codec', 'audio_codec'}
+    or None for unsupported or unreadable files.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 16:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                head = buf[:16]
+                if head[4:8] in (b'ftyp', b'moov', b'free', b'mdat', b'wide', b'skip'):
+                    info = _probe_mp4(buf, size)
+                elif head[:4] == b'\x1a\x45\xdf\xa3':
+                    info = _probe_matroska(buf, size)
+                else:
+                    info = _probe_image(buf, head)
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        # Truncated or partially downloaded files end up here
+        print(f"Could not probe {path}: {e}")
+        return None
+
+    if info is None:
+        return None
+    result = {'format': None, 'kind': None, 'width': None, 'height': None,
+              'duration': None, 'bitrate': None, 'codec': None, 'audio_codec': None}
+    result.update(info)
+    if result['duration']:
+        result['duration'] = round(result['duration'], 3)
+        result['bitrate'] = int(size * 8 / result['duration'])
+    return result
+
+
+# MP4 / MOV
+
+def _boxes(buf, start, end):
+    """Iterate (type, payload start, box end) over ISO BMFF boxes in a range"""
+    position = start
+    while position + 8 <= end:
+        box_size, = struct.unpack_from('>I', buf, position)
+        box_type = buf[position + 4:position + 8]
+        header = 8
+        if box_size == 1:
+            box_size, = struct.unpack_from('>Q', buf, position + 8)
+            header = 16
+        elif box_size == 0:
+            box_size = end - position
+        if box_size < header:
+            return
+        yield box_type, position + header, min(position + box_size, end)
+        position += box_size
+
+
+def _child(buf, start, end, box_type):
+    for child_type, child_start, child_end in _boxes(buf, start, end):
+        if child_type == box_type:
+            return child_start, child_end
+    return None
+
+
+def _probe_mp4(buf, size):
+    moov = _child(buf, 0, size, b'moov')
+    if moov is None:
+        return None
+
+    info = {'format': 'mp4', 'kind': 'video'}
+    mvhd = _child(buf, moov[0], moov[1], b'mvhd')
+    if mvhd is not None and mvhd[0] < mvhd[1]:
+        version = buf[mvhd[0]]
+        if version == 1:
+            timescale, duration = struct.unpack_from('>IQ', buf, mvhd[0] + 20)
+        else:
+            timescale, duration = struct.unpack_from('>II', buf, mvhd[0] + 12)
+        if timescale:
+            info['duration'] = duration / timescale
+
+    for box_type, trak_start, trak_end in _boxes(buf, moov[0], moov[1]):
+        if box_type != b'trak':
+            continue
+        mdia = _child(buf, trak_start, trak_end, b'mdia')
+        if mdia is None:
+            continue
+        hdlr = _child(buf, mdia[0], mdia[1], b'hdlr')
+        handler = buf[hdlr[0] + 8:hdlr[0] + 12] if hdlr else b''
+
+        codec = None
+        stsd = None
+        minf = _child(buf, mdia[0], mdia[1], b'minf')
+        stbl = _child(buf, minf[0], minf[1], b'stbl') if minf else None
+        if stbl:
+            stsd = _child(buf, stbl[0], stbl[1], b'stsd')
+        if stsd and stsd[0] + 16 <= stsd[1]:
+            fourcc = bytes(buf[stsd[0] + 12:stsd[0] + 16])
+            codec = MP4_CODECS.get(fourcc, fourcc.decode('latin-1').strip())
+
+        if handler == b'vide' and info.get('codec') is None:
+            info['codec'] = codec
+            tkhd = _child(buf, trak_start, trak_end, b'tkhd')
+            if tkhd is not None and tkhd[0] < tkhd[1]:
+                offset = 88 if buf[tkhd[0]] == 1 else 76
+                width, height = struct.unpack_from('>II', buf, tkhd[0] + offset)
+                info['width'], info['height'] = width >> 16, height >> 16
+        elif handler == b'soun' and info.get('audio_codec') is None:
+            info['audio_codec'] = codec
+    return info
+
+
+# WebM / Matroska
+
+def _vint(buf, position, end, keep_marker):
+    """Read an EBML variable-length integer ending before end; returns (value, length)"""
+    if position >= end:
+        raise ValueError("Truncated EBML element")
+    first = buf[position]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("Invalid EBML integer")
+    if position + length > end:
+        raise ValueError("Truncated EBML element")
+    value = first if keep_marker else first & (mask - 1)
+    for index in range(1, length):
+        value = (value << 8) | buf[position + index]
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = -1  # unknown size
+    return value, length
+
+
+def _elements(buf, start, end):
+    """Iterate (id, payload start, element end) over EBML elements in a range"""
+    position = start
+    while position < end:
+        element_id, id_length = _vint(buf, position, end, True)
+        element_size, size_length = _vint(buf, position + id_length, end, False)
+        payload = position + id_length + size_length
+        element_end = end if element_size < 0 else min(payload + element_size, end)
+        yield element_id, payload, element_end
+        if element_size < 0:
+            return
+        position = element_end
+
+
+def _uint(buf, start, end):
+    return int.from_bytes(buf[start:end], 'big')
+
+
+def _probe_matroska(buf, size):
+    info = {'format': 'webm', 'kind': 'video'}
+    for element_id, start, end in _elements(buf, 0, size):
+        if element_id != _SEGMENT:
+            continue
+        timecode_scale = 1000000
+        duration = None
+        for child_id, child_start, child_end in _elements(buf, start, end):
+            if child_id == _CLUSTER:
+                break  # Media data follows; everything needed comes before it
+            if child_id == _INFO:
+                for item_id, item_start, item_end in _elements(buf, child_start, child_end):
+                    if item_id == _TIMECODE_SCALE:
+                        timecode_scale = _uint(buf, item_start, item_end)
+                    elif item_id == _DURATION:
+                        fmt = '>d' if item_end - item_start == 8 else '>f'
+                        duration, = struct.unpack_from(fmt, buf, item_start)
+            elif child_id == _TRACKS:
+                for entry_id, entry_start, entry_end in _elements(buf, child_start, child_end):
+                    if entry_id == _TRACK_ENTRY:
+                        _read_track(buf, entry_start, entry_end, info)
+        if duration is not None:
+            info['duration'] = duration * timecode_scale / 1e9
+        break
+    return info
+
+
+def _read_track(buf, start, end, info):
+    track_type = None
+    codec = None
+    width = height = None
+    for item_id, item_start, item_end in _elements(buf, start, end):
+        if item_id == _TRACK_TYPE:
+            track_type = _uint(buf, item_start, item_end)
+        elif item_id == _CODEC_ID:
+            codec_id = bytes(buf[item_start:item_end]).decode('ascii', 'ignore').rstrip('\x00')
+            codec = MATROSKA_CODECS.get(codec_id, codec_id)
+        elif item_id == _VIDEO:
+            for video_id, video_start, video_end in _elements(buf, item_start, item_end):
+                if video_id == _PIXEL_WIDTH:
+                    width = _uint(buf, video_start, video_end)
+                elif video_id == _PIXEL_HEIGHT:
+                    height = _uint(buf, video_start, video_end)
+    if track_type == 1 and info.get('codec') is None:
+        info.update(codec=codec, width=width, height=height)
+    elif track_type == 2 and info.get('audio_codec') is None:
+        info['audio_codec'] = codec
+
+
+# Images
+
+def _probe_image(buf, head):
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        width, height = struct.unpack_from('>II', buf, 16)
+        return {'format': 'png', 'kind': 'image', 'width': width, 'height': height, 'codec': 'PNG'}
+    if head[:4] == b'GIF8':
+        width, height = struct.unpack_from('<HH', buf, 6)
+        return {'format': 'gif', 'kind': 'image', 'width': width, 'height': height, 'codec': 'GIF'}
+    if head[:2] == b'BM':
+        width, height = struct.unpack_from('<ii', buf, 18)
+        return {'format': 'bmp', 'kind': 'image', 'width': width, 'height': abs(height), 'codec': 'BMP'}
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _probe_webp(buf)
+    if head[:2] == b'\xff\xd8':
+        return _probe_jpeg(buf)
+    return None
+
+
+def _probe_webp(buf):
+    chunk = buf[12:16]
+    info = {'format': 'webp', 'kind': 'image', 'codec': 'WebP'}
+    if chunk == b'VP8X':
+        info['width'] = int.from_bytes(buf[24:27], 'little') + 1
+        info['height'] = int.from_bytes(buf[27:30], 'little') + 1
+    elif chunk == b'VP8 ':
+        width, height = struct.unpack_from('<HH', buf, 26)
+        info['width'], info['height'] = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b'VP8L':
+        bits = int.from_bytes(buf[21:25], 'little')
+        info['width'], info['height'] = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    return info
+
+
+def _probe_jpeg(buf):
+    position = 2
+    end = len(buf)
+    while position + 4 <= end:
+        if buf[position] != 0xFF:
+            return None
+        marker = buf[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        length, = struct.unpack_from('>H', buf, position + 2)
+        # SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack_from('>HH', buf, position + 5)
+            return {'format': 'jpeg', 'kind': 'image', 'width': width, 'height': height, 'codec': 'JPEG'}
+        if marker == 0xDA:
+            return None  # Start of scan without a frame header
+        position += 2 + length
+    return None
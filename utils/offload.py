@@ -0,0 +1,230 @@
+"""
+Offload
+Moves unsubscribed wallpapers into archives on a secondary volume and
+restores them
+
+Each wallpaper folder is streamed into its own ZIP archive in fixed-size
+chunks (no staging copy), then the original folder is removed. Files that are
+already compressed media are stored as-is, and progress reports throughput.
+
+The thread pool runs over wallpapers, not over the files inside one: a ZIP is
+a single output stream and zipfile writes one entry at a time, so files of the
+same archive could only be deflated in parallel by buffering whole compressed
+entries (a staging copy in memory or on disk) or by writing the format by
+hand. One archive per wallpaper gives every worker its own stream, keeps
+memory at one chunk per worker (zlib releases the GIL while compressing), and
+keeps restore and listing one archive per wallpaper. A batch smaller than the
+pool leaves workers idle; the largest files are usually video, which is
+stored and limited by disk speed rather than by compression.
+"""
+
+import json
+import os
+import shutil
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path, PurePosixPath
+
+from utils.integrity import walk_files
+
+
+COPY_CHUNK_SIZE = 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+
+# Formats that do not shrink any further; stored without compression
+COMPRESSED_EXTENSIONS = {
+    '.mp4', '.webm', '.mkv', '.mov', '.avi', '.m4v',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.mp3', '.ogg', '.m4a', '.aac', '.opus',
+    '.zip', '.7z', '.rar', '.gz', '.xz', '.bz2'
+}
+
+
+def is_compressible(path):
+    """Guess whether deflating a file is worth it (by extension, then by a sample)"""
+    if os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return False
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_SIZE)
+    if len(sample) < 1024:
+        return True
+    return len(zlib.compress(sample, 1)) < len(sample) * 0.9
+
+
+class Offloader:
+    """Archives wallpaper folders under offload.path and restores them"""
+
+    def __init__(self, config):
+        offload_config = config.get('offload', {})
+        self.path = offload_config.get('path')
+        self.workers = offload_config.get('workers') or min(4, os.cpu_count() or 2)
+
+    def archive_dir(self):
+        """Offload directory (ValueError when not configured)"""
+        if not self.path:
+            raise ValueError("offload.path is not configured")
+        path = Path(self.path)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def archive_path(self, workshop_id):
+        return self.archive_dir() / f"{workshop_id}.zip"
+
+    def list_archives(self):
+        """Metadata of every offloaded wallpaper, plus its archive size"""
+        archives = []
+        for path in sorted(self.archive_dir().glob('*.zip')):
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    metadata = json.loads(archive.comment or b'{}')
+                metadata.setdefault('id', path.stem)
+                metadata['archive_size'] = path.stat().st_size
+                archives.append(metadata)
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                print(f"Skipping unreadable archive {path}: {e}")
+        return archives
+
+    def offload_all(self, items):
+        """
+        Offload many wallpapers, yielding progress events.
+        items is a list of (workshop_id, folder_path, metadata), archived in
+        parallel one wallpaper per worker (see the module docstring). Events are
+        'start', one 'item' per wallpaper (status 'offloaded' or 'errors') and
+        a final 'done' with total bytes, ratio and throughput.
+        """
+        self.archive_dir()
+        start = time.time()
+        summary = {'offloaded': 0, 'errors': 0, 'bytes_in': 0, 'bytes_out': 0}
+        yield {'event': 'start', 'total': len(items)}
+
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='offload')
+        try:
+            futures = [pool.submit(self._offload_safely, *item) for item in items]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                summary[result['status']] += 1
+                summary['bytes_in'] += result.get('bytes_in', 0)
+                summary['bytes_out'] += result.get('bytes_out', 0)
+                yield dict(result, event='item', done=done, total=len(items))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.time() - start
+        summary['elapsed'] = round(elapsed, 3)
+        summary['mb_per_second'] = round(summary['bytes_in'] / 1048576 / elapsed, 1) if elapsed else 0
+        summary['ratio'] = round(summary['bytes_out'] / summary['bytes_in'], 3) if summary['bytes_in'] else None
+        yield {'event': 'done', 'summary': summary}
+
+    def _offload_safely(self, workshop_id, folder_path, metadata):
+        try:
+            return self.offload(workshop_id, folder_path, metadata)
+        except Exception as e:
+            print(f"Error offloading {workshop_id}: {e}")
+            return {'id': workshop_id, 'status': 'errors', 'error': str(e)}
+
+    def offload(self, workshop_id, folder_path, metadata):
+        """Stream one folder into its archive, check it, then remove the folder"""
+        target = self.archive_path(workshop_id)
+        if target.exists():
+            raise ValueError(f"Wallpaper {workshop_id} is already offloaded")
+
+        start = time.time()
+        files = walk_files(folder_path)
+        partial = target.with_name(target.name + '.partial')
+        stored = 0
+        try:
+            with open(partial, 'wb') as raw:
+                with zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                    archive.comment = json.dumps(dict(metadata, offloaded=int(time.time())),
+                                                 ensure_ascii=False).encode('utf-8')
+                    for name, (size, mtime_ns) in sorted(files.items()):
+                        path = os.path.join(folder_path, name)
+                        info = zipfile.ZipInfo(name, date_time=time.localtime(mtime_ns / 1e9)[:6])
+                        info.file_size = size  # lets zipfile choose ZIP64 up front for large files
+                        if is_compressible(path):
+                            info.compress_type = zipfile.ZIP_DEFLATED
+                        else:
+                            info.compress_type = zipfile.ZIP_STORED
+                            stored += 1
+                        with open(path, 'rb') as source, archive.open(info, 'w') as destination:
+                            shutil.copyfileobj(source, destination, COPY_CHUNK_SIZE)
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            # Never remove the original unless the archive lists every file at its size
+            with zipfile.ZipFile(partial) as archive:
+                written = {info.filename: info.file_size for info in archive.infolist()}
+            if written != {name: size for name, (size, _) in files.items()}:
+                raise OSError(f"Archive of {workshop_id} does not match the folder")
+            os.replace(partial, target)
+        except BaseException:
+            try:
+                partial.unlink()
+            except OSError:
+                pass
+            raise
+
+        shutil.rmtree(folder_path)
+        elapsed = time.time() - start
+        bytes_in = sum(size for size, _ in files.values())
+        return {
+            'id': workshop_id,
+            'status': 'offloaded',
+            'files': len(files),
+            'stored': stored,
+            'bytes_in': bytes_in,
+            'bytes_out': target.stat().st_size,
+            'elapsed': round(elapsed, 3),
+            'mb_per_second': round(bytes_in / 1048576 / elapsed, 1) if elapsed else 0
+        }
+
+    def restore(self, workshop_id, content_root=None):
+        """Extract an archive back into its content root and delete the archive"""
+        source = self.archive_path(workshop_id)
+        if not source.exists():
+            raise ValueError(f"Wallpaper {workshop_id} is not offloaded")
+
+        start = time.time()
+        bytes_out = 0
+        with zipfile.ZipFile(source) as archive:
+            metadata = json.loads(archive.comment or b'{}')
+            root = Path(content_root or metadata.get('root') or '')
+            if not root.is_dir():
+                raise ValueError(f"Content root not available: {root}")
+            target = root / workshop_id
+            if target.exists():
+                raise ValueError(f"Folder already exists: {target}")
+
+            partial = root / f".{workshop_id}.restoring"
+            if partial.exists():
+                shutil.rmtree(partial)
+            try:
+                for info in archive.infolist():
+                    name = PurePosixPath(info.filename)
+                    if name.is_absolute() or '..' in name.parts:
+                        raise ValueError(f"Unsafe path in archive: {info.filename}")
+                    if info.is_dir():
+                        continue
+                    destination = partial.joinpath(*name.parts)
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    with archive.open(info) as src, open(destination, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    os.utime(destination, (mtime, mtime))
+                    bytes_out += info.file_size
+                os.replace(partial, target)
+            except BaseException:
+                shutil.rmtree(partial, ignore_errors=True)
+                raise
+
+        source.unlink()
+        elapsed = time.time() - start
+        return {
+            'id': workshop_id,
+            'path': str(target),
+            'bytes': bytes_out,
+            'elapsed': round(elapsed, 3),
+            'mb_per_second': round(bytes_out / 1048576 / elapsed, 1) if elapsed else 0
+        }
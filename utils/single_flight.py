@@ -0,0 +1,72 @@
+"""
+Single Flight
+Coalesces concurrent calls for the same key into one in-flight computation
+"""
+
+import threading
+
+
+class _Call:
+    """One in-flight computation and its outcome"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and share its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+
+    def do(self, key, func, *args, **kwargs):
+        """Run func(*args, **kwargs) once for all concurrent callers with this key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def start(self, key, func, *args, **kwargs):
+        """Run the computation for a key in a background thread unless one is already in flight"""
+        if self.in_flight(key):
+            return False
+
+        def run():
+            try:
+                self.do(key, func, *args, **kwargs)
+            except Exception as e:
+                print(f"Background refresh of {key} failed: {e}")
+
+        threading.Thread(target=run, name=f'refresh-{key}', daemon=True).start()
+        return True
+
+    def in_flight(self, key):
+        """Check whether a computation for the key is running"""
+        with self._lock:
+            return key in self._calls
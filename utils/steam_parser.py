@@ -3,12 +3,15 @@ Steam Parser
 Handles parsing of Steam workshop data
 """
 
-import vdf
 import json
 import os
+import threading
 import time
 from pathlib import Path
 
+from utils.cache_registry import CacheCounter, approximate_size
+from utils.single_flight import SingleFlight
+
 
 class SteamParser:
     """Steam workshop data parser"""
@@ -23,6 +26,68 @@ class SteamParser:
         self._user_cache = None
         self._user_cache_time = 0
         self._all_subscription_data = None  # Cache all user subscription data
+        self._subscription_cache_time = 0
+        
+        # Cache for content roots discovered from libraryfolders.vdf
+        self._library_cache = None
+        self._library_cache_time = 0
+        
+        # Installed-item manifests (appworkshop_431960.acf) per file: path -> (mtime_ns, items)
+        self._manifest_cache = {}
+        
+        # Caches are shared by request threads: reads and writes go through
+        # _cache_lock and concurrent reloads are coalesced into one
+        self._cache_lock = threading.Lock()
+        self._flight = SingleFlight()
+        
+        # Expired subscription data is served while it reloads in the background,
+        # up to max_staleness seconds old
+        self._max_staleness = config.get('cache', {}).get('max_staleness', 300)
+        
+        # Hit/miss counts reported through the cache registry
+        self._manifest_counter = CacheCounter()
+        self._subscription_counter = CacheCounter()
+    
+    def register_caches(self, registry):
+        """Report the parsed manifest and subscription caches to a CacheRegistry"""
+        def measure_manifests():
+            with self._cache_lock:
+                manifests = list(self._manifest_cache.values())
+            return sum(len(items) for _, items in manifests), approximate_size(manifests)
+        
+        def flush_manifests():
+            with self._cache_lock:
+                self._manifest_cache.clear()
+        
+        def measure_subscriptions():
+            with self._cache_lock:
+                data = self._all_subscription_data or {}
+            return sum(len(items) for items in data.values()), approximate_size(data)
+        
+        registry.register('installed_manifests', measure_manifests, flush_manifests,
+                          self._manifest_counter, priority=3)
+        # Needed by every request; flushing only forces a re-read of the VDF files
+        registry.register('subscriptions', measure_subscriptions, lambda: self.invalidate(subscriptions=True),
+                          self._subscription_counter, evictable=False)
+    
+    def invalidate(self, subscriptions=False, libraries=False):
+        """
+        Drop cached data that depends on changed settings; it is reloaded on next use.
+        subscriptions: users and subscription lists (userdata path).
+        libraries: content roots and the workshop VDF (library paths). Parsed
+        installed-item manifests are keyed by file and stay valid.
+        """
+        with self._cache_lock:
+            if subscriptions:
+                self._all_subscription_data = None
+                self._subscription_cache_time = 0
+                self._user_cache = None
+                self._user_cache_time = 0
+            if libraries:
+                self._library_cache = None
+                self._library_cache_time = 0
+                self._vdf_cache = None
+                self._vdf_cache_time = 0
     
     def get_steam_library_path(self):
         """Get Steam library path"""
@@ -39,6 +104,73 @@ class SteamParser:
             workshop_path = Path(content_path).parent.parent  # Up from 431960/content to workshop
             return str(workshop_path / "appworkshop_431960.acf")
     
+    def get_workshop_manifest_path(self, content_root):
+        """Get the appworkshop_431960.acf of the library holding a content root"""
+        primary = os.path.normcase(os.path.abspath(str(self.get_content_path())))
+        if os.path.normcase(os.path.abspath(str(content_root))) == primary:
+            return Path(self.get_workshop_file_path())
+        # <library>/steamapps/workshop/content/431960 -> <library>/steamapps/workshop
+        return Path(content_root).parent.parent / "appworkshop_431960.acf"
+    
+    def load_installed_items(self, content_root):
+        """
+        Get {workshop_id: (size, timeupdated, timetouched)} for a content root from
+        its library's appworkshop_431960.acf (timetouched may be None).
+        Parsed once per file modification; {} if the manifest is missing or unreadable.
+        """
+        manifest_path = self.get_workshop_manifest_path(content_root)
+        try:
+            mtime_ns = manifest_path.stat().st_mtime_ns
+        except OSError:
+            return {}
+        
+        key = str(manifest_path)
+        with self._cache_lock:
+            cached = self._manifest_cache.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            self._manifest_counter.hit()
+            return cached[1]
+        
+        self._manifest_counter.miss()
+        return self._flight.do(('manifest', key), self._load_manifest, manifest_path, mtime_ns)
+    
+    def _load_manifest(self, manifest_path, mtime_ns):
+        """Parse installed item sizes and times out of an appworkshop ACF"""
+        items = {}
+        try:
+            import vdf
+            with open(manifest_path, 'r', encoding='utf-8', errors='ignore') as f:
+                data = vdf.load(f)
+            
+            workshop = data.get('AppWorkshop', {})
+            installed = workshop.get('WorkshopItemsInstalled', {})
+            details = workshop.get('WorkshopItemDetails', {})
+            if not isinstance(details, dict):
+                details = {}
+            
+            for workshop_id, item in (installed.items() if isinstance(installed, dict) else []):
+                if not isinstance(item, dict) or 'size' not in item:
+                    continue
+                try:
+                    size = int(item['size'])
+                    timeupdated = int(item.get('timeupdated', 0))
+                except (TypeError, ValueError):
+                    continue
+                touched = details.get(workshop_id, {})
+                try:
+                    timetouched = int(touched.get('timetouched')) if isinstance(touched, dict) and touched.get('timetouched') else None
+                except (TypeError, ValueError):
+                    timetouched = None
+                items[workshop_id] = (size, timeupdated, timetouched)
+            
+            print(f"Loaded {len(items)} installed item sizes from {manifest_path}")
+        except Exception as e:
+            print(f"Error reading workshop manifest {manifest_path}: {e}")
+        
+        with self._cache_lock:
+            self._manifest_cache[str(manifest_path)] = (mtime_ns, items)
+        return items
+    
     def get_content_path(self):
         """Get content path (now steam_library_path points directly to 431960)"""
         if self.config.get('content_path'):
@@ -47,18 +179,127 @@ class SteamParser:
             # steam_library_path now directly points to the 431960 directory
             return Path(self.get_steam_library_path())
     
+    def get_content_paths(self):
+        """
+        Get all Wallpaper Engine content roots.
+        The primary root comes first, followed by manually configured roots
+        and roots discovered from Steam's libraryfolders.vdf.
+        """
+        roots = [self.get_content_path()]
+        
+        for configured in self.config.get('content_roots', []) or []:
+            if configured and str(configured).strip():
+                roots.append(Path(str(configured).strip()))
+        
+        if self.config.get('auto_discover_libraries', True):
+            roots.extend(self.discover_library_content_paths())
+        
+        # De-duplicate while keeping order
+        unique_roots = []
+        seen = set()
+        for root in roots:
+            key = os.path.normcase(os.path.abspath(str(root)))
+            if key not in seen:
+                seen.add(key)
+                unique_roots.append(root)
+        return unique_roots
+    
+    def discover_library_content_paths(self):
+        """Find 431960 content folders in every library listed in libraryfolders.vdf"""
+        with self._cache_lock:
+            if (self._library_cache is not None and
+                time.time() - self._library_cache_time < self._cache_duration):
+                return self._library_cache
+        return self._flight.do('libraries', self._load_library_content_paths)
+    
+    def _load_library_content_paths(self):
+        """Read libraryfolders.vdf and refresh the library cache"""
+        current_time = time.time()
+        content_paths = []
+        try:
+            steam_userdata_path = self.get_steam_user_data_path()
+            candidates = []
+            if steam_userdata_path:
+                candidates.append(steam_userdata_path.parent / "steamapps" / "libraryfolders.vdf")
+            
+            # The primary content root lives in <library>/steamapps/workshop/content/431960
+            primary_steamapps = self.get_content_path().parent.parent.parent
+            candidates.append(primary_steamapps / "libraryfolders.vdf")
+            
+            for library_file in candidates:
+                if not library_file.exists():
+                    continue
+                for library_path in self._parse_library_folders(library_file):
+                    content_path = library_path / "steamapps" / "workshop" / "content" / "431960"
+                    if content_path.exists() and content_path not in content_paths:
+                        content_paths.append(content_path)
+                        
+        except Exception as e:
+            print(f"Error discovering Steam libraries: {e}")
+        
+        with self._cache_lock:
+            self._library_cache = content_paths
+            self._library_cache_time = current_time
+        return content_paths
+    
+    def _parse_library_folders(self, library_file):
+        """Parse library paths from libraryfolders.vdf (old and new formats)"""
+        import vdf
+        with open(library_file, 'r', encoding='utf-8', errors='ignore') as f:
+            data = vdf.load(f)
+        
+        folders = data.get('libraryfolders') or data.get('LibraryFolders') or {}
+        library_paths = []
+        for key, value in folders.items():
+            if not key.isdigit():
+                continue
+            # New format: "0" { "path" "..." }, old format: "1" "D:\\SteamLibrary"
+            path = value.get('path') if isinstance(value, dict) else value
+            if path:
+                library_paths.append(Path(path))
+        return library_paths
+    
+    def find_item_folder(self, workshop_id):
+        """Find the folder of a workshop item in any content root"""
+        for root in self.get_content_paths():
+            folder_path = root / workshop_id
+            if folder_path.is_dir():
+                return folder_path
+        return None
+    
     def get_all_subscription_data(self):
         """
         Get all subscription data from all users with caching
         Returns: dict with {user_id: {workshop_id: subscription_details}}
         """
-        current_time = time.time()
-        
         # Check cache
-        if (self._all_subscription_data is not None and 
-            current_time - self._user_cache_time < self._cache_duration):
-            return self._all_subscription_data
+        with self._cache_lock:
+            cached = self._all_subscription_data
+            age = time.time() - self._subscription_cache_time
+        if cached is not None and age < self._cache_duration:
+            self._subscription_counter.hit()
+            return cached
+        if cached is not None and age < self._max_staleness:
+            # Stale-while-revalidate: reload in the background, serve the last data now
+            self._subscription_counter.hit()
+            self._flight.start('subscriptions', self._load_all_subscription_data)
+            return cached
         
+        # Concurrent callers share one reload of the VDF files
+        self._subscription_counter.miss()
+        return self._flight.do('subscriptions', self._load_all_subscription_data)
+    
+    def subscription_freshness(self):
+        """Get (age in seconds, stale, revalidating) of the cached subscription data"""
+        with self._cache_lock:
+            if self._all_subscription_data is None:
+                return 0.0, False, self._flight.in_flight('subscriptions')
+            age = time.time() - self._subscription_cache_time
+        return age, age >= self._cache_duration, self._flight.in_flight('subscriptions')
+    
+    def _load_all_subscription_data(self):
+        """Read every user's subscription VDF and refresh the cache"""
+        current_time = time.time()
         try:
             steam_userdata_path = self.get_steam_user_data_path()
             if not steam_userdata_path:
@@ -74,6 +315,7 @@ class SteamParser:
                     continue
                 
                 try:
+                    import vdf
                     with open(subscription_file, 'r', encoding='utf-8') as f:
                         data = vdf.load(f)
                     
@@ -103,7 +345,9 @@ class SteamParser:
                     continue
             
             # Cache the result
-            self._all_subscription_data = all_data
+            with self._cache_lock:
+                self._all_subscription_data = all_data
+                self._subscription_cache_time = current_time
             return all_data
             
         except Exception as e:
@@ -152,13 +396,17 @@ class SteamParser:
         print("Falling back to VDF file...")
         
         # Fallback to original VDF method
-        current_time = time.time()
-        
         # Check if we have cached data that's still valid
-        if (self._vdf_cache is not None and 
-            current_time - self._vdf_cache_time < self._cache_duration):
-            return self._vdf_cache
+        with self._cache_lock:
+            if (self._vdf_cache is not None and 
+                time.time() - self._vdf_cache_time < self._cache_duration):
+                return self._vdf_cache
         
+        return self._flight.do('workshop', self._load_workshop_vdf)
+    
+    def _load_workshop_vdf(self):
+        """Read the appworkshop VDF and refresh its cache"""
+        current_time = time.time()
         try:
             workshop_file = self.get_workshop_file_path()
             
@@ -166,6 +414,7 @@ class SteamParser:
                 print(f"Workshop file not found: {workshop_file}")
                 return None
             
+            import vdf
             with open(workshop_file, 'r', encoding='utf-8') as f:
                 data = vdf.load(f)
             
@@ -178,8 +427,9 @@ class SteamParser:
                 result = set()
             
             # Cache the result
-            self._vdf_cache = result
-            self._vdf_cache_time = current_time
+            with self._cache_lock:
+                self._vdf_cache = result
+                self._vdf_cache_time = current_time
             
             return result
                 
@@ -191,8 +441,9 @@ class SteamParser:
         """Get Steam user data path"""
         try:
             # First check if user has configured a specific path
-            if hasattr(self.config, 'steam_userdata_path') and self.config.steam_userdata_path:
-                configured_path = Path(self.config.steam_userdata_path.strip())  # Strip whitespace
+            configured = self.config.get('steam_userdata_path')
+            if configured and configured.strip():
+                configured_path = Path(configured.strip())  # Strip whitespace
                 if configured_path.exists():
                     print(f"✓ Using configured Steam userdata path: {configured_path}")
                     return configured_path
@@ -257,13 +508,17 @@ class SteamParser:
     
     def get_all_steam_user_ids(self):
         """Get all Steam user IDs on this system with caching"""
-        current_time = time.time()
-        
         # Check cache
-        if (self._user_cache is not None and 
-            current_time - self._user_cache_time < self._cache_duration):
-            return self._user_cache
+        with self._cache_lock:
+            if (self._user_cache is not None and 
+                time.time() - self._user_cache_time < self._cache_duration):
+                return self._user_cache
         
+        return self._flight.do('users', self._load_steam_user_ids)
+    
+    def _load_steam_user_ids(self):
+        """List user directories under userdata and refresh the cache"""
+        current_time = time.time()
         try:
             steam_userdata_path = self.get_steam_user_data_path()
             if not steam_userdata_path:
@@ -274,8 +529,9 @@ class SteamParser:
             user_ids = [d.name for d in user_dirs]
             
             # Cache the result
-            self._user_cache = user_ids
-            self._user_cache_time = current_time
+            with self._cache_lock:
+                self._user_cache = user_ids
+                self._user_cache_time = current_time
             
             print(f"Found {len(user_ids)} Steam users: {user_ids}")
             return user_ids
@@ -0,0 +1,177 @@
+"""
+Subscription Bitsets
+Per-user subscription sets stored as bitsets over a global item ordinal index,
+plus a small filter expression language evaluated with bitwise operations
+
+Filter expressions combine atoms with & (and), | (or), ! (not) and parentheses:
+    subscribed:<user>   active subscription of a user
+    disabled:<user>     subscribed but disabled locally by a user
+    listed:<user>       in a user's subscription list at all
+<user> may also be * (any user) or all (every user). Negation is relative to
+the items currently on disk. Examples:
+    subscribed:123 & !subscribed:456    subscribed by A but not B
+    !subscribed:*                       subscribed by nobody
+    disabled:all                        disabled locally by everyone
+"""
+
+import re
+
+
+FILTER_KINDS = ('subscribed', 'disabled', 'listed')
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\(|\)|!|&|\|)|([A-Za-z_]+):([^\s()&|!]+)|(and|or|not)\b)', re.IGNORECASE)
+
+
+class SubscriptionBitsets:
+    """Global item ordinals and per-user active/disabled bitsets"""
+
+    def __init__(self):
+        self._ordinals = {}  # workshop_id -> bit position
+        self._ids = []       # bit position -> workshop_id
+        self.present = 0     # items currently on disk
+        self.active = {}     # user_id -> bitset
+        self.disabled = {}   # user_id -> bitset
+
+    def ordinal(self, workshop_id):
+        """Get (assigning if new) the bit position of an item"""
+        position = self._ordinals.get(workshop_id)
+        if position is None:
+            position = len(self._ids)
+            self._ordinals[workshop_id] = position
+            self._ids.append(workshop_id)
+        return position
+
+    def set_present(self, workshop_id, present):
+        """Mark an item as on disk or removed"""
+        bit = 1 << self.ordinal(workshop_id)
+        if present:
+            self.present |= bit
+        else:
+            self.present &= ~bit
+
+    def contains(self, mask, workshop_id):
+        """Check whether an item is in a bitset"""
+        position = self._ordinals.get(workshop_id)
+        return position is not None and (mask >> position) & 1 == 1
+
+    def ids(self, mask):
+        """Get the workshop ids of all bits set in a bitset"""
+        ids = self._ids
+        return [ids[position] for position, bit in enumerate(reversed(bin(mask)[2:])) if bit == '1']
+
+    def rebuild(self, all_data):
+        """Rebuild the per-user bitsets from {user_id: {workshop_id: details}}"""
+        self.active = {}
+        self.disabled = {}
+        for user_id, user_subscriptions in all_data.items():
+            active = 0
+            disabled = 0
+            for workshop_id, details in user_subscriptions.items():
+                bit = 1 << self.ordinal(workshop_id)
+                if details['is_active']:
+                    active |= bit
+                else:
+                    disabled |= bit
+            self.active[user_id] = active
+            self.disabled[user_id] = disabled
+
+    def user_mask(self, kind, user):
+        """Get the bitset of one filter atom, e.g. ('subscribed', '*')"""
+        if kind == 'subscribed':
+            masks = self.active
+        elif kind == 'disabled':
+            masks = self.disabled
+        else:
+            masks = {user_id: self.active[user_id] | self.disabled[user_id] for user_id in self.active}
+
+        if user == '*':
+            result = 0
+            for mask in masks.values():
+                result |= mask
+        elif user.lower() == 'all':
+            if not masks:
+                return 0
+            result = -1
+            for mask in masks.values():
+                result &= mask
+        else:
+            if user not in masks:
+                raise ValueError(f"Unknown user in filter: {user}")
+            result = masks[user]
+        return result & self.present
+
+    def evaluate(self, expression):
+        """Evaluate a filter expression to a bitset of items on disk"""
+        return _FilterParser(expression, self).parse()
+
+
+class _FilterParser:
+    """Recursive-descent parser evaluating filter expressions directly to bitsets"""
+
+    def __init__(self, expression, bitsets):
+        self.bitsets = bitsets
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+
+    def _tokenize(self, expression):
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = _TOKEN_PATTERN.match(expression, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Invalid filter expression near: {expression[position:]!r}")
+            operator, kind, user, keyword = match.groups()
+            if operator:
+                tokens.append(operator)
+            elif keyword:
+                tokens.append({'and': '&', 'or': '|', 'not': '!'}[keyword.lower()])
+            else:
+                if kind.lower() not in FILTER_KINDS:
+                    raise ValueError(f"Unknown filter term: {kind}")
+                tokens.append((kind.lower(), user))
+            position = match.end()
+        if not tokens:
+            raise ValueError("Empty filter expression")
+        return tokens
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        result = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected token in filter: {self._peek()}")
+        return result
+
+    def _or(self):
+        result = self._and()
+        while self._peek() == '|':
+            self._next()
+            result |= self._and()
+        return result
+
+    def _and(self):
+        result = self._not()
+        while self._peek() == '&':
+            self._next()
+            result &= self._not()
+        return result
+
+    def _not(self):
+        token = self._next()
+        if token == '!':
+            return self.bitsets.present & ~self._not()
+        if token == '(':
+            result = self._or()
+            if self._next() != ')':
+                raise ValueError("Missing ')' in filter")
+            return result
+        if isinstance(token, tuple):
+            return self.bitsets.user_mask(*token)
+        raise ValueError(f"Unexpected token in filter: {token}")